@@ -2,6 +2,8 @@
 ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Server-sent events (``/api/events/``) are served by ``dental.sse``; every
+other request goes to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -13,4 +15,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from dental import sse  # noqa: E402  (needs the app registry set up above)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and sse.matches(scope['path']):
+        return await sse.application(scope, receive, send)
+    return await django_application(scope, receive, send)
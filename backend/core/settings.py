@@ -92,6 +92,19 @@ DATABASES = {
 }
 
 
+# Cache shared by every worker process: catalog versions, cached responses and
+# their single-flight locks live here. The table is created by a migration.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'dental_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -140,6 +153,12 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Simple CORS for local development - adjust for production
 CORS_ALLOW_ALL_ORIGINS = True
+# Let the cross-origin frontend read the delta sync cursor and conditional-GET tags
+CORS_EXPOSE_HEADERS = ['X-Sync-Cursor', 'ETag']
+
+# Cold storage for old AppointmentHistory rows (see the archive_history command)
+HISTORY_ARCHIVE_DIR = BASE_DIR / 'archive' / 'history'
+HISTORY_ARCHIVE_HORIZON_DAYS = 365
 
 # DRF defaults
 REST_FRAMEWORK = {
@@ -147,8 +166,15 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        # trusts the user claims embedded at login instead of loading the user
+        'dental.authentication.ClaimsJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        # opt-in with ?format=columnar
+        'dental.renderers.ColumnarJSONRenderer',
+    ],
 }
 
 # JWT Configuration
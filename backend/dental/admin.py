@@ -10,11 +10,22 @@ from unfold.contrib.import_export.forms import (ExportForm, ImportForm,
 from unfold.forms import (AdminPasswordChangeForm, UserChangeForm,
                           UserCreationForm)
 
+from . import search, transitions
 from .models import Appointment, AppointmentHistory, Doctor, Feedback, Service
 
 admin.site.unregister(User)
 
 
+class FullTextSearchMixin:
+    """Answer the changelist search box from the full-text index instead of LIKE scans."""
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(pk__in=search.matching_ids(self.search_kind, search_term)), False
+
+
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin, ModelAdmin):
@@ -26,7 +37,7 @@ class UserAdmin(BaseUserAdmin, ModelAdmin):
 
 @admin.register(Service)
 class ServiceAdmin(ModelAdmin, ImportExportModelAdmin):
-    list_display = ('id', 'name')
+    list_display = ('id', 'name', 'duration_minutes')
     list_display_links = ('id', 'name')
     search_fields = ('name',)
     import_Form_class = ImportForm
@@ -35,9 +46,11 @@ class ServiceAdmin(ModelAdmin, ImportExportModelAdmin):
 
 
 @admin.register(Appointment)
-class AppointmentAdmin(ModelAdmin, ImportExportModelAdmin):
+class AppointmentAdmin(FullTextSearchMixin, ModelAdmin, ImportExportModelAdmin):
     list_display = ('id', 'name', 'phone','status', 'appointment_date',  'created_at')
     list_display_links = ('id', 'name', 'phone')
+    search_fields = ('name', 'phone', 'message', 'admin_notes')
+    search_kind = 'appointment'
     list_filter = [
         'status', 
         'appointment_date', 
@@ -54,42 +67,40 @@ class AppointmentAdmin(ModelAdmin, ImportExportModelAdmin):
          'admin_notes', 'created_at', 'updated_at'
     )
     change_form_template = "unfold/admin/item_change_form.html"
+    actions = ['approve_selected', 'reject_selected']
 
     import_Form_class = ImportForm
     export_Form_class = ExportForm
 
+    def _bulk_transition(self, request, queryset, new_status):
+        ids = list(queryset.values_list('id', flat=True))
+        results = transitions.bulk_transition(ids, new_status, str(request.user))
+        moved = sum(1 for result in results if result['moved_to_history'])
+        self.message_user(request, f"{moved} appointment(s) {new_status.lower()} and moved to history.")
+
+    @admin.action(description="Approve selected appointments")
+    def approve_selected(self, request, queryset):
+        self._bulk_transition(request, queryset, 'APPROVED')
+
+    @admin.action(description="Reject selected appointments")
+    def reject_selected(self, request, queryset):
+        self._bulk_transition(request, queryset, 'REJECTED')
+
     def save_model(self, request, obj, form, change):
         if "_approve" in request.POST:
             obj.status = "APPROVED"
         elif "_disapprove" in request.POST:
             obj.status = "REJECTED"
 
-        if change:
-            print("this is object")
-            print(obj)
-            old = Appointment.objects.get(pk=obj.pk)
-            if old.status != obj.status:
-                doc = old.doctor
-                AppointmentHistory.objects.create(
-                    appointment=obj,
-                    name=old.name,
-                    email=old.email,
-                    phone=old.phone,
-                    service_name=old.service.name if old.service else None,
-                    appointment_date=old.appointment_date,
-                    appointment_time=old.appointment_time,
-                    message=old.message,
-                    doctor_id=getattr(doc, 'id', None),
-                    doctor_name=getattr(doc, 'name', None),
-                    previous_status=old.status,
-                    new_status=obj.status,
-                    changed_by=str(request.user),
-                    notes=obj.admin_notes or ''
-                )
-                if obj.status in ('APPROVED', 'REJECTED'):
-                    obj.delete()
-                    return
-        super().save_model(request, obj, form, change)
+        if not change:
+            # staff may overbook deliberately, so overlaps are not checked
+            super().save_model(request, obj, form, change)
+            return
+
+        # Same transition path as the API: one locked fetch, history snapshot, move to history on approve/reject
+        changes = {field: getattr(obj, field) for field in form.changed_data}
+        changes['status'] = obj.status
+        transitions.apply(obj.pk, changes, str(request.user), enforce_capacity=False)
 
     def response_add(self, request, obj, post_url_continue=None):
         """Ignore "Save and add another" and "Save and continue editing" for Appointment admin.
@@ -115,9 +126,11 @@ class AppointmentAdmin(ModelAdmin, ImportExportModelAdmin):
 
 
 @admin.register(AppointmentHistory)
-class AppointmentHistoryAdmin(ModelAdmin, ImportExportModelAdmin):
+class AppointmentHistoryAdmin(FullTextSearchMixin, ModelAdmin, ImportExportModelAdmin):
     list_display = ('id', 'name', 'phone', 'previous_status', 'new_status',  'changed_by', 'visited', 'timestamp')
     list_display_links = ('id', 'name', 'phone')
+    search_fields = ('name', 'phone', 'message', 'notes')
+    search_kind = 'history'
     list_filter = ('previous_status', 'new_status', 'changed_by', 'visited', 'timestamp')
     readonly_fields = (
         'appointment', 'name', 'email', 'phone', 'doctor_id', 'doctor_name',
@@ -143,9 +156,11 @@ class DoctorAdmin(ModelAdmin, ImportExportModelAdmin):
 
 
 @admin.register(Feedback)
-class FeedbackAdmin(ModelAdmin, ImportExportModelAdmin):
+class FeedbackAdmin(FullTextSearchMixin, ModelAdmin, ImportExportModelAdmin):
     list_display = ('id', 'name', 'phone', 'created_at')
     list_display_links = ('id', 'name', 'phone')
+    search_fields = ('name', 'phone', 'message')
+    search_kind = 'feedback'
     readonly_fields = ('name', 'phone', 'message', 'created_at')
     list_filter = [('created_at', RangeDateFilter)]
     import_Form_class = ImportForm
@@ -0,0 +1,123 @@
+"""Operational analytics: no-show rates, booking lead times and decision latency.
+
+Everything is computed inside the database: no-show rates from the
+DailyRollup counters, the lead-time histogram as one aggregate of filtered
+counts, and decision latency as one count/mean aggregate plus one
+single-row read of the sorted column per percentile. Results are cached
+per range for CACHE_SECONDS.
+"""
+import math
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import AppointmentHistory, DailyRollup, Doctor, Service
+
+CACHE_SECONDS = 300
+CACHE_PREFIX = 'dental:analytics'
+GROUPS = {'doctor': ('doctor_id', Doctor), 'service': ('service_id', Service)}
+# Lower edges, in days, of the lead-time histogram bins; the last bin is open-ended.
+LEAD_TIME_BINS = [0, 1, 2, 4, 8, 15, 31, 61, 91]
+PERCENTILES = [50, 75, 90, 95, 99]
+DECIDED_STATUSES = ('APPROVED', 'REJECTED')
+
+
+def cached(name, compute, *args):
+    """``compute(*args)``, cached under ``name`` and the arguments."""
+    key = ':'.join([CACHE_PREFIX, name, *(str(arg) for arg in args)])
+    return cache.get_or_set(key, lambda: compute(*args), CACHE_SECONDS)
+
+
+def _hours(delta):
+    return round(delta.total_seconds() / 3600, 2)
+
+
+def no_show_rates(start_date, end_date, group='doctor'):
+    """Approved appointments without a visit, per doctor or service, for days already past."""
+    field, model = GROUPS[group]
+    last_day = min(end_date, timezone.localdate() - timedelta(days=1))
+    rows = list(
+        DailyRollup.objects.filter(source='history', status='APPROVED', date__range=(start_date, last_day))
+        .values(field).annotate(approved=Sum('count'), visited=Sum('visited')).order_by(field)
+    )
+    names = dict(model.objects.filter(pk__in=[row[field] for row in rows]).values_list('id', 'name'))
+    results = []
+    for row in rows:
+        if not row['approved']:
+            continue
+        no_shows = row['approved'] - row['visited']
+        results.append({
+            'id': row[field] or None,
+            'name': names.get(row[field]),
+            'approved': row['approved'],
+            'visited': row['visited'],
+            'no_shows': no_shows,
+            'no_show_rate': round(no_shows / row['approved'], 4),
+        })
+    return results
+
+
+def _history(start_date, end_date, doctor_id=None):
+    rows = AppointmentHistory.objects.filter(appointment_date__range=(start_date, end_date))
+    if doctor_id:
+        rows = rows.filter(doctor_id=doctor_id)
+    return rows.order_by()
+
+
+def lead_time_histogram(start_date, end_date, doctor_id=None):
+    """Days from booking to appointment, bucketed by LEAD_TIME_BINS.
+
+    Rows recorded before ``booked_at`` existed fall back to the decision
+    timestamp. Negative lead times (decided after the day) are counted apart.
+    """
+    lead = ExpressionWrapper(
+        F('appointment_date') - TruncDate(Coalesce('booked_at', 'timestamp')), output_field=DurationField()
+    )
+    bins = {'negative': Count('id', filter=Q(lead__lt=timedelta(0)))}
+    for index, low in enumerate(LEAD_TIME_BINS):
+        condition = Q(lead__gte=timedelta(days=low))
+        if index + 1 < len(LEAD_TIME_BINS):
+            condition &= Q(lead__lt=timedelta(days=LEAD_TIME_BINS[index + 1]))
+        bins[f'bin{index}'] = Count('id', filter=condition)
+    counts = _history(start_date, end_date, doctor_id).annotate(lead=lead).aggregate(total=Count('id'), **bins)
+    return {
+        'total': counts['total'],
+        'negative': counts['negative'],
+        'bins': [
+            {
+                'min_days': low,
+                'max_days': LEAD_TIME_BINS[index + 1] if index + 1 < len(LEAD_TIME_BINS) else None,
+                'count': counts[f'bin{index}'],
+            }
+            for index, low in enumerate(LEAD_TIME_BINS)
+        ],
+    }
+
+
+def decision_latency(start_date, end_date, doctor_id=None):
+    """Percentiles of the time from booking to approval/rejection, for decisions made in range."""
+    start = timezone.make_aware(datetime.combine(start_date, time.min))
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    rows = AppointmentHistory.objects.filter(
+        timestamp__gte=start, timestamp__lt=end, booked_at__isnull=False,
+        previous_status='PENDING', new_status__in=DECIDED_STATUSES,
+    )
+    if doctor_id:
+        rows = rows.filter(doctor_id=doctor_id)
+    rows = rows.annotate(latency=ExpressionWrapper(F('timestamp') - F('booked_at'), output_field=DurationField()))
+    summary = rows.aggregate(count=Count('id'), mean=Avg('latency'))
+    count = summary['count']
+    if not count:
+        return {'count': 0, 'mean_hours': None, 'percentiles_hours': {}}
+    # Nearest-rank percentiles: only the row at each rank is read from the sorted column.
+    ordered = rows.order_by('latency', 'id').values_list('latency', flat=True)
+    return {
+        'count': count,
+        'mean_hours': _hours(summary['mean']),
+        'percentiles_hours': {
+            f'p{p}': _hours(ordered[max(math.ceil(p / 100 * count) - 1, 0)]) for p in PERCENTILES
+        },
+    }
@@ -4,19 +4,186 @@ from rest_framework import generics
 from rest_framework.generics import RetrieveAPIView
 from rest_framework import permissions
 from rest_framework.response import Response
+from rest_framework.parsers import MultiPartParser
 from rest_framework.views import APIView
+from django.db import transaction
 from django.shortcuts import get_object_or_404
-from .models import Appointment, AppointmentHistory, Doctor, Feedback, Service
-from .serializers import AppointmentSerializer, AppointmentHistorySerializer, DoctorSerializer, FeedbackSerializer, ServiceSerializer, UserSerializer, CalendarAppointmentSerializer
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
+from . import analytics, capacity, catalog, events, exports, fieldsets, imports, response_cache, search, stats, sync, timeline, transitions, versions
+from .models import Appointment, AppointmentHistory, Doctor, Feedback, Service, normalize_phone, phone_prefix_q
+from .pagination import KeysetPagination
+from .serializers import AppointmentSerializer, AppointmentHistorySerializer, DoctorSerializer, FeedbackSerializer, ServiceSerializer, UserSerializer, CalendarAppointmentSerializer, CalendarEventSerializer
 from django.contrib.auth import get_user_model
-import re
+import codecs
+import heapq
 
 User = get_user_model()
 
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+def parse_date_range(request, max_days=None):
+    """Read ``start_date``/``end_date`` query params.
+
+    Returns ``(start, end, None)`` or ``(None, None, error_response)``.
+    """
+    try:
+        start_date = parse_date(request.query_params.get('start_date', ''))
+        end_date = parse_date(request.query_params.get('end_date', ''))
+    except ValueError:
+        start_date = end_date = None
+    if not start_date or not end_date:
+        return None, None, Response(
+            {'error': 'start_date and end_date are required (YYYY-MM-DD)'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if end_date < start_date:
+        return None, None, Response(
+            {'error': 'end_date must not be before start_date'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if max_days and (end_date - start_date).days >= max_days:
+        return None, None, Response(
+            {'error': f'Date range cannot exceed {max_days} days'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return start_date, end_date, None
+
+
+class SparseFieldsViewMixin:
+    """Load only the columns needed for ``?fields=`` on read requests."""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        requested = fieldsets.requested_fields(self.request)
+        if not requested:
+            return queryset
+        keep = [self.keyset_field] if getattr(self, 'keyset_field', None) else []
+        return fieldsets.only_requested(queryset, self.get_serializer_class(), requested, keep=keep)
+
+
+class StreamingExportMixin:
+    """``export.csv`` / ``export.ndjson`` over ``get_queryset()``, streamed row by row.
+
+    Routed in urls.py with ``exports.PassthroughRenderer``; ``?fields=``
+    narrows the columns. Admins only, like the matching import action.
+    """
+    export_basename = None
+
+    def get_permissions(self):
+        if self.action == 'export':
+            return [permissions.IsAdminUser()]
+        return super().get_permissions()
+
+    def export(self, request, export_format=None):
+        columns = exports.columns_for(
+            self.get_queryset().model, self.get_serializer_class(), fieldsets.requested_fields(request)
+        )
+        if not columns:
+            return Response({'error': 'No exportable fields requested'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.get_queryset().order_by(f'-{self.keyset_field}', '-pk')
+        return exports.stream(queryset, columns, export_format, self.export_basename)
+
+
+class DeltaSyncMixin:
+    """``?since=<cursor>``: rows changed and ids deleted since an earlier list read.
+
+    Plain list responses carry the cursor to start from in ``X-Sync-Cursor``;
+    see ``dental.sync``.
+    """
+
+    def list(self, request, *args, **kwargs):
+        since = request.query_params.get('since')
+        if since is not None:
+            return self.changes(request, since)
+        next_cursor = sync.cursor()
+        response = super().list(request, *args, **kwargs)
+        response['X-Sync-Cursor'] = next_cursor
+        return response
+
+    def changes(self, request, since):
+        try:
+            rows, deleted, next_cursor = sync.changes(self.filter_queryset(self.get_queryset()), since)
+        except sync.InvalidCursor as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except sync.ResyncRequired as exc:
+            return Response({'detail': f'{exc}; reload the list.'}, status=status.HTTP_410_GONE)
+        return Response({'cursor': next_cursor, 'changed': self.get_serializer(rows, many=True).data, 'deleted': deleted})
+
+
+class CatalogViewMixin:
+    """Serve list/retrieve from ``dental.catalog``, with ETags; writes go through the model as usual."""
+    catalog_key = None
+
+    def filter_catalog(self, rows):
+        return rows
+
+    def catalog_response(self, request, select):
+        catalog_version, data = catalog.load()
+        etag = catalog.etag(request, catalog_version)
+        if versions.not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        result = select(data[self.catalog_key])
+        if result is None:
+            return None
+        requested = fieldsets.requested_fields(request)
+        if requested:
+            pick = lambda row: {name: value for name, value in row.items() if name in requested}
+            result = pick(result) if isinstance(result, dict) else [pick(row) for row in result]
+        return Response(result, headers={'ETag': etag})
+
+    def list(self, request, *args, **kwargs):
+        return self.catalog_response(request, self.filter_catalog)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = str(kwargs.get(self.lookup_url_kwarg or self.lookup_field))
+        response = self.catalog_response(request, lambda rows: next((row for row in rows if str(row['id']) == pk), None))
+        # Unknown ids fall through to the usual 404.
+        return response or super().retrieve(request, *args, **kwargs)
+
+
+class BulkImportMixin:
+    """``POST <prefix>/import/`` with a CSV/NDJSON ``file``; ``dry_run=1`` only validates."""
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser],
+            permission_classes=[permissions.IsAdminUser])
+    def bulk_import(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Upload the rows as a "file" field'}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or imports.format_of(upload.name)
+        if file_format not in ('csv', 'ndjson'):
+            return Response({'error': 'file_format must be csv or ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        lines = codecs.iterdecode(upload, 'utf-8-sig')
+        try:
+            report = imports.run(self.get_queryset().model, lines, file_format, dry_run=dry_run)
+        except UnicodeDecodeError:
+            return Response({'error': 'The file must be UTF-8 encoded'}, status=status.HTTP_400_BAD_REQUEST)
+        report['dry_run'] = dry_run
+        return Response(report)
+
+
+def availability_response(doctor_ids, request):
+    start_date, end_date, error = parse_date_range(request, max_days=capacity.MAX_AVAILABILITY_DAYS)
+    if error:
+        return error
+    slots = capacity.availability(doctor_ids, start_date, end_date)
+    return Response({
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'capacity': capacity.HOURLY_CAPACITY,
+        'hours': capacity.CLINIC_HOURS,
+        'doctors': [{'doctor_id': doctor_id, 'days': days} for doctor_id, days in slots.items()],
+    })
+
+
+class AppointmentViewSet(DeltaSyncMixin, SparseFieldsViewMixin, StreamingExportMixin, BulkImportMixin, viewsets.ModelViewSet):
     queryset = Appointment.objects.all().order_by('-created_at')
     serializer_class = AppointmentSerializer
+    pagination_class = KeysetPagination
+    keyset_field = 'created_at'
+    export_basename = 'appointments'
 
     def create(self, request, *args, **kwargs):
         # new appointments always start with PENDING
@@ -25,34 +192,19 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
         
-        # Validate max 3 appointments per hour before creating
+        # Validate max 3 overlapping appointments per doctor, atomically with the insert
         validated_data = serializer.validated_data
-        doctor_id = validated_data.get('doctor')
-        appointment_date = validated_data.get('appointment_date')
-        appointment_time = validated_data.get('appointment_time')
-        
-        if doctor_id and appointment_date and appointment_time:
-            # Extract hour from appointment_time (format: HH:MM)
-            hour = int(appointment_time.split(':')[0]) if ':' in str(appointment_time) else 0
-            
-            # Count existing appointments for this doctor, date, and hour
-            from django.db.models import Q
-            from datetime import timedelta
-            
-            # Count active appointments in the same hour
-            existing_count = Appointment.objects.filter(
-                doctor_id=doctor_id,
-                appointment_date=appointment_date,
-                appointment_time__startswith=f"{hour:02d}:"
-            ).count()
-            
-            if existing_count >= 3:
-                return Response(
-                    {'error': 'Maximum capacity reached. You cannot add more than 3 appointments in this hour.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        
-        self.perform_create(serializer)
+        doctor = validated_data.get('doctor')
+        try:
+            with transaction.atomic():
+                capacity.lock_doctor(doctor.pk if doctor else None)
+                self.perform_create(serializer)
+                capacity.check_overlap(serializer.instance)
+        except capacity.SlotFull:
+            return Response(
+                {'error': 'Maximum capacity reached. You cannot add more than 3 overlapping appointments.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
@@ -64,10 +216,6 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         
         instance = self.get_object()
         
-        # Store old status before any changes
-        old_status = instance.status
-        new_status = request.data.get('status', old_status)
-        
         try:
             # Process all allowed fields with partial=True for PATCH
             serializer = self.get_serializer(instance, data=request.data, partial=partial)
@@ -78,89 +226,25 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Validate max 3 appointments per hour if date/time/doctor is being changed
-            validated_data = serializer.validated_data
-            doctor_id = validated_data.get('doctor', instance.doctor_id)
-            appointment_date = validated_data.get('appointment_date', instance.appointment_date)
-            appointment_time = validated_data.get('appointment_time', instance.appointment_time)
-            
-            # Check if any relevant field is changing
-            if doctor_id and appointment_date and appointment_time:
-                # Extract hour from appointment_time (format: HH:MM)
-                hour = int(str(appointment_time).split(':')[0]) if appointment_time else 0
-                
-                # Count existing appointments for this doctor, date, and hour (excluding current appointment)
-                existing_count = Appointment.objects.filter(
-                    doctor_id=doctor_id,
-                    appointment_date=appointment_date,
-                    appointment_time__startswith=f"{hour:02d}:"
-                ).exclude(id=instance.id).count()
-                
-                if existing_count >= 3:
-                    return Response(
-                        {'detail': 'You cannot add more than 3 appointments in this hour.'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-            
-            # ✅ UPDATE THE APPOINTMENT FIRST with all changes
-            self.perform_update(serializer)
+            # ✅ Apply changes, check overlaps (max 3 at once) and record history in one transaction
+            changed_by = str(request.user) if request.user.is_authenticated else 'api'
+            try:
+                appointment, history_entry = transitions.apply(instance.pk, serializer.validated_data, changed_by)
+            except capacity.SlotFull:
+                return Response(
+                    {'detail': 'You cannot add more than 3 overlapping appointments.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             
-            # ✅ Create history entry if status is changing
-            if old_status != new_status:
-                # Get the updated instance to capture new data
-                instance.refresh_from_db()
-                doc = instance.doctor
-                
-                try:
-                    # Create history entry with UPDATED data (after changes)
-                    history_entry = AppointmentHistory.objects.create(
-                        appointment=instance,
-                        name=instance.name,
-                        email=instance.email,
-                        phone=instance.phone,
-                        service_name=instance.service.name if instance.service else None,
-                        service_id=instance.service.id if instance.service else None,
-                        appointment_date=instance.appointment_date,
-                        appointment_time=instance.appointment_time,
-                        message=instance.message,
-                        doctor_id=getattr(doc, 'id', None),
-                        doctor_name=getattr(doc, 'name', None),
-                        previous_status=old_status,
-                        new_status=new_status,
-                        changed_by=str(request.user) if request.user.is_authenticated else 'api',
-                        notes=instance.admin_notes or ''
-                    )
-                    
-                    # ✅ MATCH Django admin behavior: delete appointment if APPROVED or REJECTED
-                    if new_status in ('APPROVED', 'REJECTED'):
-                        # Prepare response data with updated instance info
-                        response_data = {
-                            'id': instance.id,
-                            'name': instance.name,
-                            'email': instance.email,
-                            'phone': instance.phone,
-                            'status': new_status,
-                            'deleted': True,
-                            'moved_to_history': True,
-                            'history_id': history_entry.id,
-                            'message': f'Appointment {new_status.lower()} and moved to history'
-                        }
-                        # Delete the appointment
-                        instance.delete()
-                        return Response(response_data, status=status.HTTP_200_OK)
-                
-                except Exception as e:
-                    import traceback
-                    error_msg = str(e)
-                    traceback.print_exc()
-                    print(f"Error creating history entry: {error_msg}")
-                    return Response(
-                        {'detail': f'Failed to create history entry: {error_msg}'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
+            # ✅ MATCH Django admin behavior: APPROVED or REJECTED appointments move to history
+            if history_entry and history_entry.new_status in transitions.FINAL_STATUSES:
+                return Response(
+                    transitions.moved_to_history_response(appointment, history_entry),
+                    status=status.HTTP_200_OK
+                )
             
             # Return updated data
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return Response(self.get_serializer(appointment).data, status=status.HTTP_200_OK)
             
         except Exception as e:
             import traceback
@@ -174,70 +258,104 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def by_phone(self, request):
-        import re
-        from datetime import datetime
-        from django.db.models import Q
-
         try:
             phone = request.query_params.get('phone', '').strip()
             if not phone:
                 return Response([], status=200)
 
             # Normalize query to digits only
-            query_digits = re.sub(r"\D", "", str(phone))
+            query_digits = normalize_phone(phone)
             if not query_digits:
                 return Response([], status=200)
 
-            results = []
+            # Prefix match on the indexed phone_digits column of both tables
+            appointments = (
+                Appointment.objects.filter(phone_prefix_q(query_digits))
+                .select_related('service')
+                .order_by('-created_at')
+            )
+            history = AppointmentHistory.objects.filter(phone_prefix_q(query_digits)).order_by('-timestamp')
 
-            # Search active appointments using partial match
-            appointments = Appointment.objects.all().order_by('-created_at')
+            active_results = []
             for appointment in appointments:
-                try:
-                    if not appointment.phone:
-                        continue
-                    normalized = re.sub(r"\D", "", str(appointment.phone))
-                    if normalized.startswith(query_digits):
-                        data = AppointmentSerializer(appointment).data
-                        data['_source'] = 'active'
-                        data['_sort_timestamp'] = appointment.created_at.isoformat()
-                        results.append(data)
-                except Exception:
-                    continue
-
-            # Search appointment history using partial match
-            history = AppointmentHistory.objects.all().order_by('-timestamp')
-            for entry in history:
-                try:
-                    if not entry.phone:
-                        continue
-                    normalized = re.sub(r"\D", "", str(entry.phone))
-                    if normalized.startswith(query_digits):
-                        data = AppointmentHistorySerializer(entry).data
-                        data['_source'] = 'history'
-                        data['_sort_timestamp'] = entry.timestamp.isoformat()
-                        results.append(data)
-                except Exception:
-                    continue
-
-            # Sort all results by timestamp (most recent first)
-            results.sort(key=lambda x: x.get('_sort_timestamp', ''), reverse=True)
-
-            # Remove temporary sort field
-            for result in results:
-                result.pop('_sort_timestamp', None)
+                data = AppointmentSerializer(appointment).data
+                data['_source'] = 'active'
+                active_results.append((appointment.created_at, data))
 
+            history_results = []
+            for entry in history:
+                data = AppointmentHistorySerializer(entry).data
+                data['_source'] = 'history'
+                history_results.append((entry.timestamp, data))
+
+            # Both lists are already newest-first, so merge them by timestamp
+            results = [
+                data for _, data in heapq.merge(active_results, history_results, key=lambda item: item[0], reverse=True)
+            ]
             return Response(results, status=200)
 
-        except Exception as exc:
-            return Response({'error': str(exc)}, status=200)
         except Exception as exc:
             # Always return JSON on unexpected failures
-            return Response({'error': str(exc)}, status=500)
+            return Response({'error': str(exc)}, status=200)
+
+    @action(detail=False, methods=['post'])
+    def bulk_transition(self, request):
+        """Approve or reject many appointments at once, moving them to history.
+
+        Body: ``{"ids": [1, 2, 3], "status": "APPROVED"}``. Each result has the
+        same shape as a single approve/reject through ``update``.
+        """
+        ids = request.data.get('ids')
+        new_status = request.data.get('status')
+        if not isinstance(ids, list) or not ids:
+            return Response({'detail': 'ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ids = [int(pk) for pk in ids]
+        except (TypeError, ValueError):
+            return Response({'detail': 'ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if new_status not in transitions.FINAL_STATUSES:
+            return Response(
+                {'detail': f'status must be one of {", ".join(transitions.FINAL_STATUSES)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        changed_by = str(request.user) if request.user.is_authenticated else 'api'
+        results = transitions.bulk_transition(ids, new_status, changed_by)
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def timeline(self, request):
+        """Paginated newest-first timeline of a patient's appointments and history.
+
+        Query params: ``phone`` (prefix, any formatting), ``limit`` and the
+        ``cursor`` returned as ``next_cursor`` by the previous page.
+        """
+        query_digits = normalize_phone(request.query_params.get('phone', '').strip())
+        if not query_digits:
+            return Response({'results': [], 'next_cursor': None})
+
+        try:
+            limit = int(request.query_params.get('limit', timeline.DEFAULT_LIMIT))
+        except (TypeError, ValueError):
+            limit = timeline.DEFAULT_LIMIT
+        limit = min(max(limit, 1), timeline.MAX_LIMIT)
+
+        cursor = request.query_params.get('cursor')
+        try:
+            cursor = timeline.decode_cursor(cursor) if cursor else None
+        except timeline.InvalidCursor:
+            return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results, next_cursor = timeline.page(query_digits, limit=limit, cursor=cursor)
+        return Response({'results': results, 'next_cursor': next_cursor})
 
     @action(detail=False, methods=['get'])
     def calendar(self, request):
-        """Return appointments formatted for calendar view. Excludes rejected appointments."""
+        """Return appointments formatted for calendar view. Excludes rejected appointments.
+
+        Pass ``compact=1`` for slim events whose ``service``/``doctor`` are ids
+        into ``services``/``doctors`` lookup tables sent once per response.
+        """
         try:
             start_date = request.query_params.get('start_date')
             end_date = request.query_params.get('end_date')
@@ -249,27 +367,48 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Filter appointments by date range - exclude rejected appointments globally
-            appointments = Appointment.objects.filter(
-                appointment_date__gte=start_date,
-                appointment_date__lte=end_date
-            ).exclude(status='REJECTED')
-
-            # Filter by doctor if specified
-            if doctor_id:
-                appointments = appointments.filter(doctor_id=doctor_id)
+            # Answer from the per-day version counters when the client is already current
+            etag = versions.range_etag(request, start_date, end_date, doctor_id or None, catalog_version=catalog.version())
+            if versions.not_modified(request, etag):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
 
-            # Use calendar serializer
-            serializer = CalendarAppointmentSerializer(appointments, many=True)
-            return Response(serializer.data)
+            data = response_cache.cached(request, etag, lambda: self.calendar_data(request, start_date, end_date, doctor_id))
+            return Response(data, headers={'ETag': etag})
 
         except Exception as exc:
             return Response({'error': str(exc)}, status=500)
 
+    def calendar_data(self, request, start_date, end_date, doctor_id):
+        # Filter appointments by date range - exclude rejected appointments globally
+        appointments = Appointment.objects.filter(
+            appointment_date__gte=start_date,
+            appointment_date__lte=end_date
+        ).exclude(status='REJECTED').select_related('service', 'doctor__service')
+
+        # Filter by doctor if specified
+        if doctor_id:
+            appointments = appointments.filter(doctor_id=doctor_id)
+
+        if request.query_params.get('compact') in ('1', 'true'):
+            appointments = list(appointments)
+            services = {a.service_id: a.service for a in appointments if a.service_id}
+            doctors = {a.doctor_id: a.doctor for a in appointments if a.doctor_id}
+            return {
+                'services': {pk: ServiceSerializer(service).data for pk, service in services.items()},
+                'doctors': {pk: DoctorSerializer(doctor).data for pk, doctor in doctors.items()},
+                'events': CalendarEventSerializer(appointments, many=True, context={'request': request}).data,
+            }
 
-class AppointmentHistoryViewSet(viewsets.ModelViewSet):
+        # Use calendar serializer
+        return CalendarAppointmentSerializer(appointments, many=True, context={'request': request}).data
+
+
+class AppointmentHistoryViewSet(DeltaSyncMixin, SparseFieldsViewMixin, StreamingExportMixin, BulkImportMixin, viewsets.ModelViewSet):
     queryset = AppointmentHistory.objects.all().order_by('-timestamp')
     serializer_class = AppointmentHistorySerializer
+    pagination_class = KeysetPagination
+    keyset_field = 'timestamp'
+    export_basename = 'history'
 
     def get_queryset(self):
         """Filter history by phone number, date range, and doctor_id if provided. Excludes rejected appointments for calendar views."""
@@ -278,12 +417,10 @@ class AppointmentHistoryViewSet(viewsets.ModelViewSet):
         # Filter by phone number if provided
         phone = self.request.query_params.get('phone', None)
         if phone:
-            import re
-            # Normalize to digits only for flexible matching
-            query_digits = re.sub(r"\D", "", str(phone))
+            # Normalize to digits only and match on the indexed phone_digits column
+            query_digits = normalize_phone(phone)
             if query_digits:
-                # Filter records where phone contains the search digits
-                qs = qs.filter(phone__icontains=query_digits)
+                qs = qs.filter(phone_prefix_q(query_digits))
         
         # Filter by date range if provided
         start_date = self.request.query_params.get('start_date', None)
@@ -308,23 +445,53 @@ class AppointmentHistoryViewSet(viewsets.ModelViewSet):
         
         return qs
 
+    def list(self, request, *args, **kwargs):
+        """Date-ranged lists (the calendar's history overlay) support conditional GET."""
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+        if not (start_date and end_date) or 'since' in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        try:
+            doctor_id = int(request.query_params['doctor_id']) if request.query_params.get('doctor_id') else None
+        except (TypeError, ValueError):
+            doctor_id = None
+        etag = versions.range_etag(request, start_date, end_date, doctor_id)
+        if versions.not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        listing = super().list
+        data = response_cache.cached(request, etag, lambda: listing(request, *args, **kwargs).data)
+        return Response(data, headers={'ETag': etag})
+
     @action(detail=True, methods=['post'])
     def mark_visited(self, request, pk=None):
         """Mark a history entry as visited (patient arrived)."""
         obj = get_object_or_404(AppointmentHistory, pk=pk)
         obj.visited = 'visited'
         obj.save()
+        events.publish(obj)
         return Response(self.get_serializer(obj).data)
 
 
-class ServiceViewSet(viewsets.ModelViewSet):
+class ServiceViewSet(CatalogViewMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Service.objects.all().order_by('name')
     serializer_class = ServiceSerializer
+    catalog_key = 'services'
+
+    @action(detail=True, methods=['get'])
+    def availability(self, request, pk=None):
+        """Remaining hourly capacity for every active doctor of this service."""
+        service = self.get_object()
+        doctor_ids = list(
+            Doctor.objects.filter(service=service, active=True).order_by('name').values_list('id', flat=True)
+        )
+        return availability_response(doctor_ids, request)
 
 
-class DoctorViewSet(viewsets.ModelViewSet):
-    queryset = Doctor.objects.order_by('name')
+class DoctorViewSet(CatalogViewMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
+    queryset = Doctor.objects.select_related('service').order_by('name')
     serializer_class = DoctorSerializer
+    catalog_key = 'doctors'
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -332,32 +499,153 @@ class DoctorViewSet(viewsets.ModelViewSet):
         if service:
             qs = qs.filter(service=service)
         return qs
-class FeedbackListCreateView(generics.ListCreateAPIView):
+
+    def filter_catalog(self, rows):
+        service = self.request.query_params.get('service')
+        if service:
+            rows = [row for row in rows if str(row['service']) == service]
+        return rows
+
+    @action(detail=True, methods=['get'])
+    def availability(self, request, pk=None):
+        """Remaining hourly capacity per day for this doctor, e.g. to grey out full slots when booking."""
+        doctor = self.get_object()
+        return availability_response([doctor.id], request)
+
+
+class FeedbackListCreateView(DeltaSyncMixin, SparseFieldsViewMixin, generics.ListCreateAPIView):
     queryset = Feedback.objects.all().order_by('-created_at')
     serializer_class = FeedbackSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
+    keyset_field = 'created_at'
 
     def get_queryset(self):
         qs = super().get_queryset()
         phone = self.request.query_params.get('phone', None)
 
         if phone:
-            query_digits = re.sub(r"\D", "", str(phone))
+            query_digits = normalize_phone(phone)
             if query_digits:
-                qs = qs.filter(phone__icontains=query_digits)
+                qs = qs.filter(phone_prefix_q(query_digits))
 
         return qs
 
 
-class FeedbackDetailView(generics.RetrieveUpdateDestroyAPIView):
+class FeedbackDetailView(SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Feedback.objects.all()
     serializer_class = FeedbackSerializer
     permission_classes = [permissions.AllowAny]
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class SearchView(APIView):
+    """Ranked full-text search across appointments, history and feedback.
+
+    ``GET /api/search/?q=<text>&kind=history&limit=20``; ``kind`` may repeat.
+    """
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        kinds = [kind for kind in request.query_params.getlist('kind') if kind in search.MODELS]
+        try:
+            limit = int(request.query_params.get('limit', search.DEFAULT_LIMIT))
+        except (TypeError, ValueError):
+            limit = search.DEFAULT_LIMIT
+        limit = min(max(limit, 1), search.MAX_LIMIT)
+        return Response({'query': query, 'results': search.search(query, kinds=kinds, limit=limit)})
+
+
+class OccupancyView(APIView):
+    """Doctor × day × hour peak concurrent bookings for heatmaps.
+
+    ``GET /api/occupancy/?start_date=&end_date=&service=``. Each doctor's
+    ``booked`` holds one string per day with one base-36 digit per entry of
+    ``hours``, to compare against ``capacity``.
+    """
+
+    def get(self, request):
+        start_date, end_date, error = parse_date_range(request, max_days=capacity.MAX_AVAILABILITY_DAYS)
+        if error:
+            return error
+        service_id = request.query_params.get('service')
+        if service_id and not service_id.isdigit():
+            return Response({'error': 'service must be a service id'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'capacity': capacity.HOURLY_CAPACITY,
+            'hours': capacity.CLINIC_HOURS,
+            'doctors': capacity.occupancy(start_date, end_date, service_id=service_id),
+        })
+
+
+class StatsView(APIView):
+    """Dashboard counts: appointments by status/doctor/service/day, history and totals.
+
+    ``GET /api/stats/?start_date=&end_date=`` bounds ``by_day`` (default: the
+    next 30 days). Results are cached for ``stats.CACHE_SECONDS``.
+    """
+
+    def get(self, request):
+        if 'start_date' in request.query_params or 'end_date' in request.query_params:
+            start_date, end_date, error = parse_date_range(request, max_days=capacity.MAX_AVAILABILITY_DAYS)
+            if error:
+                return error
+        else:
+            start_date = timezone.localdate()
+            end_date = start_date + timedelta(days=30)
+        return Response(stats.summary(start_date, end_date))
+
+
+class AnalyticsViewSet(viewsets.ViewSet):
+    """Staffing analytics over ``start_date``..``end_date``, cached per range.
+
+    ``no_show`` accepts ``group=doctor|service``; ``lead_time`` and
+    ``decision_latency`` accept an optional ``doctor_id``.
+    """
+
+    def _params(self, request):
+        start_date, end_date, error = parse_date_range(request)
+        if error:
+            return None, None, None, error
+        doctor_id = request.query_params.get('doctor_id') or None
+        if doctor_id and not doctor_id.isdigit():
+            return None, None, None, Response(
+                {'error': 'doctor_id must be a doctor id'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return start_date, end_date, doctor_id, None
+
+    @action(detail=False, methods=['get'])
+    def no_show(self, request):
+        start_date, end_date, _, error = self._params(request)
+        if error:
+            return error
+        group = request.query_params.get('group', 'doctor')
+        if group not in analytics.GROUPS:
+            return Response({'error': 'group must be doctor or service'}, status=status.HTTP_400_BAD_REQUEST)
+        results = analytics.cached('no_show', analytics.no_show_rates, start_date, end_date, group)
+        return Response({'group': group, 'results': results})
+
+    @action(detail=False, methods=['get'])
+    def lead_time(self, request):
+        start_date, end_date, doctor_id, error = self._params(request)
+        if error:
+            return error
+        return Response(analytics.cached('lead_time', analytics.lead_time_histogram, start_date, end_date, doctor_id))
+
+    @action(detail=False, methods=['get'])
+    def decision_latency(self, request):
+        start_date, end_date, doctor_id, error = self._params(request)
+        if error:
+            return error
+        return Response(analytics.cached('latency', analytics.decision_latency, start_date, end_date, doctor_id))
+
+
+class UserViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = User.objects.all().order_by('-date_joined')
     serializer_class = UserSerializer
+    pagination_class = KeysetPagination
+    keyset_field = 'date_joined'
     
     def get_permissions(self):
         """
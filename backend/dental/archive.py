@@ -0,0 +1,183 @@
+"""Cold storage for old AppointmentHistory rows.
+
+Rows older than a horizon are written to gzip-compressed NDJSON files, one
+or more per calendar month under ``HISTORY_ARCHIVE_DIR/YYYY-MM/``, recorded
+in the HistoryArchive manifest and then deleted from the hot table in
+chunks. Archived months can be searched in place or restored.
+
+Every run writes files under new names. If a run is interrupted after a
+file is written, the rows still in the hot table are archived again by the
+next run into a file of its own: ``query`` may then return such rows twice,
+and ``restore`` skips ids that already exist.
+"""
+import gzip
+import json
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+
+from . import rollups, search, sync, versions
+from .models import Appointment, AppointmentHistory, HistoryArchive, normalize_phone
+
+CHUNK_SIZE = 1000
+FIELDS = list(AppointmentHistory._meta.concrete_fields)
+ATTNAMES = [field.attname for field in FIELDS]
+
+
+def archive_dir():
+    return Path(getattr(settings, 'HISTORY_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'archive' / 'history'))
+
+
+def _from_values(values):
+    return AppointmentHistory(**{
+        field.attname: field.to_python(values.get(field.attname)) for field in FIELDS if field.attname in values
+    })
+
+
+def _delete_chunk(ids, days, entries):
+    """Delete one chunk of archived rows together with its bookkeeping; call inside a transaction."""
+    search.unindex_many('history', ids)
+    sync.delete(AppointmentHistory, ids)
+    versions.bump(days)
+    rollups.add(entries, sign=-1)
+
+
+def archive_before(cutoff, chunk_size=CHUNK_SIZE, dry_run=False, log=None):
+    """Archive every history row with ``timestamp < cutoff``; returns rows archived."""
+    stale = AppointmentHistory.objects.filter(timestamp__lt=cutoff)
+    months = stale.annotate(month=TruncMonth('timestamp')).values_list('month', flat=True).distinct().order_by('month')
+    total = 0
+    for month in months:
+        month_rows = stale.filter(timestamp__year=month.year, timestamp__month=month.month)
+        if dry_run:
+            count = month_rows.count()
+            if log:
+                log(f'{month:%Y-%m}: would archive {count} rows')
+            total += count
+            continue
+        total += _archive_month(month.date(), month_rows, chunk_size, log)
+    return total
+
+
+def _archive_month(month, rows, chunk_size, log):
+    ids = list(rows.order_by('id').values_list('id', flat=True))
+    if not ids:
+        return 0
+    # unique per run, so a rerun after an interrupted one never reuses a name
+    relative = Path(f'{month:%Y-%m}') / f'history-{ids[0]}-{ids[-1]}-{uuid.uuid4().hex[:8]}.ndjson.gz'
+    target = archive_dir() / relative
+    target.parent.mkdir(parents=True, exist_ok=True)
+    partial = target.with_suffix('.partial')
+
+    oldest = newest = None
+    # (ids, calendar days, rollup entries) per chunk, deleted chunk by chunk below
+    chunks = []
+    with gzip.open(partial, 'wt', encoding='utf-8') as out:
+        for start in range(0, len(ids), chunk_size):
+            chunk_ids, days, entries = ids[start:start + chunk_size], set(), []
+            chunk = AppointmentHistory.objects.filter(id__in=chunk_ids).order_by('id')
+            for values in chunk.values(*ATTNAMES):
+                out.write(json.dumps(values, cls=DjangoJSONEncoder) + '\n')
+                timestamp = values['timestamp']
+                oldest = timestamp if oldest is None else min(oldest, timestamp)
+                newest = timestamp if newest is None else max(newest, timestamp)
+                days.add(versions.day_key(values['doctor_id'], values['appointment_date']))
+                entries.append(_from_values(values).rollup_entry())
+            chunks.append((chunk_ids, days, entries))
+    os.replace(partial, target)
+
+    HistoryArchive.objects.create(
+        month=month, path=str(relative), row_count=len(ids),
+        first_id=ids[0], last_id=ids[-1], oldest=oldest, newest=newest,
+    )
+    # Each chunk's rollup and calendar adjustments commit with its delete, so
+    # an interrupted run leaves the counters matching the rows still present.
+    for chunk_ids, days, entries in chunks:
+        with transaction.atomic():
+            _delete_chunk(chunk_ids, days, entries)
+    if log:
+        log(f'{month:%Y-%m}: archived {len(ids)} rows to {relative}')
+    return len(ids)
+
+
+def parse_month(value):
+    """Parse ``YYYY-MM`` into the first day of that month."""
+    return datetime.strptime(value, '%Y-%m').date()
+
+
+def _manifest(since=None, until=None):
+    entries = HistoryArchive.objects.all()
+    if since:
+        entries = entries.filter(month__gte=since)
+    if until:
+        entries = entries.filter(month__lte=until)
+    return entries
+
+
+def read(entry):
+    """Yield the archived rows of one manifest entry as dicts."""
+    with gzip.open(archive_dir() / entry.path, 'rt', encoding='utf-8') as source:
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+
+
+def query(phone=None, since=None, until=None):
+    """Yield archived rows, optionally only those whose phone starts with ``phone``.
+
+    ``since``/``until`` are month dates; the manifest narrows which files are read.
+    """
+    digits = normalize_phone(phone) if phone else ''
+    for entry in _manifest(since, until):
+        for values in read(entry):
+            if not digits or (values.get('phone_digits') or '').startswith(digits):
+                yield values
+
+
+def restore(since=None, until=None, chunk_size=CHUNK_SIZE, log=None):
+    """Move archived months back into the hot table; returns rows restored."""
+    total = 0
+    for entry in _manifest(since, until):
+        restored = 0
+        batch = []
+        for values in read(entry):
+            batch.append(_from_values(values))
+            if len(batch) >= chunk_size:
+                restored += _restore_batch(batch)
+                batch = []
+        restored += _restore_batch(batch)
+        (archive_dir() / entry.path).unlink(missing_ok=True)
+        entry.delete()
+        if log:
+            log(f'{entry.month:%Y-%m}: restored {restored} rows from {entry.path}')
+        total += restored
+    return total
+
+
+def _restore_batch(rows):
+    if not rows:
+        return 0
+    existing = set(AppointmentHistory.objects.filter(id__in=[row.id for row in rows]).values_list('id', flat=True))
+    rows = [row for row in rows if row.id not in existing]
+    if not rows:
+        return 0
+    # Keep the link only when the original appointment is still around.
+    linked = set(Appointment.objects.filter(
+        id__in=[row.appointment_id for row in rows if row.appointment_id]
+    ).values_list('id', flat=True))
+    for row in rows:
+        if row.appointment_id not in linked:
+            row.appointment_id = None
+    with transaction.atomic():
+        # timestamp only defaults to now, so the archived value is kept
+        AppointmentHistory.objects.bulk_create(rows)
+        search.index_new(rows)
+        rollups.added(rows)
+        versions.touch(*rows)
+    return len(rows)
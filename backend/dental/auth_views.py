@@ -1,9 +1,12 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
+from . import revocation
+from .authentication import tokens_for
 
 
 class AdminLoginView(APIView):
@@ -46,8 +49,8 @@ class AdminLoginView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        # Generate JWT tokens carrying the user's claims, so later requests need no user lookup
+        refresh = tokens_for(user)
 
         return Response({
             'access': str(refresh.access_token),
@@ -91,11 +94,25 @@ class AdminVerifyView(APIView):
 
 class AdminLogoutView(APIView):
     """
-    Logout view (client-side token removal is sufficient for JWT)
+    Logout view: revokes the access token used for the request and, when
+    sent as ``refresh``, the refresh token issued with it
     """
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
+        if request.auth is not None:
+            revocation.revoke(request.auth)
+
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                revocation.revoke(RefreshToken(refresh))
+            except TokenError:
+                return Response(
+                    {'error': 'Invalid refresh token'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
         return Response(
             {'message': 'Logged out successfully'},
             status=status.HTTP_200_OK
@@ -0,0 +1,95 @@
+"""JWT authentication without a user query per request.
+
+Tokens issued by ``tokens_for`` carry the user's username, email and flags
+as signed claims, and ``ClaimsJWTAuthentication`` builds ``request.user``
+from them. Tokens without those claims, and tokens issued before the user
+was last changed, fall back to loading the user through a short-TTL
+in-process cache. Changing or deleting a user (see signals) records the
+time in the database, which every worker mirrors in memory alongside the
+revoked tokens (``dental.revocation``): edits and deactivation take effect
+at once in the worker that made them and within ``revocation.SYNC_SECONDS``
+in the others, and revoked tokens are refused the same way.
+"""
+import time
+
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import revocation
+
+USER_CLAIMS = ('username', 'email', 'is_superuser', 'is_staff', 'is_active')
+USER_CACHE_SECONDS = 60
+
+# str(user id), as in the token claim -> (expires at, loaded at, user)
+_users = {}
+
+
+def tokens_for(user):
+    """Refresh token (and, through it, access token) carrying the user's claims."""
+    refresh = RefreshToken.for_user(user)
+    for claim in USER_CLAIMS:
+        refresh[claim] = getattr(user, claim)
+    return refresh
+
+
+def user_changed(user_id):
+    """Stop trusting claims issued to ``user_id`` until now, and rows cached before now."""
+    revocation.user_changed(user_id)
+
+
+class ClaimsUser(TokenUser):
+    """``request.user`` built from token claims."""
+
+    def __str__(self):
+        return self.username
+
+    @cached_property
+    def id(self):
+        # simplejwt stores the id claim as a string; match User.id.
+        user_id = self.token[api_settings.USER_ID_CLAIM]
+        return int(user_id) if str(user_id).isdigit() else user_id
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+    @cached_property
+    def is_active(self):
+        return self.token.get('is_active', False)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if revocation.is_revoked(token.get('jti', '')):
+            raise InvalidToken('Token has been revoked')
+        return token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        if all(claim in validated_token for claim in USER_CLAIMS):
+            changed = revocation.changed_at(user_id)
+            if changed is None or validated_token.get('iat', 0) > changed:
+                user = ClaimsUser(validated_token)
+                if not user.is_active:
+                    raise AuthenticationFailed('User is inactive', code='user_inactive')
+                return user
+        return self.cached_user(validated_token, user_id)
+
+    def cached_user(self, validated_token, user_id):
+        expires, loaded, user = _users.get(str(user_id), (0, 0, None))
+        changed = revocation.changed_at(user_id)
+        if expires < time.monotonic() or (changed is not None and changed >= loaded):
+            loaded = time.time()
+            # Raises for unknown and inactive users, which are therefore never cached.
+            user = super().get_user(validated_token)
+            _users[str(user_id)] = (time.monotonic() + USER_CACHE_SECONDS, loaded, user)
+        return user
@@ -0,0 +1,180 @@
+"""Booking capacity: overlap checks and the hourly views built on them.
+
+A doctor may have at most HOURLY_CAPACITY appointments running at the same
+moment. Each appointment stores its ``[start_minute, end_minute)`` interval
+(from its time and service duration), so the check is an indexed range scan
+over the doctor's day. Bookings of one doctor are serialized while checking:
+by a row lock on the doctor where the database supports it, and by SQLite's
+single writer otherwise (the appointment row is written before the check).
+
+The availability and occupancy views read the same intervals and apply the
+same peak-overlap rule per clinic hour, so an hour they report as open
+accepts a booking that starts on the hour and lasts up to an hour.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import FilteredRelation, Q
+
+from .models import Appointment, Doctor
+
+HOURLY_CAPACITY = 3
+# Bookable hours, matching the calendar grid (08:00 through the 19:00 slot).
+CLINIC_HOURS = list(range(8, 20))
+MAX_AVAILABILITY_DAYS = 93
+CLINIC_START, CLINIC_END = CLINIC_HOURS[0] * 60, (CLINIC_HOURS[-1] + 1) * 60
+# One character per hour in occupancy strings: 0-9 then a-z, so counts up to 35.
+OCCUPANCY_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+class SlotFull(Exception):
+    """Raised when a booking would overlap HOURLY_CAPACITY others of the same doctor."""
+
+
+def interval_of(appointment):
+    """``(doctor_id, date, start_minute, end_minute)`` of a saved appointment, or None."""
+    if not (appointment.doctor_id and appointment.appointment_date and appointment.start_minute is not None):
+        return None
+    return (appointment.doctor_id, appointment.appointment_date, appointment.start_minute, appointment.end_minute)
+
+
+def lock_doctor(doctor_id):
+    """Serialize bookings for one doctor until the end of the transaction."""
+    if doctor_id and connection.features.has_select_for_update:
+        list(Doctor.objects.select_for_update().filter(pk=doctor_id).values_list('pk'))
+
+
+def peak_overlap(intervals, start, end):
+    """Largest number of ``intervals`` running at once within ``[start, end)``."""
+    edges = []
+    for begin, finish in intervals:
+        begin, finish = max(begin, start), min(finish, end)
+        if begin < finish:
+            edges.append((begin, 1))
+            edges.append((finish, -1))
+    # ends sort before starts at the same minute: back-to-back bookings do not overlap
+    running = peak = 0
+    for _, step in sorted(edges):
+        running += step
+        peak = max(peak, running)
+    return peak
+
+
+def check_overlap(appointment):
+    """Raise SlotFull if the saved ``appointment`` pushes its doctor past HOURLY_CAPACITY.
+
+    Call inside the booking transaction, after the row is written and with
+    the doctor locked (see ``lock_doctor``).
+    """
+    interval = interval_of(appointment)
+    if interval is None:
+        return
+    doctor_id, day, start, end = interval
+    # (doctor, appointment_date, start_minute) index: a range scan bounded by start_minute < end
+    overlapping = Appointment.objects.filter(
+        doctor_id=doctor_id, appointment_date=day, start_minute__lt=end, end_minute__gt=start,
+    ).values_list('start_minute', 'end_minute')
+    if peak_overlap(overlapping, start, end) > HOURLY_CAPACITY:
+        raise SlotFull(interval)
+
+
+def hourly_peaks(intervals):
+    """Peak number of ``intervals`` running at once in each hour of CLINIC_HOURS.
+
+    One sweep over the day's sorted edges: the running count carries over
+    from one hour to the next, so each interval is looked at once.
+    """
+    edges = []
+    for begin, finish in intervals:
+        begin, finish = max(begin, CLINIC_START), min(finish, CLINIC_END)
+        if begin < finish:
+            edges.append((begin, 1))
+            edges.append((finish, -1))
+    if not edges:
+        return [0] * len(CLINIC_HOURS)
+    edges.sort()
+    peaks = []
+    running = position = 0
+    for hour in CLINIC_HOURS:
+        start, end = hour * 60, hour * 60 + 60
+        # bookings running at the top of the hour, ends first as in peak_overlap
+        while position < len(edges) and edges[position][0] <= start:
+            running += edges[position][1]
+            position += 1
+        peak = running
+        while position < len(edges) and edges[position][0] < end:
+            running += edges[position][1]
+            peak = max(peak, running)
+            position += 1
+        peaks.append(peak)
+    return peaks
+
+
+def _clinic_day(prefix=''):
+    """Intervals (under relation ``prefix``) that touch the clinic hours."""
+    return Q(**{
+        f'{prefix}start_minute__lt': CLINIC_END,
+        f'{prefix}end_minute__gt': CLINIC_START,
+    })
+
+
+def availability(doctor_ids, start_date, end_date):
+    """Remaining capacity per doctor, day and clinic hour over a date range.
+
+    Reads the appointment intervals of the whole range in one query and
+    returns ``{doctor_id: [{'date': ..., 'remaining': [...]}, ...]}`` with
+    one ``remaining`` entry per hour in CLINIC_HOURS: HOURLY_CAPACITY minus
+    the most appointments running at once during that hour.
+    """
+    days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    intervals = {doctor_id: defaultdict(list) for doctor_id in doctor_ids}
+    rows = Appointment.objects.filter(
+        _clinic_day(), doctor_id__in=intervals.keys(), appointment_date__range=(start_date, end_date),
+    ).values_list('doctor_id', 'appointment_date', 'start_minute', 'end_minute')
+    for doctor_id, day, start, end in rows:
+        intervals[doctor_id][day].append((start, end))
+    return {
+        doctor_id: [
+            {'date': day.isoformat(), 'remaining': [max(HOURLY_CAPACITY - peak, 0) for peak in hourly_peaks(by_day.get(day, ()))]}
+            for day in days
+        ]
+        for doctor_id, by_day in intervals.items()
+    }
+
+
+def occupancy(start_date, end_date, service_id=None):
+    """Peak concurrent bookings of every active doctor per day and clinic hour.
+
+    Doctors and their appointment intervals in range come from a single
+    LEFT JOIN, so doctors without bookings still get a row. Each day is
+    encoded as a string with one OCCUPANCY_DIGITS character per hour in
+    CLINIC_HOURS (``int(char, 36)`` decodes it); counts beyond 35 saturate.
+    Returns ``[{'doctor_id', 'name', 'service_id', 'booked': [str per day]}]``.
+    """
+    day_count = (end_date - start_date).days + 1
+    doctors = Doctor.objects.filter(active=True)
+    if service_id:
+        doctors = doctors.filter(service_id=service_id)
+    rows = doctors.annotate(booking=FilteredRelation('appointments', condition=Q(
+        _clinic_day('appointments__'), appointments__appointment_date__range=(start_date, end_date),
+    ))).order_by('name', 'id').values_list(
+        'id', 'name', 'service_id', 'booking__appointment_date', 'booking__start_minute', 'booking__end_minute',
+    )
+
+    grid = {}
+    for doctor_id, name, service, day, start, end in rows:
+        if doctor_id not in grid:
+            grid[doctor_id] = {
+                'doctor_id': doctor_id, 'name': name, 'service_id': service,
+                'intervals': [[] for _ in range(day_count)],
+            }
+        if day is not None:
+            grid[doctor_id]['intervals'][(day - start_date).days].append((start, end))
+    last = len(OCCUPANCY_DIGITS) - 1
+    for doctor in grid.values():
+        doctor['booked'] = [
+            ''.join(OCCUPANCY_DIGITS[min(peak, last)] for peak in hourly_peaks(intervals))
+            for intervals in doctor.pop('intervals')
+        ]
+    return list(grid.values())
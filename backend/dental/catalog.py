@@ -0,0 +1,59 @@
+"""Cached service and doctor catalogs.
+
+Both lists are small, read on nearly every page and rarely written. Their
+serialized form is kept in the shared cache under a catalog version, and
+each process keeps the copy for the current version in memory, so a read
+costs one cache lookup of the version. Saving or deleting a Service or
+Doctor moves the version on (see signals), and the ETag derived from it
+lets clients that are already current get a 304.
+"""
+import hashlib
+import uuid
+
+from django.core.cache import cache
+
+from .models import Doctor, Service
+
+CACHE_PREFIX = 'dental:catalog'
+VERSION_KEY = f'{CACHE_PREFIX}:version'
+CACHE_SECONDS = 24 * 60 * 60
+
+# (version, data) last loaded by this process
+_memory = (None, None)
+
+
+def version():
+    """Current catalog version, shared by every process using the cache."""
+    current = cache.get(VERSION_KEY)
+    if current is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        current = cache.get(VERSION_KEY)
+    return current
+
+
+def invalidate():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def _compute():
+    from .serializers import DoctorSerializer, ServiceSerializer
+
+    return {
+        'services': ServiceSerializer(Service.objects.order_by('name'), many=True).data,
+        'doctors': DoctorSerializer(Doctor.objects.select_related('service').order_by('name'), many=True).data,
+    }
+
+
+def load():
+    """``(version, {'services': [...], 'doctors': [...]})`` from memory, the shared cache or the database."""
+    global _memory
+    current = version()
+    if _memory[0] != current:
+        _memory = (current, cache.get_or_set(f'{CACHE_PREFIX}:{current}', _compute, CACHE_SECONDS))
+    return _memory
+
+
+def etag(request, catalog_version):
+    """Strong ETag for a catalog response: the version plus the full query string."""
+    digest = hashlib.sha1(f'{catalog_version}:{request.get_full_path()}'.encode())
+    return f'"{digest.hexdigest()}"'
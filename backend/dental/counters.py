@@ -0,0 +1,40 @@
+"""Counter rows incremented with a single upsert statement.
+
+``increment`` adds deltas to the counter columns of rows identified by a
+unique key and creates the missing rows, in one ``INSERT ... ON CONFLICT
+DO UPDATE`` per batch. Concurrent writers cannot lose an increment: the
+addition happens in the database. On backends without conflict targets
+(MySQL, Oracle) it returns False and callers fall back to
+create-then-update.
+"""
+from django.db import connection
+
+
+def increment(model, key_fields, counter_fields, deltas):
+    """Add ``deltas`` (``{key tuple: counter tuple}``) to ``model``'s counters; False if unsupported."""
+    if not connection.features.supports_update_conflicts_with_target:
+        return False
+    if not deltas:
+        return True
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in (*key_fields, *counter_fields)]
+    table = quote(model._meta.db_table)
+    columns = ', '.join(quote(field.column) for field in fields)
+    conflict = ', '.join(quote(field.column) for field in fields[:len(key_fields)])
+    updates = ', '.join(
+        f'{quote(field.column)} = {table}.{quote(field.column)} + excluded.{quote(field.column)}'
+        for field in fields[len(key_fields):]
+    )
+    placeholders = f'({", ".join(["%s"] * len(fields))})'
+    rows = [(*key, *counts) for key, counts in deltas.items()]
+    size = max(connection.ops.bulk_batch_size(fields, rows), 1)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), size):
+            batch = rows[start:start + size]
+            params = [field.get_db_prep_value(value, connection) for row in batch for field, value in zip(fields, row)]
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES {", ".join([placeholders] * len(batch))} '
+                f'ON CONFLICT ({conflict}) DO UPDATE SET {updates}',
+                params,
+            )
+    return True
@@ -0,0 +1,126 @@
+"""Appointment status events for server-sent event subscribers.
+
+Status changes publish a small event to the topics ``phone:<digits>`` and
+``doctor:<id>`` once their transaction commits. The in-process Broker hands
+each event to the SSE connections of this process that subscribed to the
+topic (see ``dental.sse``); an idle connection is an asyncio queue and
+costs no queries.
+
+Publishing goes through a backend. The default delivers to this process
+only; with several server processes, set ``DENTAL_EVENTS_BACKEND`` to a
+dotted class path of a relay (e.g. over Redis pub/sub). A backend is built
+with the broker, receives ``publish(topic, event)`` and passes events
+arriving from other processes to ``broker.deliver(topic, event)``.
+"""
+import asyncio
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import Appointment, AppointmentHistory, normalize_phone
+
+QUEUE_SIZE = 100
+
+
+class Broker:
+    """Topic -> subscriber queues, each bound to the event loop reading it."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}  # topic -> {queue: loop}
+
+    def subscribe(self, topics, loop):
+        queue = asyncio.Queue(QUEUE_SIZE)
+        with self.lock:
+            for topic in topics:
+                self.subscribers.setdefault(topic, {})[queue] = loop
+        return queue
+
+    def unsubscribe(self, topics, queue):
+        with self.lock:
+            for topic in topics:
+                queues = self.subscribers.get(topic, {})
+                queues.pop(queue, None)
+                if not queues:
+                    self.subscribers.pop(topic, None)
+
+    def deliver(self, topic, event):
+        """Queue ``event`` for every subscriber of ``topic``; safe from any thread."""
+        with self.lock:
+            targets = list(self.subscribers.get(topic, {}).items())
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                pass  # the loop has closed; its connection is going away
+
+
+def _offer(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass  # a stalled client misses events; it refetches on the next one anyway
+
+
+class LocalBackend:
+    """Delivers events to subscribers in this process only."""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, topic, event):
+        self.broker.deliver(topic, event)
+
+
+broker = Broker()
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'DENTAL_EVENTS_BACKEND', None)
+        _backend = (import_string(path) if path else LocalBackend)(broker)
+    return _backend
+
+
+def topics_for(phone=None, doctor_id=None):
+    """Topics an event about this phone number and doctor goes to."""
+    topics = []
+    digits = normalize_phone(phone)
+    if digits:
+        topics.append(f'phone:{digits}')
+    if doctor_id:
+        topics.append(f'doctor:{doctor_id}')
+    return topics
+
+
+def event_for(instance):
+    """Status event for an Appointment or AppointmentHistory row; no names, contact details or notes."""
+    event = {
+        'id': instance.pk,
+        'doctor_id': instance.doctor_id,
+        'appointment_date': instance.appointment_date.isoformat() if instance.appointment_date else None,
+        'appointment_time': instance.appointment_time.isoformat() if instance.appointment_time else None,
+    }
+    if isinstance(instance, AppointmentHistory):
+        event.update(kind='history', appointment_id=instance.appointment_id, status=instance.new_status,
+                     visited=instance.visited)
+    elif isinstance(instance, Appointment):
+        event.update(kind='appointment', status=instance.status)
+    return event
+
+
+def publish(*instances):
+    """Publish a status event for each instance once the current transaction commits."""
+    messages = [(topics_for(instance.phone, instance.doctor_id), event_for(instance)) for instance in instances]
+
+    def send():
+        backend = get_backend()
+        for topics, event in messages:
+            for topic in topics:
+                backend.publish(topic, event)
+
+    transaction.on_commit(send)
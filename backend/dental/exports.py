@@ -0,0 +1,75 @@
+"""Streaming CSV and NDJSON exports.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)`` as plain value
+tuples and written out one line at a time, so memory stays flat however
+many rows are exported.
+"""
+import csv
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+CHUNK_SIZE = 2000
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class PassthroughRenderer(JSONRenderer):
+    """Accepts any ``Accept`` header for export views.
+
+    Successful exports return a StreamingHttpResponse that is never
+    rendered; error responses are still JSON.
+    """
+    media_type = '*/*'
+    format = None
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the line instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def columns_for(model, serializer_class, requested=None):
+    """``[(name, attname)]`` of the serializer fields that are model columns."""
+    columns = []
+    for name in serializer_class.Meta.fields:
+        if requested and name not in requested:
+            continue
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.concrete:
+            columns.append((name, field.attname))
+    return columns
+
+
+def _csv_lines(rows, names):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(names)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _ndjson_lines(rows, names):
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def stream(queryset, columns, export_format, basename, chunk_size=CHUNK_SIZE):
+    """StreamingHttpResponse writing ``queryset`` as ``export_format`` (csv or ndjson)."""
+    names = [name for name, _ in columns]
+    rows = queryset.values_list(*(attname for _, attname in columns)).iterator(chunk_size=chunk_size)
+    lines = _csv_lines(rows, names) if export_format == 'csv' else _ndjson_lines(rows, names)
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[export_format])
+    filename = f'{basename}-{timezone.localdate():%Y%m%d}.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
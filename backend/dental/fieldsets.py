@@ -0,0 +1,62 @@
+"""Sparse fieldsets: ``?fields=id,name,status`` on read requests.
+
+Serializers drop the fields that were not asked for, and list/detail views
+load only the columns those fields read, so long text such as ``message``
+or ``notes`` is neither selected nor serialized unless requested.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+
+
+def requested_fields(request):
+    """Field names from ``?fields=``, or None when the whole representation is wanted."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    names = {name.strip() for name in request.query_params.get(FIELDS_PARAM, '').split(',')}
+    names.discard('')
+    return names or None
+
+
+class SparseFieldsMixin:
+    """Serializer mixin honouring ``?fields=`` from the request in its context."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requested_fields = requested = requested_fields(self.context.get('request'))
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+
+def only_requested(queryset, serializer_class, requested, keep=()):
+    """``queryset`` restricted with ``only()`` to the columns behind ``requested`` fields.
+
+    Returned unchanged when a requested field cannot be traced to model
+    columns (method fields, properties), since deferring would then cost a
+    query per row.
+    """
+    model = queryset.model
+    fields = serializer_class().fields
+    columns, related = set(keep), set()
+    for name in requested & set(fields):
+        source = fields[name].source
+        if source == '*':
+            return queryset
+        first, _, rest = source.partition('.')
+        try:
+            field = model._meta.get_field(first)
+        except FieldDoesNotExist:
+            return queryset
+        if not field.concrete or field.many_to_many:
+            return queryset
+        columns.add(first)
+        if rest:
+            if '.' in rest:
+                return queryset
+            related.add(first)
+            columns.add(f'{first}__{rest}')
+    if related:
+        queryset = queryset.select_related(*related)
+    return queryset.only(*columns)
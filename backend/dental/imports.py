@@ -0,0 +1,251 @@
+"""Chunked bulk import of CSV or NDJSON files into AppointmentHistory or Appointment.
+
+The file is parsed as a stream. Each row is validated field by field, and
+doctor and service names are resolved through maps loaded once per import.
+History rows may name doctors and services no longer in the catalog; those
+names are kept as snapshots with no id. Valid rows are saved with
+``bulk_create`` in batches, and each batch then does the bookkeeping the
+per-row signals would have done: search documents, DailyRollup counters
+and calendar versions. Rows that fail are reported by line number and
+skipped. ``dry_run`` validates everything and writes nothing.
+
+Overlap capacity is not enforced: imports record bookings that already
+happened elsewhere.
+"""
+import csv
+import json
+from datetime import datetime
+from pathlib import PurePath
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import rollups, search, versions
+from .models import Appointment, AppointmentHistory, DEFAULT_SERVICE_DURATION, Doctor, Service, normalize_phone
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+MODELS = {'history': AppointmentHistory, 'appointment': Appointment}
+# Columns copied onto the model; doctor and service are resolved separately.
+FIELDS = {
+    AppointmentHistory: (
+        'name', 'email', 'phone', 'appointment_date', 'appointment_time', 'message', 'previous_status',
+        'new_status', 'changed_by', 'notes', 'timestamp', 'booked_at', 'visited',
+    ),
+    Appointment: (
+        'name', 'email', 'phone', 'appointment_date', 'appointment_time', 'message', 'status', 'admin_notes',
+        'created_at',
+    ),
+}
+
+
+class RowError(ValueError):
+    pass
+
+
+def format_of(filename):
+    """``csv`` or ``ndjson`` from a file name's extension, else None."""
+    return FORMATS.get(PurePath(filename or '').suffix.lower())
+
+
+def parse(lines, file_format):
+    """Yield ``(line_number, values)`` from text lines; ``values`` is None for unreadable NDJSON lines."""
+    if file_format == 'csv':
+        reader = csv.DictReader(lines)
+        for values in reader:
+            yield reader.line_num, {(key or '').strip().lower(): value for key, value in values.items()}
+        return
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            values = json.loads(line)
+        except ValueError:
+            values = None
+        yield number, values if isinstance(values, dict) else None
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+class UnknownName(RowError):
+    def __init__(self, kind, name):
+        super().__init__(f'Unknown {kind} "{name}"')
+        self.name = name
+
+
+class UnknownId(RowError):
+    def __init__(self, kind, pk):
+        super().__init__(f'Unknown {kind} id {pk}')
+
+
+def _as_id(key, raw):
+    """``raw`` as a primary key; raises RowError for anything but a whole number."""
+    if isinstance(raw, str) and raw.strip().isdigit():
+        return int(raw)
+    if isinstance(raw, int) and not isinstance(raw, bool):
+        return raw
+    if isinstance(raw, float) and raw.is_integer():
+        return int(raw)
+    raise RowError(f'{key}: {json.dumps(raw)} is not a whole number.')
+
+
+class Catalog:
+    """Doctors and services loaded once, looked up by id or case-insensitive name."""
+
+    def __init__(self):
+        services = {service.pk: service for service in Service.objects.all()}
+        doctors = {doctor.pk: doctor for doctor in Doctor.objects.all()}
+        self.maps = {
+            'service': (services, {service.name.strip().casefold(): service for service in services.values()}),
+            'doctor': (doctors, {doctor.name.strip().casefold(): doctor for doctor in doctors.values()}),
+        }
+
+    def _by_id(self, values, kind):
+        by_id, _ = self.maps[kind]
+        for key in (f'{kind}_id', kind):
+            raw = values.get(key)
+            if _blank(raw):
+                continue
+            if key == kind and isinstance(raw, str) and not raw.strip().isdigit():
+                return None  # a name, looked up by _by_name
+            pk = _as_id(key, raw)
+            try:
+                return by_id[pk]
+            except KeyError:
+                raise UnknownId(kind, pk)
+        return None
+
+    def _by_name(self, values, kind):
+        _, by_name = self.maps[kind]
+        for key in (kind, f'{kind}_name'):
+            raw = values.get(key)
+            if _blank(raw) or str(raw).strip().isdigit():
+                continue
+            try:
+                return by_name[str(raw).strip().casefold()]
+            except KeyError:
+                raise UnknownName(kind, str(raw).strip())
+        return None
+
+    def find(self, values, kind):
+        """The doctor or service a row names by id or name, or None; raises RowError if unknown."""
+        entry = self._by_id(values, kind)
+        return entry if entry is not None else self._by_name(values, kind)
+
+    def snapshot(self, values, kind):
+        """``(entry, name)`` for a history row, which may name doctors or services no longer in the catalog.
+
+        A name that is not in the catalog is kept with no entry. An unknown
+        id without a name is still an error.
+        """
+        try:
+            entry = self._by_id(values, kind)
+        except UnknownId as unknown_id:
+            entry, error = None, unknown_id
+        else:
+            error = None
+        if entry is None:
+            try:
+                entry = self._by_name(values, kind)
+            except UnknownName as unknown:
+                return None, unknown.name
+            if entry is None and error:
+                raise error
+        return entry, entry.name if entry else None
+
+    def service_of(self, doctor):
+        return self.maps['service'][0].get(doctor.service_id) if doctor else None
+
+
+def _clean(model, name, raw):
+    field = model._meta.get_field(name)
+    try:
+        value = field.clean(raw.strip() if isinstance(raw, str) else raw, None)
+    except ValidationError as exc:
+        raise RowError(f'{name}: {" ".join(exc.messages)}')
+    except (TypeError, ValueError):
+        # e.g. a JSON number or list where a date is expected
+        raise RowError(f'{name}: {json.dumps(raw)} is not a valid value.')
+    if isinstance(value, datetime) and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def build(model, values, catalog):
+    """An unsaved ``model`` instance from one parsed row; raises RowError."""
+    if values is None:
+        raise RowError('Line is not a JSON object')
+    fields = {name: _clean(model, name, values[name]) for name in FIELDS[model] if not _blank(values.get(name))}
+    fields['phone_digits'] = normalize_phone(fields.get('phone'))
+    if model is AppointmentHistory:
+        if 'new_status' not in fields:
+            raise RowError('new_status: This field is required.')
+        fields.setdefault('previous_status', 'PENDING')
+        fields.setdefault('changed_by', 'import')
+        doctor, doctor_name = catalog.snapshot(values, 'doctor')
+        service, service_name = catalog.snapshot(values, 'service')
+        if service_name is None:
+            service = catalog.service_of(doctor)
+            service_name = service.name if service else None
+        return AppointmentHistory(
+            doctor_id=doctor.pk if doctor else None, doctor_name=doctor_name,
+            service_id=service.pk if service else None, service_name=service_name,
+            **fields,
+        )
+    doctor = catalog.find(values, 'doctor')
+    service = catalog.find(values, 'service') or catalog.service_of(doctor)
+    row = Appointment(doctor=doctor, service=service, **fields)
+    # Appointment.save() derives these; bulk_create does not call it.
+    if row.appointment_time:
+        row.start_minute = row.appointment_time.hour * 60 + row.appointment_time.minute
+        row.end_minute = row.start_minute + (service.duration_minutes if service else DEFAULT_SERVICE_DURATION)
+    return row
+
+
+def _save_batch(model, rows):
+    with transaction.atomic():
+        # Supplied created_at/timestamp values are kept: those fields only default to now.
+        model.objects.bulk_create(rows)
+        search.index_new(rows)
+        rollups.added(rows)
+        versions.touch(*rows)
+
+
+def run(model, lines, file_format, batch_size=BATCH_SIZE, dry_run=False, log=None):
+    """Import the rows of ``lines`` into ``model``.
+
+    Returns ``{'rows', 'created', 'failed', 'errors'}``, where ``created``
+    counts the rows saved (or, with ``dry_run``, that would be) and
+    ``errors`` lists the first MAX_REPORTED_ERRORS failures as
+    ``{'line', 'error'}``.
+    """
+    report = {'rows': 0, 'created': 0, 'failed': 0, 'errors': []}
+    catalog = Catalog()
+    batch = []
+
+    def flush():
+        if batch and not dry_run:
+            _save_batch(model, batch)
+        report['created'] += len(batch)
+        batch.clear()
+        if log:
+            log(f'{report["rows"]} rows read, {report["created"]} {"valid" if dry_run else "imported"}, '
+                f'{report["failed"]} failed')
+
+    for number, values in parse(lines, file_format):
+        report['rows'] += 1
+        try:
+            batch.append(build(model, values, catalog))
+        except RowError as exc:
+            report['failed'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append({'line': number, 'error': str(exc)})
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return report
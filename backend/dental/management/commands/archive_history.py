@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from dental import archive
+
+
+class Command(BaseCommand):
+    help = 'Move AppointmentHistory rows older than the horizon into gzip NDJSON archive files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int, default=getattr(settings, 'HISTORY_ARCHIVE_HORIZON_DAYS', 365),
+            help='Archive rows recorded more than this many days ago.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=archive.CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be archived.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        total = archive.archive_before(
+            cutoff, chunk_size=options['chunk_size'], dry_run=options['dry_run'], log=self.stdout.write
+        )
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {total} history rows older than {cutoff:%Y-%m-%d}.'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dental import imports
+
+
+class Command(BaseCommand):
+    help = 'Bulk import a CSV or NDJSON file of past visits into AppointmentHistory or Appointment.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import (.csv, .ndjson or .jsonl).')
+        parser.add_argument('--model', choices=sorted(imports.MODELS), default='history')
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'ndjson'], help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=imports.BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Validate every row without saving anything.')
+
+    def handle(self, *args, **options):
+        file_format = options['file_format'] or imports.format_of(options['path'])
+        if not file_format:
+            raise CommandError('Cannot tell the file format from its extension; pass --format.')
+        try:
+            source = open(options['path'], encoding='utf-8-sig', newline='')
+        except OSError as exc:
+            raise CommandError(str(exc))
+        with source:
+            report = imports.run(
+                imports.MODELS[options['model']], source, file_format,
+                batch_size=options['batch_size'], dry_run=options['dry_run'], log=self.stdout.write,
+            )
+        for error in report['errors']:
+            self.stderr.write(f'line {error["line"]}: {error["error"]}')
+        if report['failed'] > len(report['errors']):
+            self.stderr.write(f'... and {report["failed"] - len(report["errors"])} more failed rows')
+        verb = 'Would import' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {report["created"]} of {report["rows"]} rows; {report["failed"]} failed.'
+        ))
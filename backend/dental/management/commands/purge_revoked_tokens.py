@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from dental import revocation
+
+
+class Command(BaseCommand):
+    help = 'Delete revoked-token rows whose tokens have expired.'
+
+    def handle(self, *args, **options):
+        deleted = revocation.purge()
+        self.stdout.write(self.style.SUCCESS(f'Purged {deleted} expired revocations.'))
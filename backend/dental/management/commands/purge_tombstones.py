@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from dental import sync
+
+
+class Command(BaseCommand):
+    help = 'Delete delta-sync tombstones older than the retention period.'
+
+    def handle(self, *args, **options):
+        deleted = sync.purge()
+        self.stdout.write(self.style.SUCCESS(f'Purged {deleted} tombstones.'))
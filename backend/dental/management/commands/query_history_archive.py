@@ -0,0 +1,18 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from dental import archive
+
+
+class Command(BaseCommand):
+    help = 'Print archived AppointmentHistory rows as NDJSON, e.g. to look up an old patient record.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--phone', help='Only rows whose phone starts with these digits.')
+        parser.add_argument('--since', type=archive.parse_month, help='First month to read (YYYY-MM).')
+        parser.add_argument('--until', type=archive.parse_month, help='Last month to read (YYYY-MM).')
+
+    def handle(self, *args, **options):
+        for row in archive.query(phone=options['phone'], since=options['since'], until=options['until']):
+            self.stdout.write(json.dumps(row))
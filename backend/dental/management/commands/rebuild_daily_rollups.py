@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from dental import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the DailyRollup reporting counters from the appointment and history tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-days', type=int, default=rollups.REBUILD_CHUNK_DAYS,
+            help='Days recomputed per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        total = rollups.rebuild(chunk_days=options['chunk_days'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f'Daily rollups rebuilt ({total} rows).'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from dental import search
+
+
+class Command(BaseCommand):
+    help = 'Re-index appointments, history and feedback for full-text search.'
+
+    def handle(self, *args, **options):
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from dental import archive
+
+
+class Command(BaseCommand):
+    help = 'Move archived AppointmentHistory months back into the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=archive.parse_month, help='First month to restore (YYYY-MM).')
+        parser.add_argument('--until', type=archive.parse_month, help='Last month to restore (YYYY-MM).')
+        parser.add_argument('--chunk-size', type=int, default=archive.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        total = archive.restore(
+            since=options['since'], until=options['until'], chunk_size=options['chunk_size'], log=self.stdout.write
+        )
+        self.stdout.write(self.style.SUCCESS(f'Restored {total} history rows.'))
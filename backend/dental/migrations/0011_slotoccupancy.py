@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:26
+
+import django.db.models.deletion
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def backfill_slot_occupancy(apps, schema_editor):
+    """Seed the ledger from the appointments that already exist."""
+    Appointment = apps.get_model('dental', 'Appointment')
+    SlotOccupancy = apps.get_model('dental', 'SlotOccupancy')
+
+    counts = Counter(
+        (doctor_id, appointment_date, appointment_time.hour)
+        for doctor_id, appointment_date, appointment_time in Appointment.objects.filter(
+            doctor__isnull=False, appointment_date__isnull=False, appointment_time__isnull=False
+        ).values_list('doctor_id', 'appointment_date', 'appointment_time')
+    )
+    SlotOccupancy.objects.bulk_create([
+        SlotOccupancy(doctor_id=doctor_id, date=day, hour=hour, booked=booked)
+        for (doctor_id, day, hour), booked in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dental', '0010_appointmenthistory_service_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('booked', models.PositiveIntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_occupancy', to='dental.doctor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'date', 'hour'), name='unique_doctor_slot')],
+            },
+        ),
+        migrations.RunPython(backfill_slot_occupancy, migrations.RunPython.noop),
+    ]
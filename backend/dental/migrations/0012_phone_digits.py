@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:27
+
+import re
+
+from django.db import migrations, models
+
+
+def backfill_phone_digits(apps, schema_editor):
+    """Populate the normalized phone column for existing rows in chunks."""
+    for model_name in ('Appointment', 'AppointmentHistory', 'Feedback'):
+        Model = apps.get_model('dental', model_name)
+        rows = [
+            Model(id=pk, phone_digits=re.sub(r"\D", "", phone))
+            for pk, phone in Model.objects.exclude(phone__isnull=True).exclude(phone='').values_list('id', 'phone')
+        ]
+        Model.objects.bulk_update(rows, ['phone_digits'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dental', '0011_slotoccupancy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='phone_digits',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='appointmenthistory',
+            name='phone_digits',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='feedback',
+            name='phone_digits',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=50),
+        ),
+        migrations.RunPython(backfill_phone_digits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:29
+
+from django.db import migrations, models
+
+SQLITE_INDEX = [
+    """CREATE VIRTUAL TABLE dental_searchdocument_fts USING fts5(
+        name, phone, body, content='dental_searchdocument', content_rowid='id', tokenize='unicode61'
+    )""",
+    """CREATE TRIGGER dental_searchdocument_ai AFTER INSERT ON dental_searchdocument BEGIN
+        INSERT INTO dental_searchdocument_fts(rowid, name, phone, body) VALUES (new.id, new.name, new.phone, new.body);
+    END""",
+    """CREATE TRIGGER dental_searchdocument_ad AFTER DELETE ON dental_searchdocument BEGIN
+        INSERT INTO dental_searchdocument_fts(dental_searchdocument_fts, rowid, name, phone, body)
+        VALUES ('delete', old.id, old.name, old.phone, old.body);
+    END""",
+    """CREATE TRIGGER dental_searchdocument_au AFTER UPDATE ON dental_searchdocument BEGIN
+        INSERT INTO dental_searchdocument_fts(dental_searchdocument_fts, rowid, name, phone, body)
+        VALUES ('delete', old.id, old.name, old.phone, old.body);
+        INSERT INTO dental_searchdocument_fts(rowid, name, phone, body) VALUES (new.id, new.name, new.phone, new.body);
+    END""",
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS dental_searchdocument_au',
+    'DROP TRIGGER IF EXISTS dental_searchdocument_ad',
+    'DROP TRIGGER IF EXISTS dental_searchdocument_ai',
+    'DROP TABLE IF EXISTS dental_searchdocument_fts',
+]
+POSTGRES_INDEX = [
+    "CREATE INDEX dental_searchdocument_tsv ON dental_searchdocument "
+    "USING GIN (to_tsvector('simple', name || ' ' || phone || ' ' || body))",
+]
+POSTGRES_DROP = ['DROP INDEX IF EXISTS dental_searchdocument_tsv']
+
+
+def _run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_fulltext_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_INDEX, 'postgresql': POSTGRES_INDEX})
+
+
+def drop_fulltext_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP})
+
+
+def backfill_search_documents(apps, schema_editor):
+    SearchDocument = apps.get_model('dental', 'SearchDocument')
+    sources = {
+        'appointment': ('Appointment', ('message', 'admin_notes')),
+        'history': ('AppointmentHistory', ('message', 'notes', 'service_name', 'doctor_name')),
+        'feedback': ('Feedback', ('message',)),
+    }
+    for kind, (model_name, body_fields) in sources.items():
+        Model = apps.get_model('dental', model_name)
+        documents = [
+            SearchDocument(
+                kind=kind,
+                object_id=row['id'],
+                name=row['name'] or '',
+                phone=row['phone_digits'],
+                body='\n'.join(row[field] for field in body_fields if row[field]),
+            )
+            for row in Model.objects.values('id', 'name', 'phone_digits', *body_fields)
+        ]
+        SearchDocument.objects.bulk_create(documents, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dental', '0012_phone_digits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('appointment', 'Appointment'), ('history', 'Appointment history'), ('feedback', 'Feedback')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('name', models.CharField(blank=True, default='', max_length=255)),
+                ('phone', models.CharField(blank=True, default='', max_length=50)),
+                ('body', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_document')],
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:38
+
+from django.db import migrations, models
+
+
+def backfill_intervals(apps, schema_editor):
+    """Derive [start, end) minutes for existing appointments from time and service duration."""
+    Appointment = apps.get_model('dental', 'Appointment')
+    rows = []
+    for pk, when, duration in Appointment.objects.exclude(appointment_time__isnull=True).values_list(
+        'id', 'appointment_time', 'service__duration_minutes'
+    ):
+        start = when.hour * 60 + when.minute
+        rows.append(Appointment(id=pk, start_minute=start, end_minute=start + (duration or 60)))
+    Appointment.objects.bulk_update(rows, ['start_minute', 'end_minute'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dental', '0015_calendarversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='end_minute',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='start_minute',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='duration_minutes',
+            field=models.PositiveSmallIntegerField(default=60),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'appointment_date', 'start_minute'], name='appointment_interval_idx'),
+        ),
+        migrations.RunPython(backfill_intervals, migrations.RunPython.noop),
+    ]
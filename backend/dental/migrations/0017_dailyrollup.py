@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:41
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_rollups(apps, schema_editor):
+    """Count existing appointments and history rows into the new rollups."""
+    DailyRollup = apps.get_model('dental', 'DailyRollup')
+    sources = [
+        ('appointment', apps.get_model('dental', 'Appointment'), 'status', {}),
+        ('history', apps.get_model('dental', 'AppointmentHistory'), 'new_status',
+         {'visits': Count('id', filter=Q(visited='visited'))}),
+    ]
+    for source, Model, status_field, annotations in sources:
+        rows = (
+            Model.objects.exclude(appointment_date__isnull=True).order_by()
+            .values('appointment_date', 'doctor_id', 'service_id', status_field)
+            .annotate(count=Count('id'), **annotations)
+        )
+        DailyRollup.objects.bulk_create([
+            DailyRollup(
+                source=source, date=row['appointment_date'], doctor_id=row['doctor_id'] or 0,
+                service_id=row['service_id'] or 0, status=row[status_field],
+                count=row['count'], visited=row.get('visits', 0),
+            )
+            for row in rows
+        ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dental', '0016_service_duration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('doctor_id', models.IntegerField(default=0)),
+                ('service_id', models.IntegerField(default=0)),
+                ('source', models.CharField(choices=[('appointment', 'Appointment'), ('history', 'History')], max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('visited', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'doctor_id', 'service_id', 'source', 'status'), name='unique_daily_rollup')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:44
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_booked_at(apps, schema_editor):
+    """Copy created_at from appointments that history rows still link to."""
+    Appointment = apps.get_model('dental', 'Appointment')
+    AppointmentHistory = apps.get_model('dental', 'AppointmentHistory')
+    AppointmentHistory.objects.filter(appointment__isnull=False, booked_at__isnull=True).update(
+        booked_at=Subquery(Appointment.objects.filter(pk=OuterRef('appointment_id')).values('created_at')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dental', '0017_dailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointmenthistory',
+            name='booked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='appointmenthistory',
+            index=models.Index(fields=['appointment_date'], name='history_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointmenthistory',
+            index=models.Index(fields=['timestamp'], name='history_timestamp_idx'),
+        ),
+        migrations.RunPython(backfill_booked_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:18
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dental', '0021_delta_sync'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='SlotOccupancy',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:28
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dental', '0024_cache_table'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appointment',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='appointmenthistory',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -1,12 +1,32 @@
+import re
+
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
 
+DEFAULT_SERVICE_DURATION = 60
+
+
+def normalize_phone(phone):
+	"""Digits-only form of a phone number, used for indexed lookups."""
+	return re.sub(r"\D", "", str(phone)) if phone else ''
+
+
+def phone_prefix_q(digits, field='phone_digits'):
+	"""Match rows whose normalized phone starts with ``digits``.
+
+	Expressed as a ``>= digits AND < digits + ':'`` range (':' sorts right
+	after '9') so any backend can answer it from the B-tree index.
+	"""
+	return models.Q(**{f'{field}__gte': digits, f'{field}__lt': digits + ':'})
+
+
 class Service(models.Model):
 	"""Represents a dental service offered."""
 	name = models.CharField(max_length=255, unique=True)
 	description = models.TextField(blank=True, null=True)
+	duration_minutes = models.PositiveSmallIntegerField(default=DEFAULT_SERVICE_DURATION)
 	created_at = models.DateTimeField(auto_now_add=True)
 
 	class Meta:
@@ -26,6 +46,7 @@ class Appointment(models.Model):
 	name = models.CharField(max_length=255, blank=True, null=True)
 	email = models.EmailField(blank=True, null=True)
 	phone = models.CharField(max_length=50, blank=True, null=True)
+	phone_digits = models.CharField(max_length=50, blank=True, default='', editable=False, db_index=True)
 	service = models.ForeignKey(Service, on_delete=models.SET_NULL, null=True, blank=True, related_name='appointments')
 	# link to a Doctor (optional)
 	doctor = models.ForeignKey('Doctor', on_delete=models.SET_NULL, null=True, blank=True, related_name='appointments')
@@ -37,9 +58,50 @@ class Appointment(models.Model):
 	status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
 	admin_notes = models.TextField(blank=True)
 
-	created_at = models.DateTimeField(auto_now_add=True)
+	# a default rather than auto_now_add, so imports can keep the original booking time
+	created_at = models.DateTimeField(default=timezone.now, editable=False)
 	updated_at = models.DateTimeField(auto_now=True)
 
+	# [start, end) in minutes after midnight of appointment_date, derived on save
+	# from appointment_time and the service duration for overlap range scans
+	start_minute = models.PositiveSmallIntegerField(blank=True, null=True, editable=False)
+	end_minute = models.PositiveSmallIntegerField(blank=True, null=True, editable=False)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['doctor', 'appointment_date', 'start_minute'], name='appointment_interval_idx'),
+			models.Index(fields=['created_at', 'id'], name='appointment_keyset_idx'),
+			models.Index(fields=['updated_at', 'id'], name='appointment_sync_idx'),
+		]
+
+	@classmethod
+	def from_db(cls, db, field_names, values):
+		instance = super().from_db(db, field_names, values)
+		# remember which calendar day the row was loaded on, so a move invalidates both days
+		instance._loaded_calendar_day = (instance.__dict__.get('doctor_id'), instance.__dict__.get('appointment_date'))
+		if not instance.get_deferred_fields():
+			instance._loaded_rollup = instance.rollup_entry()
+		return instance
+
+	def rollup_entry(self):
+		"""``(DailyRollup key, visited)`` this row contributes to, or None without a date."""
+		if not self.appointment_date:
+			return None
+		return ('appointment', self.appointment_date, self.doctor_id or 0, self.service_id or 0, self.status), 0
+
+	@property
+	def duration_minutes(self):
+		return self.service.duration_minutes if self.service_id else DEFAULT_SERVICE_DURATION
+
+	def save(self, *args, **kwargs):
+		self.phone_digits = normalize_phone(self.phone)
+		if self.appointment_time:
+			self.start_minute = self.appointment_time.hour * 60 + self.appointment_time.minute
+			self.end_minute = self.start_minute + self.duration_minutes
+		else:
+			self.start_minute = self.end_minute = None
+		super().save(*args, **kwargs)
+
 	def __str__(self):
 		return f"{self.name} — {self.phone} — {self.appointment_date}"
 
@@ -52,6 +114,7 @@ class AppointmentHistory(models.Model):
 	name = models.CharField(max_length=255, blank=True, null=True)
 	email = models.EmailField(blank=True, null=True)
 	phone = models.CharField(max_length=50, blank=True, null=True)
+	phone_digits = models.CharField(max_length=50, blank=True, default='', editable=False, db_index=True)
 	service_id = models.IntegerField(blank=True, null=True)  # ✅ Added for calendar filtering
 	service_name = models.CharField(max_length=255, blank=True, null=True)  # snapshot of service name
 	appointment_date = models.DateField(blank=True, null=True)
@@ -66,7 +129,11 @@ class AppointmentHistory(models.Model):
 	new_status = models.CharField(max_length=20)
 	changed_by = models.CharField(max_length=255, blank=True)
 	notes = models.TextField(blank=True)
-	timestamp = models.DateTimeField(auto_now_add=True)
+	# a default rather than auto_now_add, so imported and restored rows keep their time
+	timestamp = models.DateTimeField(default=timezone.now, editable=False)
+	updated_at = models.DateTimeField(auto_now=True)
+	# when the original appointment was requested (its created_at); empty for older rows
+	booked_at = models.DateTimeField(blank=True, null=True)
 
 	# admin usage: whether the patient actually visited after the appointment (unvisited/visited)
 	STATUS_CHOICES = [
@@ -75,6 +142,34 @@ class AppointmentHistory(models.Model):
 	]
 	visited = models.CharField(max_length=20, choices=STATUS_CHOICES, default='unvisited')
 
+	class Meta:
+		indexes = [
+			models.Index(fields=['appointment_date'], name='history_date_idx'),
+			models.Index(fields=['timestamp'], name='history_timestamp_idx'),
+			models.Index(fields=['timestamp', 'id'], name='history_keyset_idx'),
+			models.Index(fields=['updated_at', 'id'], name='history_sync_idx'),
+		]
+
+	@classmethod
+	def from_db(cls, db, field_names, values):
+		instance = super().from_db(db, field_names, values)
+		# remember which calendar day the row was loaded on, so a move invalidates both days
+		instance._loaded_calendar_day = (instance.__dict__.get('doctor_id'), instance.__dict__.get('appointment_date'))
+		if not instance.get_deferred_fields():
+			instance._loaded_rollup = instance.rollup_entry()
+		return instance
+
+	def rollup_entry(self):
+		"""``(DailyRollup key, visited)`` this row contributes to, or None without a date."""
+		if not self.appointment_date:
+			return None
+		key = ('history', self.appointment_date, self.doctor_id or 0, self.service_id or 0, self.new_status)
+		return key, int(self.visited == 'visited')
+
+	def save(self, *args, **kwargs):
+		self.phone_digits = normalize_phone(self.phone)
+		super().save(*args, **kwargs)
+
 	def __str__(self):
 		return f"History for {self.name} ({self.phone}) at {self.timestamp}"
 
@@ -93,8 +188,163 @@ class Doctor(models.Model):
 class Feedback(models.Model):
 	name = models.CharField(max_length=255, blank=True, null=True)
 	phone = models.CharField(max_length=50, blank=True, null=True)
+	phone_digits = models.CharField(max_length=50, blank=True, default='', editable=False, db_index=True)
 	message = models.TextField(blank=True, null=True)
 	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['created_at', 'id'], name='feedback_keyset_idx'),
+			models.Index(fields=['updated_at', 'id'], name='feedback_sync_idx'),
+		]
+
+	def save(self, *args, **kwargs):
+		self.phone_digits = normalize_phone(self.phone)
+		super().save(*args, **kwargs)
 
 	def __str__(self):
 		return f"Feedback from {self.name} ({self.phone}) at {self.created_at}"
+
+
+class SearchDocument(models.Model):
+	"""Denormalized searchable text for one appointment, history entry or feedback.
+
+	Kept in sync by signals; ``dental.search`` builds the full-text index on top.
+	"""
+	KIND_CHOICES = [
+		('appointment', 'Appointment'),
+		('history', 'Appointment history'),
+		('feedback', 'Feedback'),
+	]
+
+	kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+	object_id = models.BigIntegerField()
+	name = models.CharField(max_length=255, blank=True, default='')
+	phone = models.CharField(max_length=50, blank=True, default='')
+	body = models.TextField(blank=True, default='')
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+		]
+
+	def __str__(self):
+		return f"{self.kind} #{self.object_id}"
+
+
+class HistoryArchive(models.Model):
+	"""Manifest entry for one gzip NDJSON file of archived AppointmentHistory rows."""
+	month = models.DateField(db_index=True)  # first day of the month the rows were recorded in
+	path = models.CharField(max_length=500, unique=True)  # relative to HISTORY_ARCHIVE_DIR
+	row_count = models.PositiveIntegerField(default=0)
+	first_id = models.BigIntegerField()
+	last_id = models.BigIntegerField()
+	oldest = models.DateTimeField()
+	newest = models.DateTimeField()
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		ordering = ['month', 'first_id']
+
+	def __str__(self):
+		return f"{self.month:%Y-%m} — {self.row_count} rows ({self.path})"
+
+
+class CalendarVersion(models.Model):
+	"""Change counter for one doctor's day on the calendar.
+
+	Bumped on every appointment/history write touching that day; the calendar
+	and history endpoints derive their ETags from these counters.
+	"""
+	doctor_id = models.IntegerField(default=0)  # 0 collects rows without a doctor
+	date = models.DateField()
+	version = models.PositiveIntegerField(default=0)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['date', 'doctor_id'], name='unique_calendar_version'),
+		]
+
+	def __str__(self):
+		return f"{self.doctor_id} @ {self.date} v{self.version}"
+
+
+class DailyRollup(models.Model):
+	"""Row counts per day, doctor, service and status, kept current by the write paths.
+
+	``source`` separates active appointments from history entries. Reports
+	read these few rows instead of scanning the raw tables; the
+	``rebuild_daily_rollups`` command repairs any drift.
+	"""
+	SOURCE_CHOICES = [
+		('appointment', 'Appointment'),
+		('history', 'History'),
+	]
+
+	date = models.DateField()
+	doctor_id = models.IntegerField(default=0)  # 0 collects rows without a doctor
+	service_id = models.IntegerField(default=0)  # 0 collects rows without a service
+	source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+	status = models.CharField(max_length=20)
+	count = models.IntegerField(default=0)
+	visited = models.IntegerField(default=0)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(
+				fields=['date', 'doctor_id', 'service_id', 'source', 'status'], name='unique_daily_rollup'
+			),
+		]
+
+	def __str__(self):
+		return f"{self.date} {self.source} {self.status} d{self.doctor_id} s{self.service_id}: {self.count}"
+
+
+class RevokedToken(models.Model):
+	"""A JWT revoked before its expiry, by ``jti``.
+
+	Workers mirror this table into an in-process filter (``dental.revocation``);
+	rows are purged once the token would have expired anyway.
+	"""
+	jti = models.CharField(max_length=64, unique=True)
+	expires_at = models.DateTimeField(db_index=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	def __str__(self):
+		return f"{self.jti} (until {self.expires_at})"
+
+
+class UserTokenCutoff(models.Model):
+	"""Claims in tokens issued to ``user_id`` before ``changed_at`` are stale.
+
+	Written when a user is changed or deleted and mirrored by every worker
+	next to the revocations (``dental.revocation``); such tokens reload the
+	user instead. Rows are purged once no token from before the change can
+	still be valid.
+	"""
+	user_id = models.IntegerField()
+	changed_at = models.DateTimeField()
+	expires_at = models.DateTimeField(db_index=True)
+
+	def __str__(self):
+		return f"user {self.user_id} changed {self.changed_at}"
+
+
+class Tombstone(models.Model):
+	"""An appointment, history or feedback row that was deleted, for delta sync clients.
+
+	Written by the delete paths (signals, moves to history, archiving) and
+	read by ``?since=`` requests (``dental.sync``); purged after a retention period.
+	"""
+	kind = models.CharField(max_length=20)  # appointment, history or feedback
+	object_id = models.BigIntegerField()
+	deleted_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['kind', 'deleted_at'], name='tombstone_sync_idx'),
+		]
+
+	def __str__(self):
+		return f"{self.kind} #{self.object_id} deleted {self.deleted_at}"
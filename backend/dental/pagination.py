@@ -0,0 +1,101 @@
+"""Pagination for the large list endpoints.
+
+By default lists are keyset-paginated on ``(<keyset_field>, id)``, newest
+first: each page is one indexed range read, whatever the table size, and
+the response is ``{next, results}`` with an opaque ``cursor`` in ``next``.
+
+Sending ``page`` opts into classic offset pagination (``{count, next,
+previous, results}``), which the admin tables use for numbered pages.
+Both modes honour ``page_size`` up to ``max_page_size``.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class OffsetPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    offset_query_param = 'page'
+    # Views override this with a ``keyset_field`` attribute.
+    default_keyset_field = 'created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def encode_cursor(self, value, pk):
+        payload = json.dumps([value.isoformat(), pk])
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            value = parse_datetime(value)
+        except (ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None or not isinstance(pk, int):
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.offset = None
+        field = getattr(view, 'keyset_field', self.default_keyset_field)
+        queryset = queryset.order_by(f'-{field}', '-pk')
+        if self.offset_query_param in request.query_params:
+            self.offset = OffsetPagination()
+            return self.offset.paginate_queryset(queryset, request, view)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            value, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk}))
+
+        size = self.get_page_size(request)
+        rows = list(queryset[:size + 1])
+        self.next_cursor = None
+        if len(rows) > size:
+            rows = rows[:size]
+            last = rows[-1]
+            self.next_cursor = self.encode_cursor(getattr(last, field), last.pk)
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        if self.offset is not None:
+            return self.offset.get_paginated_response(data)
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
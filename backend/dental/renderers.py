@@ -0,0 +1,32 @@
+"""Columnar JSON: ``?format=columnar`` turns a list of objects into columns + rows."""
+from rest_framework.renderers import JSONRenderer
+
+
+def to_columns(items):
+    """``[{a: 1, b: 2}, ...]`` -> ``{'columns': ['a', 'b'], 'rows': [[1, 2], ...]}``."""
+    columns = []
+    for item in items:
+        for key in item:
+            if key not in columns:
+                columns.append(key)
+    return {'columns': columns, 'rows': [[item.get(key) for key in columns] for item in items]}
+
+
+def _is_records(value):
+    return isinstance(value, list) and all(isinstance(item, dict) for item in value)
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """JSON with record lists sent once as column names plus value rows.
+
+    Applies to a top-level list and to the ``results`` of a paginated page;
+    anything else (errors, single objects) is rendered as plain JSON.
+    """
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if _is_records(data) and data:
+            data = to_columns(data)
+        elif isinstance(data, dict) and _is_records(data.get('results')):
+            data = {**data, 'results': to_columns(data['results'])}
+        return super().render(data, accepted_media_type, renderer_context)
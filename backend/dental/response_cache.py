@@ -0,0 +1,59 @@
+"""Shared cache of calendar and history range responses.
+
+Entries are keyed by the range ETag from ``dental.versions``, which covers
+the query string, the version counter of every (doctor, day) in the range
+and, for the calendar, the catalog version of the service and doctor
+details embedded in events. A write inside the range moves a counter and so the key: stale
+entries are never read again and simply expire. Writes outside the range
+leave the entry in use.
+
+Misses are single-flight: the first request takes a short lock in the
+cache and computes, and concurrent requests for the same key wait for its
+result instead of running the same queries.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+
+CACHE_PREFIX = 'dental:responses'
+CACHE_SECONDS = 300
+LOCK_SECONDS = 10
+WAIT_SECONDS = 5
+POLL_SECONDS = 0.02
+
+
+def key_for(request, etag):
+    # The host is part of the key because paginated responses embed absolute links.
+    digest = hashlib.sha1(f'{etag}:{request.get_host()}'.encode()).hexdigest()
+    return f'{CACHE_PREFIX}:{digest}'
+
+
+def get_or_compute(key, compute):
+    """Cached value of ``key``, computing it at most once at a time across processes."""
+    value = cache.get(key)
+    if value is not None:
+        return value
+    lock = f'{key}:lock'
+    deadline = time.monotonic() + WAIT_SECONDS
+    while not cache.add(lock, 1, LOCK_SECONDS):
+        time.sleep(POLL_SECONDS)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if time.monotonic() > deadline:
+            # The lock holder is stuck or gone; don't keep the client waiting.
+            return compute()
+    try:
+        value = cache.get(key)
+        if value is None:
+            value = compute()
+            cache.set(key, value, CACHE_SECONDS)
+    finally:
+        cache.delete(lock)
+    return value
+
+
+def cached(request, etag, compute):
+    """Response data for ``request`` whose range ETag is ``etag``."""
+    return get_or_compute(key_for(request, etag), compute)
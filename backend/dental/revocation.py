@@ -0,0 +1,157 @@
+"""Revoked JWTs and stale token claims, checked in memory.
+
+Revocations are stored in the RevokedToken table. Each worker mirrors the
+unexpired rows into a Bloom filter plus an exact ``jti -> expiry`` map:
+a token that misses the filter (nearly all of them) is accepted after a
+few hash lookups, and only filter hits consult the exact map. Rows
+revoked by other workers are picked up incrementally, at most every
+SYNC_SECONDS, by primary key; a revocation made in this worker applies
+at once. Expired entries leave the filter on the periodic full reload,
+and ``purge`` (run on each revocation and by the ``purge_revoked_tokens``
+command) deletes expired rows.
+
+User changes are mirrored the same way from UserTokenCutoff, as a
+``user id -> changed at`` map that ``dental.authentication`` consults
+before trusting the claims of a token.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import RevokedToken, UserTokenCutoff
+
+SYNC_SECONDS = 5
+RELOAD_SECONDS = 600
+FILTER_BITS = 1 << 20
+FILTER_HASHES = 7
+
+
+class BloomFilter:
+    def __init__(self, bits=FILTER_BITS, hashes=FILTER_HASHES):
+        self.bits = bits
+        self.hashes = hashes
+        self.array = bytearray(bits // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=self.hashes * 4).digest()
+        for index in range(self.hashes):
+            yield int.from_bytes(digest[index * 4:index * 4 + 4], 'little') % self.bits
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.array[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.filter = BloomFilter()
+        self.expiry = {}  # jti -> expiry (epoch seconds)
+        self.last_id = 0
+        self.changed = {}  # str(user id) -> last change (epoch seconds)
+        self.last_cutoff_id = 0
+        self.synced_at = 0.0
+        self.loaded_at = 0.0
+
+    def remember(self, jti, expires):
+        self.filter.add(jti)
+        self.expiry[jti] = expires
+
+    def remember_change(self, user_id, changed):
+        user_id = str(user_id)
+        self.changed[user_id] = max(self.changed.get(user_id, 0), changed)
+
+
+_state = _State()
+
+
+def _load(state, full):
+    rows = RevokedToken.objects.filter(expires_at__gt=timezone.now())
+    if not full:
+        rows = rows.filter(pk__gt=state.last_id)
+    for pk, jti, expires_at in rows.order_by('pk').values_list('pk', 'jti', 'expires_at'):
+        state.remember(jti, expires_at.timestamp())
+        state.last_id = max(state.last_id, pk)
+    cutoffs = UserTokenCutoff.objects.filter(expires_at__gt=timezone.now())
+    if not full:
+        cutoffs = cutoffs.filter(pk__gt=state.last_cutoff_id)
+    for pk, user_id, changed_at in cutoffs.order_by('pk').values_list('pk', 'user_id', 'changed_at'):
+        state.remember_change(user_id, changed_at.timestamp())
+        state.last_cutoff_id = max(state.last_cutoff_id, pk)
+
+
+def sync(force=False):
+    """Pull revocations and user changes made by other workers; a full reload every RELOAD_SECONDS drops expired ones."""
+    state = _state
+    now = time.monotonic()
+    if not force and now - state.synced_at < SYNC_SECONDS:
+        return
+    with state.lock:
+        if not force and now - state.synced_at < SYNC_SECONDS:
+            return
+        if now - state.loaded_at >= RELOAD_SECONDS:
+            state.reset()
+            state.loaded_at = now
+            _load(state, full=True)
+        else:
+            _load(state, full=False)
+        state.synced_at = now
+
+
+def is_revoked(jti):
+    sync()
+    state = _state
+    if jti not in state.filter:
+        return False
+    expires = state.expiry.get(jti)
+    return expires is not None and expires > time.time()
+
+
+def revoke(token):
+    """Revoke a validated simplejwt token until its own expiry."""
+    jti, exp = token['jti'], token['exp']
+    expires_at = datetime.fromtimestamp(exp, tz=dt_timezone.utc)
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+    except IntegrityError:
+        pass  # already revoked
+    # Logouts are rare; use them to drop rows that no longer matter.
+    purge()
+    with _state.lock:
+        _state.remember(jti, exp)
+
+
+def user_changed(user_id):
+    """Stop trusting the claims of tokens issued to ``user_id`` until now."""
+    now = timezone.now()
+    # Kept as long as a token issued before the change can still be valid.
+    lifetime = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+    UserTokenCutoff.objects.create(user_id=user_id, changed_at=now, expires_at=now + lifetime)
+    with _state.lock:
+        _state.remember_change(user_id, now.timestamp())
+
+
+def changed_at(user_id):
+    """Epoch seconds of the last change to ``user_id`` still relevant to tokens, or None."""
+    sync()
+    return _state.changed.get(str(user_id))
+
+
+def purge():
+    """Delete rows for tokens that have expired anyway; returns how many."""
+    now = timezone.now()
+    deleted, _ = RevokedToken.objects.filter(expires_at__lte=now).delete()
+    UserTokenCutoff.objects.filter(expires_at__lte=now).delete()
+    return deleted
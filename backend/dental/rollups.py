@@ -0,0 +1,166 @@
+"""Incrementally maintained DailyRollup counters.
+
+Every row of Appointment and AppointmentHistory contributes one to the
+rollup of its (source, date, doctor, service, status) key, and one to
+``visited`` if the patient came. Saves and deletes adjust the affected keys
+by signal; bulk paths (move to history, archive, restore) adjust them in
+aggregate. ``rebuild`` recomputes a date range from the raw tables.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Min, Q, Value, When
+
+from . import counters
+from .models import Appointment, AppointmentHistory, DailyRollup
+
+KEY_FIELDS = ('source', 'date', 'doctor_id', 'service_id', 'status')
+REBUILD_CHUNK_DAYS = 31
+# Above this many keys one CASE update gets slow to build and run; rows are updated by id instead.
+CASE_KEYS_LIMIT = 32
+
+
+def _key_q(key):
+    return Q(**dict(zip(KEY_FIELDS, key)))
+
+
+def apply(counts, visited=None):
+    """Add ``counts`` (Counter of key -> rows) and ``visited`` (key -> visits) to the rollups."""
+    visited = visited or {}
+    delta_of = {}
+    for key in set(counts) | set(visited):
+        delta = (counts.get(key, 0), visited.get(key, 0))
+        if delta != (0, 0):
+            delta_of[key] = delta
+    if not delta_of or counters.increment(DailyRollup, KEY_FIELDS, ('count', 'visited'), delta_of):
+        return
+    # Backends without upserts: create missing rows, then add the deltas.
+    deltas = defaultdict(list)
+    for key, delta in delta_of.items():
+        deltas[delta].append(key)
+    DailyRollup.objects.bulk_create(
+        [DailyRollup(**dict(zip(KEY_FIELDS, key))) for keys in deltas.values() for key in keys],
+        ignore_conflicts=True,
+    )
+    if sum(map(len, deltas.values())) > CASE_KEYS_LIMIT:
+        _apply_by_id(deltas)
+        return
+    # A single UPDATE: one CASE branch per distinct delta (typically +1 and -1).
+    branches = [(reduce(or_, map(_key_q, keys)), delta) for delta, keys in deltas.items()]
+    DailyRollup.objects.filter(reduce(or_, (match for match, _ in branches))).update(
+        count=F('count') + Case(*(When(match, then=Value(count)) for match, (count, _) in branches), default=Value(0)),
+        visited=F('visited') + Case(*(When(match, then=Value(visits)) for match, (_, visits) in branches), default=Value(0)),
+    )
+
+
+def _apply_by_id(deltas):
+    """Bulk variant of ``apply``: look the rows up by date, then one ``id IN`` update per distinct delta."""
+    delta_of = {key: delta for delta, keys in deltas.items() for key in keys}
+    ids = defaultdict(list)
+    rows = DailyRollup.objects.filter(date__in={key[1] for key in delta_of}).values_list('id', *KEY_FIELDS)
+    for pk, *key in rows.iterator():
+        delta = delta_of.get(tuple(key))
+        if delta:
+            ids[delta].append(pk)
+    for (count, visits), pks in ids.items():
+        DailyRollup.objects.filter(pk__in=pks).update(count=F('count') + count, visited=F('visited') + visits)
+
+
+def _apply_entries(signed_entries):
+    counts, visited = Counter(), Counter()
+    for entry, sign in signed_entries:
+        if entry:
+            key, was_visited = entry
+            counts[key] += sign
+            visited[key] += sign * was_visited
+    apply(counts, visited)
+
+
+def add(entries, sign=1):
+    """Apply ``(key, visited)`` entries, as returned by ``rollup_entry``, with ``sign``."""
+    _apply_entries((entry, sign) for entry in entries)
+
+
+def added(instances):
+    """Count freshly bulk-created rows, which never fire post_save."""
+    add(instance.rollup_entry() for instance in instances)
+    for instance in instances:
+        instance._loaded_rollup = instance.rollup_entry()
+
+
+def _loaded(instance):
+    return getattr(instance, '_loaded_rollup', None) or instance.rollup_entry()
+
+
+def removed(instances):
+    """Uncount rows deleted in bulk, by the state they were loaded with."""
+    add((_loaded(instance) for instance in instances), sign=-1)
+
+
+def replaced(removed_instances, added_instances):
+    """``removed`` and ``added`` in one adjustment, e.g. for rows moved to history."""
+    _apply_entries(
+        [(_loaded(instance), -1) for instance in removed_instances]
+        + [(instance.rollup_entry(), 1) for instance in added_instances]
+    )
+    for instance in added_instances:
+        instance._loaded_rollup = instance.rollup_entry()
+
+
+def track(instance, created=False):
+    """Move a saved row's contribution from its loaded key to its current one."""
+    current = instance.rollup_entry()
+    previous = None if created else getattr(instance, '_loaded_rollup', None)
+    if current != previous:
+        _apply_entries([(previous, -1), (current, 1)])
+    instance._loaded_rollup = current
+
+
+def _aggregate(model, source, status_field, start_date, end_date, **annotations):
+    rows = (
+        model.objects.filter(appointment_date__range=(start_date, end_date)).order_by()
+        .values('appointment_date', 'doctor_id', 'service_id', status_field)
+        .annotate(count=Count('id'), **annotations)
+    )
+    return [
+        DailyRollup(
+            source=source, date=row['appointment_date'], doctor_id=row['doctor_id'] or 0,
+            service_id=row['service_id'] or 0, status=row[status_field],
+            count=row['count'], visited=row.get('visits', 0),
+        )
+        for row in rows
+    ]
+
+
+def rebuild(chunk_days=REBUILD_CHUNK_DAYS, log=None):
+    """Recompute all rollups from the raw tables, ``chunk_days`` at a time; returns rows written."""
+    bounds = [
+        model.objects.aggregate(first=Min('appointment_date'), last=Max('appointment_date'))
+        for model in (Appointment, AppointmentHistory)
+    ]
+    firsts = [bound['first'] for bound in bounds if bound['first']]
+    lasts = [bound['last'] for bound in bounds if bound['last']]
+    if not firsts:
+        DailyRollup.objects.all().delete()
+        return 0
+    first, last = min(firsts), max(lasts)
+    DailyRollup.objects.exclude(date__range=(first, last)).delete()
+
+    written = 0
+    start = first
+    while start <= last:
+        end = min(start + timedelta(days=chunk_days - 1), last)
+        with transaction.atomic():
+            DailyRollup.objects.filter(date__range=(start, end)).delete()
+            rows = _aggregate(Appointment, 'appointment', 'status', start, end) + _aggregate(
+                AppointmentHistory, 'history', 'new_status', start, end, visits=Count('id', filter=Q(visited='visited')),
+            )
+            DailyRollup.objects.bulk_create(rows)
+        written += len(rows)
+        if log:
+            log(f'{start:%Y-%m-%d}..{end:%Y-%m-%d}: {len(rows)} rollup rows')
+        start = end + timedelta(days=1)
+    return written
@@ -0,0 +1,248 @@
+"""Full-text search over patients, notes and messages.
+
+Searchable rows are mirrored into SearchDocument by signals. The ranked
+query runs against a backend-specific index built on that table:
+
+* SQLite: an external-content FTS5 table kept current by triggers.
+* PostgreSQL: a GIN index over a ``to_tsvector('simple', ...)`` expression.
+* Anything else: a plain LIKE scan, so search still works without an index.
+
+Set ``DENTAL_SEARCH_BACKEND`` to a dotted class path to override the choice.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, Case, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Appointment, AppointmentHistory, Feedback, SearchDocument, normalize_phone
+
+MODELS = {
+    'appointment': Appointment,
+    'history': AppointmentHistory,
+    'feedback': Feedback,
+}
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+PHONE_QUERY = re.compile(r'\+?[\d\s().-]*\d[\d\s().-]*')
+
+
+def kind_of(instance):
+    for kind, model in MODELS.items():
+        if isinstance(instance, model):
+            return kind
+    return None
+
+
+def document_fields(instance):
+    """Text stored in the search index for a model instance."""
+    if isinstance(instance, Appointment):
+        body = [instance.message, instance.admin_notes]
+    elif isinstance(instance, AppointmentHistory):
+        body = [instance.message, instance.notes, instance.service_name, instance.doctor_name]
+    else:
+        body = [instance.message]
+    return {
+        'name': instance.name or '',
+        'phone': instance.phone_digits,
+        'body': '\n'.join(part for part in body if part),
+    }
+
+
+def index(instance, created=False):
+    kind, fields = kind_of(instance), document_fields(instance)
+    if not created and SearchDocument.objects.filter(kind=kind, object_id=instance.pk).update(**fields):
+        return
+    SearchDocument.objects.create(kind=kind, object_id=instance.pk, **fields)
+
+
+def unindex(instance):
+    SearchDocument.objects.filter(kind=kind_of(instance), object_id=instance.pk).delete()
+
+
+def index_new(instances):
+    """Index freshly bulk-created rows, which never fire post_save."""
+    SearchDocument.objects.bulk_create([
+        SearchDocument(kind=kind_of(instance), object_id=instance.pk, **document_fields(instance))
+        for instance in instances
+    ])
+
+
+def unindex_many(kind, ids):
+    SearchDocument.objects.filter(kind=kind, object_id__in=ids).delete()
+
+
+def replace(old_kind, pairs):
+    """Re-point the documents of ``(old_id, new_instance)`` pairs at the new rows in one UPDATE.
+
+    Used when rows move to another table (appointments to history): the
+    old document becomes the new one instead of a delete plus an insert.
+    New rows whose old document is missing are indexed afresh.
+    """
+    if not pairs:
+        return
+    new_of = dict(pairs)
+    documents = {
+        old_id: {'kind': kind_of(instance), 'object_id': instance.pk, **document_fields(instance)}
+        for old_id, instance in new_of.items()
+    }
+    changes = {
+        column: Case(
+            *(When(object_id=old_id, then=Value(document[column])) for old_id, document in documents.items()),
+            output_field=SearchDocument._meta.get_field(column),
+        )
+        for column in ('kind', 'object_id', 'name', 'phone', 'body')
+    }
+    if SearchDocument.objects.filter(kind=old_kind, object_id__in=new_of).update(**changes) == len(new_of):
+        return
+    moved = SearchDocument.objects.filter(
+        kind__in={document['kind'] for document in documents.values()},
+        object_id__in=[instance.pk for instance in new_of.values()],
+    )
+    indexed = set(moved.values_list('kind', 'object_id'))
+    index_new([instance for instance in new_of.values() if (kind_of(instance), instance.pk) not in indexed])
+
+
+def terms(query):
+    """Split free text into word tokens; punctuation never reaches the index syntax.
+
+    A phone-looking query ("+977 980-111") collapses to its digits, which is
+    how phone numbers are stored in the index.
+    """
+    query = (query or '').strip()
+    if PHONE_QUERY.fullmatch(query):
+        return [normalize_phone(query)]
+    return re.findall(r'\w+', query)
+
+
+class SQLiteFTSBackend:
+    table = 'dental_searchdocument_fts'
+
+    def match(self, words):
+        return ' '.join(f'"{word}"*' for word in words)
+
+    def documents(self, words):
+        return SearchDocument.objects.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [self.match(words)])
+        )
+
+    def search(self, words, kinds, limit):
+        kind_sql = ''
+        params = [self.match(words)]
+        if kinds:
+            kind_sql = f" AND d.kind IN ({', '.join(['%s'] * len(kinds))})"
+            params.extend(kinds)
+        params.append(limit)
+        sql = (
+            f"SELECT d.kind, d.object_id, d.name, d.phone, "
+            f"snippet({self.table}, 2, '[', ']', '…', 12), bm25({self.table}) AS rank "
+            f"FROM {self.table} JOIN dental_searchdocument d ON d.id = {self.table}.rowid "
+            f"WHERE {self.table} MATCH %s{kind_sql} ORDER BY rank LIMIT %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            # bm25 is lower-is-better; flip it so every backend ranks higher-is-better.
+            return [(kind, pk, name, phone, snippet, -rank) for kind, pk, name, phone, snippet, rank in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    # Must stay identical to the expression of the GIN index created in migration 0013.
+    vector = "to_tsvector('simple', name || ' ' || phone || ' ' || body)"
+
+    def tsquery(self, words):
+        return ' & '.join(f'{word}:*' for word in words)
+
+    def documents(self, words):
+        return SearchDocument.objects.filter(
+            RawSQL(f"{self.vector} @@ to_tsquery('simple', %s)", [self.tsquery(words)], output_field=BooleanField())
+        )
+
+    def search(self, words, kinds, limit):
+        kind_sql = ''
+        params = [self.tsquery(words)]
+        if kinds:
+            kind_sql = ' AND kind = ANY(%s)'
+            params.append(list(kinds))
+        params.append(limit)
+        sql = (
+            f"SELECT kind, object_id, name, phone, "
+            f"ts_headline('simple', body, q, 'StartSel=[, StopSel=], MaxWords=12, MinWords=4'), "
+            f"ts_rank({self.vector}, q) AS rank "
+            f"FROM dental_searchdocument, to_tsquery('simple', %s) q "
+            f"WHERE {self.vector} @@ q{kind_sql} ORDER BY rank DESC LIMIT %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class LikeSearchBackend:
+    """Unindexed fallback for databases without a full-text engine."""
+
+    def documents(self, words):
+        qs = SearchDocument.objects.all()
+        for word in words:
+            qs = qs.filter(Q(name__icontains=word) | Q(phone__startswith=word) | Q(body__icontains=word))
+        return qs
+
+    def search(self, words, kinds, limit):
+        qs = self.documents(words)
+        if kinds:
+            qs = qs.filter(kind__in=kinds)
+        return [
+            (doc.kind, doc.object_id, doc.name, doc.phone, doc.body[:120], 0.0)
+            for doc in qs.order_by('-id')[:limit]
+        ]
+
+
+def get_backend():
+    path = getattr(settings, 'DENTAL_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTSBackend()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return LikeSearchBackend()
+
+
+def search(query, kinds=None, limit=DEFAULT_LIMIT):
+    """Ranked hits as dicts with kind, id, name, phone, snippet and rank."""
+    words = terms(query)
+    if not words:
+        return []
+    rows = get_backend().search(words, list(kinds or []), limit)
+    return [
+        {'kind': kind, 'id': pk, 'name': name, 'phone': phone, 'snippet': snippet, 'rank': rank}
+        for kind, pk, name, phone, snippet, rank in rows
+    ]
+
+
+def object_ids(kind, query, limit=1000):
+    """Primary keys of ``kind`` matching ``query``, best first."""
+    return [hit['id'] for hit in search(query, kinds=[kind], limit=limit)]
+
+
+def matching_ids(kind, query):
+    """Subquery of every ``kind`` primary key matching ``query``, unranked and unlimited.
+
+    For ``pk__in`` filters: the ids stay in the database however many match.
+    """
+    words = terms(query)
+    documents = get_backend().documents(words) if words else SearchDocument.objects.none()
+    return documents.filter(kind=kind).values('object_id')
+
+
+def rebuild():
+    """Re-index every searchable row from scratch."""
+    SearchDocument.objects.all().delete()
+    for kind, model in MODELS.items():
+        batch = []
+        for instance in model.objects.iterator(chunk_size=2000):
+            batch.append(SearchDocument(kind=kind, object_id=instance.pk, **document_fields(instance)))
+            if len(batch) >= 2000:
+                SearchDocument.objects.bulk_create(batch)
+                batch = []
+        SearchDocument.objects.bulk_create(batch)
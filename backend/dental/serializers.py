@@ -1,16 +1,35 @@
+from datetime import datetime, timedelta
+
 from rest_framework import serializers
+from .fieldsets import SparseFieldsMixin
 from .models import Appointment, AppointmentHistory, Doctor, Feedback, Service
 from django.contrib.auth import get_user_model
 User = get_user_model()
 
-class ServiceSerializer(serializers.ModelSerializer):
+
+def appointment_interval(obj, duration_minutes):
+    """ISO ``(start, end)`` of an appointment, or ``(None, None)`` if unscheduled."""
+    if not (obj.appointment_date and obj.appointment_time):
+        return None, None
+    start = datetime.combine(obj.appointment_date, obj.appointment_time)
+    return start.isoformat(), (start + timedelta(minutes=duration_minutes)).isoformat()
+
+
+def add_interval(data, obj, requested=None):
+    """Set ``start_time``/``end_time`` on ``data``; with ``?fields=``, only those in ``requested``."""
+    wanted = [name for name in ('start_time', 'end_time') if not requested or name in requested]
+    if wanted:
+        interval = dict(zip(('start_time', 'end_time'), appointment_interval(obj, obj.duration_minutes)))
+        data.update((name, interval[name]) for name in wanted)
+
+class ServiceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Service
-        fields = ['id', 'name', 'description', 'created_at']
+        fields = ['id', 'name', 'description', 'duration_minutes', 'created_at']
         read_only_fields = ['created_at']
 
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     service_name = serializers.CharField(source='service.name', read_only=True)
     
     class Meta:
@@ -23,19 +42,19 @@ class AppointmentSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
-class AppointmentHistorySerializer(serializers.ModelSerializer):
+class AppointmentHistorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = AppointmentHistory
         fields = [
             'id', 'appointment', 'name', 'email', 'phone', 'service_name',
             'appointment_date', 'appointment_time', 'message', 'doctor_id',
             'doctor_name', 'previous_status', 'new_status', 'changed_by',
-            'notes', 'timestamp', 'visited', 'service_id'
+            'notes', 'timestamp', 'visited', 'service_id', 'booked_at'
         ]
-        read_only_fields = ['timestamp']
+        read_only_fields = ['timestamp', 'booked_at']
 
 
-class DoctorSerializer(serializers.ModelSerializer):
+class DoctorSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     service_name = serializers.CharField(source='service.name', read_only=True)
     
     class Meta:
@@ -43,7 +62,7 @@ class DoctorSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'service', 'service_name', 'email', 'phone', 'active']
 
 
-class FeedbackSerializer(serializers.ModelSerializer):
+class FeedbackSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Feedback
         fields = ['id', 'name', 'phone', 'message', 'created_at']
@@ -51,22 +70,19 @@ class FeedbackSerializer(serializers.ModelSerializer):
         
 
 
-class CalendarAppointmentSerializer(serializers.ModelSerializer):
+class CalendarAppointmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     service = ServiceSerializer(read_only=True)
     doctor = DoctorSerializer(read_only=True)
     patient = serializers.SerializerMethodField()
     patient_name = serializers.CharField(source='name', read_only=True)
     service_name = serializers.CharField(source='service.name', read_only=True)
     service_duration = serializers.SerializerMethodField()
-    start_time = serializers.SerializerMethodField()
-    end_time = serializers.SerializerMethodField()
 
     class Meta:
         model = Appointment
         fields = [
             'id', 'patient', 'patient_name', 'service', 'service_name', 'service_duration',
-            'doctor', 'start_time', 'end_time', 'message', 'status', 'admin_notes',
-            'created_at'
+            'doctor', 'message', 'status', 'admin_notes', 'created_at'
         ]
 
     def get_patient(self, obj):
@@ -78,29 +94,40 @@ class CalendarAppointmentSerializer(serializers.ModelSerializer):
         }
 
     def get_service_duration(self, obj):
-        # Default to 60 minutes if no duration specified in service
-        # You can add a duration field to Service model later if needed
-        return 60
-
-    def get_start_time(self, obj):
-        if obj.appointment_date and obj.appointment_time:
-            from datetime import datetime
-            dt = datetime.combine(obj.appointment_date, obj.appointment_time)
-            return dt.isoformat()
-        return None
-
-    def get_end_time(self, obj):
-        if obj.appointment_date and obj.appointment_time:
-            from datetime import datetime, timedelta
-            dt = datetime.combine(obj.appointment_date, obj.appointment_time)
-            # Add service duration (default 60 minutes)
-            duration = self.get_service_duration(obj)
-            dt = dt + timedelta(minutes=duration)
-            return dt.isoformat()
-        return None
-
-
-class UserSerializer(serializers.ModelSerializer):
+        # The service's duration, or the default when no service is set
+        return obj.duration_minutes
+
+    def to_representation(self, obj):
+        # start/end are derived from one datetime.combine per row
+        data = super().to_representation(obj)
+        add_interval(data, obj, self.requested_fields)
+        return data
+
+
+class CalendarEventSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Slim calendar event; ``service``/``doctor`` are ids into per-response lookup tables."""
+    patient = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Appointment
+        fields = [
+            'id', 'patient', 'service', 'doctor', 'message', 'status', 'admin_notes', 'created_at'
+        ]
+
+    def get_patient(self, obj):
+        return {
+            'name': obj.name or '',
+            'phone': obj.phone or '',
+            'email': obj.email or ''
+        }
+
+    def to_representation(self, obj):
+        data = super().to_representation(obj)
+        add_interval(data, obj, self.requested_fields)
+        return data
+
+
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=False)
 
     class Meta:
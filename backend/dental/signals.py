@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import authentication, catalog, rollups, search, sync, versions
+from .models import Appointment, AppointmentHistory, Doctor, Feedback, Service
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=AppointmentHistory)
+@receiver(post_save, sender=Feedback)
+def index_search_document(sender, instance, created=False, raw=False, **kwargs):
+    """Keep the full-text index in step with searchable rows."""
+    if not raw:
+        search.index(instance, created=created)
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=AppointmentHistory)
+@receiver(post_delete, sender=Feedback)
+def unindex_search_document(sender, instance, **kwargs):
+    search.unindex(instance)
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=AppointmentHistory)
+@receiver(post_delete, sender=Feedback)
+def record_tombstone(sender, instance, **kwargs):
+    """Let delta sync clients drop the deleted row."""
+    sync.bury(sender, [instance.pk])
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=AppointmentHistory)
+@receiver(post_delete, sender=AppointmentHistory)
+def bump_calendar_version(sender, instance, raw=False, **kwargs):
+    """Invalidate ETags of the calendar day(s) the row sits on (and was moved from)."""
+    if not raw:
+        versions.touch(instance)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=AppointmentHistory)
+def track_daily_rollup(sender, instance, created=False, raw=False, **kwargs):
+    """Move the row's count to its current day/doctor/service/status rollup."""
+    if not raw:
+        rollups.track(instance, created=created)
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=AppointmentHistory)
+def untrack_daily_rollup(sender, instance, **kwargs):
+    rollups.removed([instance])
+
+
+@receiver(post_save, sender=Service)
+def resync_appointment_intervals(sender, instance, created=False, raw=False, **kwargs):
+    """Re-derive stored end times of a service's appointments after its duration changes."""
+    if raw or created:
+        return
+    stale = instance.appointments.filter(start_minute__isnull=False).exclude(
+        end_minute=F('start_minute') + instance.duration_minutes
+    )
+    days = set(stale.values_list('doctor_id', 'appointment_date'))
+    if days:
+        stale.update(end_minute=F('start_minute') + instance.duration_minutes)
+        versions.bump(versions.day_key(doctor_id, day) for doctor_id, day in days)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def invalidate_catalog(sender, **kwargs):
+    """Move the catalog version on now and again at commit, so a read racing the write is not kept."""
+    catalog.invalidate()
+    transaction.on_commit(catalog.invalidate)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_user_claims(sender, instance, update_fields=None, **kwargs):
+    """Make tokens issued before a user edit, deactivation or deletion reload the user."""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    authentication.user_changed(instance.pk)
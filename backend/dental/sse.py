@@ -0,0 +1,106 @@
+"""Server-sent events endpoint for appointment status changes.
+
+``GET /api/events/?phone=<number>`` streams the events published for that
+phone number (see ``dental.events``); ``?doctor=<id>&token=<access token>``
+streams a doctor's, for staff only (EventSource cannot send headers, so
+the JWT comes in the query string). This is a plain ASGI app mounted in
+``core/asgi.py`` ahead of Django: once subscribed, a connection waits on
+its queue and only wakes for events and heartbeats, without touching the
+database.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.exceptions import APIException
+
+from . import events
+from .authentication import ClaimsJWTAuthentication
+
+PATH = '/api/events/'
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 5000
+
+
+def matches(path):
+    return path.rstrip('/') + '/' == PATH
+
+
+def _cors_headers(scope):
+    origin = dict(scope.get('headers', [])).get(b'origin')
+    if origin and (getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False)
+                   or origin.decode('latin-1') in getattr(settings, 'CORS_ALLOWED_ORIGINS', ())):
+        return [(b'access-control-allow-origin', origin), (b'vary', b'Origin')]
+    return []
+
+
+def _is_staff(raw_token):
+    authentication = ClaimsJWTAuthentication()
+    try:
+        user = authentication.get_user(authentication.get_validated_token(raw_token))
+    except APIException:
+        return False
+    return bool(user.is_staff)
+
+
+async def _reply(send, scope, status, payload):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')] + _cors_headers(scope),
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps(payload).encode()})
+
+
+async def _disconnected(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def _message(event):
+    return f'data: {json.dumps(event, separators=(",", ":"))}\n\n'.encode()
+
+
+async def application(scope, receive, send):
+    if scope['method'] != 'GET':
+        return await _reply(send, scope, 405, {'detail': f'Method "{scope["method"]}" not allowed.'})
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    phone = query.get('phone', [''])[0].strip()
+    doctor = query.get('doctor', [''])[0].strip()
+    if doctor and not doctor.isdigit():
+        return await _reply(send, scope, 400, {'error': 'doctor must be an integer id'})
+    topics = events.topics_for(phone, doctor)
+    if not topics:
+        return await _reply(send, scope, 400, {'error': 'phone or doctor is required'})
+    if doctor and not await sync_to_async(_is_staff)(query.get('token', [''])[0]):
+        return await _reply(send, scope, 401, {'detail': 'Staff credentials are required to follow a doctor.'})
+
+    queue = events.broker.subscribe(topics, asyncio.get_running_loop())
+    disconnected = asyncio.ensure_future(_disconnected(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),  # don't let a proxy hold events back
+            ] + _cors_headers(scope),
+        })
+        await send({'type': 'http.response.body', 'body': f'retry: {RETRY_MILLISECONDS}\n\n'.encode(), 'more_body': True})
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, disconnected}, timeout=HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                body = _message(getter.result())
+            else:
+                getter.cancel()
+                if disconnected in done:
+                    break
+                body = b': keep-alive\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        events.broker.unsubscribe(topics, queue)
+        disconnected.cancel()
@@ -0,0 +1,78 @@
+"""Dashboard statistics computed with grouped aggregates and cached briefly.
+
+Each section is one ``aggregate``/``annotate`` query, and history counts
+come from DailyRollup, so a dashboard load stays cheap as data grows.
+Rollups skip rows without an appointment date; those few are counted
+directly through the appointment_date index.
+"""
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+from .models import Appointment, AppointmentHistory, DailyRollup, Doctor, Feedback
+
+CACHE_SECONDS = 30
+CACHE_PREFIX = 'dental:stats'
+
+
+def _counts(rows, key):
+    return {row[key]: row['count'] for row in rows}
+
+
+def compute(start_date, end_date):
+    """Counts for the dashboard; ``by_day`` covers ``start_date``..``end_date``."""
+    appointments = Appointment.objects.order_by()
+    by_status = _counts(appointments.values('status').annotate(count=Count('id')), 'status')
+    by_doctor = list(
+        appointments.values('doctor_id', 'doctor__name').annotate(count=Count('id')).order_by('-count', 'doctor__name')
+    )
+    by_service = list(
+        appointments.values('service_id', 'service__name').annotate(count=Count('id')).order_by('-count', 'service__name')
+    )
+    by_day = appointments.filter(appointment_date__range=(start_date, end_date)).values(
+        'appointment_date'
+    ).annotate(count=Count('id')).order_by('appointment_date')
+
+    # History grows without bound; read its counts from the maintained rollups.
+    history = list(DailyRollup.objects.filter(source='history').order_by().values('status').annotate(
+        count=Sum('count'), visited=Sum('visited'),
+    ))
+    undated = AppointmentHistory.objects.filter(appointment_date__isnull=True).order_by().values('new_status').annotate(
+        count=Count('id'), visited=Count('id', filter=Q(visited='visited')),
+    )
+    history_by_status = {}
+    visited = 0
+    for row in history + [{**row, 'status': row['new_status']} for row in undated]:
+        if row['count']:
+            history_by_status[row['status']] = history_by_status.get(row['status'], 0) + row['count']
+        visited += row['visited']
+    doctors = Doctor.objects.aggregate(total=Count('id'), active=Count('id', filter=Q(active=True)))
+
+    return {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'appointments': {
+            'total': sum(by_status.values()),
+            'by_status': by_status,
+            'by_doctor': [
+                {'doctor_id': row['doctor_id'], 'name': row['doctor__name'], 'count': row['count']} for row in by_doctor
+            ],
+            'by_service': [
+                {'service_id': row['service_id'], 'name': row['service__name'], 'count': row['count']} for row in by_service
+            ],
+            'by_day': [{'date': row['appointment_date'].isoformat(), 'count': row['count']} for row in by_day],
+        },
+        'history': {
+            'total': sum(history_by_status.values()),
+            'by_status': history_by_status,
+            'visited': visited,
+            'unvisited': sum(history_by_status.values()) - visited,
+        },
+        'doctors': doctors,
+        'feedback': {'total': Feedback.objects.count()},
+    }
+
+
+def summary(start_date, end_date):
+    """``compute`` served from the cache for up to CACHE_SECONDS."""
+    key = f'{CACHE_PREFIX}:{start_date.isoformat()}:{end_date.isoformat()}'
+    return cache.get_or_set(key, lambda: compute(start_date, end_date), CACHE_SECONDS)
@@ -1,3 +1,1251 @@
-from django.test import TestCase
+import asyncio
+import json
+import tempfile
+import threading
+import time as time_module
+from datetime import date, datetime, time, timedelta
+from contextlib import contextmanager
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError, connection, transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import analytics, archive, capacity, events, exports, response_cache, revocation, search, sse, sync
+from .models import Appointment, AppointmentHistory, CalendarVersion, DailyRollup, Doctor, Feedback, HistoryArchive, RevokedToken, SearchDocument, Service, Tombstone, UserTokenCutoff
+from .pagination import KeysetPagination
+
+
+@contextmanager
+def assert_app_queries(test, count):
+    """``assertNumQueries`` leaving out statements on the shared cache table (settings.CACHES)."""
+    with CaptureQueriesContext(connection) as context:
+        yield
+    statements = [
+        query['sql'] for query in context.captured_queries
+        if settings.CACHES['default']['LOCATION'] not in query['sql'] and 'SAVEPOINT' not in query['sql']
+    ]
+    test.assertEqual(len(statements), count, '\n'.join(statements))
+
+
+def make_doctor(name='Dr. Test', service_name='Capacity Checkup'):
+    service, _ = Service.objects.get_or_create(name=service_name)
+    return Doctor.objects.create(name=name, service=service)
+
+
+class HourlyCapacityTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor = make_doctor()
+
+    def book(self, when='10:15', day='2030-01-07'):
+        return self.client.post('/api/appointments/', {
+            'name': 'Patient', 'phone': '9800000000', 'doctor': self.doctor.id,
+            'appointment_date': day, 'appointment_time': when,
+        }, format='json')
+
+    def booked(self, hour=10, day=date(2030, 1, 7)):
+        """Most appointments running at once during ``hour``, as availability sees it."""
+        days = capacity.availability([self.doctor.id], day, day)[self.doctor.id]
+        return capacity.HOURLY_CAPACITY - days[0]['remaining'][capacity.CLINIC_HOURS.index(hour)]
+
+    def test_availability_is_one_query_and_one_sweep_per_day(self):
+        for when in ('09:30', '10:00', '10:15'):
+            self.book(when)
+        other = make_doctor('Dr. Other')
+        with assert_app_queries(self, 1), \
+                mock.patch('dental.capacity.hourly_peaks', wraps=capacity.hourly_peaks) as sweep, \
+                mock.patch('dental.capacity.peak_overlap') as rescan:
+            doctors = capacity.availability([self.doctor.id, other.id], date(2030, 1, 6), date(2030, 1, 8))
+        self.assertEqual(sweep.call_count, 6)
+        rescan.assert_not_called()
+        self.assertEqual(doctors[self.doctor.id][1]['remaining'][:4], [3, 2, 0, 2])
+        self.assertEqual(doctors[other.id][1]['remaining'], [3] * len(capacity.CLINIC_HOURS))
+
+    def test_fourth_booking_in_hour_is_rejected(self):
+        for minute in ('00', '15', '45'):
+            self.assertEqual(self.book(f'10:{minute}').status_code, 201)
+        response = self.book('10:30')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Appointment.objects.count(), 3)
+        self.assertEqual(self.booked(), 3)
+
+    def test_moving_appointment_transfers_its_slot(self):
+        appointment_id = self.book('10:00').data['id']
+        response = self.client.patch(f'/api/appointments/{appointment_id}/', {'appointment_time': '11:00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.booked(10), 0)
+        self.assertEqual(self.booked(11), 1)
+
+    def test_approval_frees_the_slot(self):
+        appointment_id = self.book('10:00').data['id']
+        response = self.client.patch(f'/api/appointments/{appointment_id}/', {'status': 'APPROVED'}, format='json')
+        self.assertTrue(response.data['moved_to_history'])
+        self.assertEqual(self.booked(), 0)
+
+    def test_overlap_across_hour_boundary_counts(self):
+        for when in ('10:45', '10:50', '11:00'):
+            self.assertEqual(self.book(when).status_code, 201)
+        # 11:15 falls in a different hour but overlaps all three 60-minute bookings
+        self.assertEqual(self.book('11:15').status_code, 400)
+        # 11:45 starts after 10:45 and 10:50 have ended
+        self.assertEqual(self.book('11:50').status_code, 201)
+
+    def test_short_services_fit_more_per_hour(self):
+        quick = Service.objects.create(name='Quick check', duration_minutes=20)
+        for when in ('10:00', '10:00', '10:00', '10:20', '10:40'):
+            response = self.client.post('/api/appointments/', {
+                'name': 'Patient', 'doctor': self.doctor.id, 'service': quick.id,
+                'appointment_date': '2030-01-07', 'appointment_time': when,
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(Appointment.objects.count(), 5)
+        self.assertEqual(self.booked(), 3)
+
+    def test_rescheduling_into_full_period_is_rejected(self):
+        for when in ('10:00', '10:15', '10:30'):
+            self.book(when)
+        appointment_id = self.book('12:00').data['id']
+        response = self.client.patch(f'/api/appointments/{appointment_id}/', {'appointment_time': '10:45'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Appointment.objects.get(pk=appointment_id).appointment_time, time(12, 0))
+
+    def test_duration_change_updates_stored_intervals(self):
+        service = self.doctor.service
+        appointment = Appointment.objects.create(
+            name='Patient', doctor=self.doctor, service=service,
+            appointment_date=date(2030, 1, 7), appointment_time=time(10, 0),
+        )
+        self.assertEqual((appointment.start_minute, appointment.end_minute), (600, 660))
+        service.duration_minutes = 90
+        service.save()
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.end_minute, 690)
+
+    def test_availability_agrees_with_booking(self):
+        for when in ('10:45', '10:50', '11:00'):
+            self.assertEqual(self.book(when).status_code, 201)
+        response = self.client.get(
+            f'/api/doctors/{self.doctor.id}/availability/', {'start_date': '2030-01-07', 'end_date': '2030-01-07'}
+        )
+        remaining = dict(zip(capacity.CLINIC_HOURS, response.data['doctors'][0]['days'][0]['remaining']))
+        self.assertEqual((remaining[10], remaining[11], remaining[12]), (1, 0, 3))
+        self.assertEqual(self.book('11:15').status_code, 400)
+        for hour in (11, 12, 10):
+            expected = 201 if remaining[hour] else 400
+            self.assertEqual(self.book(f'{hour}:00').status_code, expected, hour)
+
+
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor = make_doctor()
+        for when in (time(10, 0), time(10, 30)):
+            Appointment.objects.create(name='Patient', doctor=self.doctor, appointment_date=date(2030, 1, 8), appointment_time=when)
+
+    def test_doctor_availability_reports_remaining_per_hour(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                f'/api/doctors/{self.doctor.id}/availability/', {'start_date': '2030-01-07', 'end_date': '2030-01-08'}
+            )
+        self.assertEqual(response.status_code, 200)
+        days = response.data['doctors'][0]['days']
+        self.assertEqual([day['date'] for day in days], ['2030-01-07', '2030-01-08'])
+        hour = capacity.CLINIC_HOURS.index(10)
+        self.assertEqual(days[0]['remaining'][hour], 3)
+        self.assertEqual(days[1]['remaining'][hour], 1)
+
+    def test_service_availability_covers_active_doctors(self):
+        make_doctor('Dr. Other')
+        response = self.client.get(
+            f'/api/services/{self.doctor.service_id}/availability/', {'start_date': '2030-01-07', 'end_date': '2030-01-07'}
+        )
+        self.assertEqual(len(response.data['doctors']), 2)
+
+    def test_invalid_range_is_rejected(self):
+        response = self.client.get(f'/api/doctors/{self.doctor.id}/availability/', {'start_date': '2030-01-07'})
+        self.assertEqual(response.status_code, 400)
+
+
+class OccupancyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor = make_doctor()
+        for day in (date(2030, 1, 8), date(2030, 1, 8), date(2030, 2, 1)):
+            Appointment.objects.create(name='Patient', doctor=self.doctor, appointment_date=day, appointment_time=time(10, 0))
+
+    def test_dense_matrix_in_one_query(self):
+        idle = make_doctor('Dr. Idle')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/occupancy/', {'start_date': '2030-01-07', 'end_date': '2030-01-08'})
+        self.assertEqual(response.status_code, 200)
+        doctors = {row['doctor_id']: row['booked'] for row in response.data['doctors']}
+        hour = capacity.CLINIC_HOURS.index(10)
+        self.assertEqual(doctors[self.doctor.id][0], '0' * len(capacity.CLINIC_HOURS))
+        self.assertEqual(doctors[self.doctor.id][1][hour], '2')
+        self.assertEqual(doctors[idle.id], ['0' * len(capacity.CLINIC_HOURS)] * 2)
+
+    def test_service_filter(self):
+        make_doctor('Dr. Other', service_name='Occupancy Other')
+        response = self.client.get('/api/occupancy/', {
+            'start_date': '2030-01-07', 'end_date': '2030-01-07', 'service': self.doctor.service_id,
+        })
+        self.assertEqual([row['doctor_id'] for row in response.data['doctors']], [self.doctor.id])
+
+
+class PhoneLookupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Appointment.objects.create(name='Active', phone='+977 980-111-2222')
+        AppointmentHistory.objects.create(name='Past', phone='(977) 9801112222', previous_status='PENDING', new_status='APPROVED')
+        Appointment.objects.create(name='Other', phone='977 981 000 0000')
+        Feedback.objects.create(name='Kind words', phone='977-980-111-2222')
+
+    def test_phone_digits_are_stored_on_save(self):
+        self.assertEqual(Appointment.objects.get(name='Active').phone_digits, '9779801112222')
+
+    def test_by_phone_matches_prefix_across_active_and_history(self):
+        response = self.client.get('/api/appointments/by_phone/', {'phone': '977-980'})
+        self.assertEqual(sorted(item['name'] for item in response.data), ['Active', 'Past'])
+        self.assertEqual({item['_source'] for item in response.data}, {'active', 'history'})
+
+    def test_list_filters_use_normalized_phone(self):
+        self.assertEqual(len(self.client.get('/api/history/', {'phone': '977980'}).data['results']), 1)
+        self.assertEqual(len(self.client.get('/api/feedback/', {'phone': '+977 980'}).data['results']), 1)
+        self.assertEqual(len(self.client.get('/api/feedback/', {'phone': '981'}).data['results']), 0)
+
+
+class PatientTimelineTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for index in range(4):
+            Appointment.objects.create(name=f'Active {index}', phone='980-555-0000')
+            AppointmentHistory.objects.create(
+                name=f'Past {index}', phone='9805550000', previous_status='PENDING', new_status='APPROVED'
+            )
+        Appointment.objects.create(name='Stranger', phone='981')
+
+    def test_pages_cover_merged_timeline_without_gaps(self):
+        seen, cursor = [], None
+        while True:
+            params = {'phone': '980555', 'limit': 3}
+            if cursor:
+                params['cursor'] = cursor
+            with self.assertNumQueries(3):
+                response = self.client.get('/api/appointments/timeline/', params)
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen.extend((item['_source'], item['id']) for item in response.data['results'])
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 8)
+        self.assertEqual(len(set(seen)), 8)
+
+    def test_newest_entry_comes_first(self):
+        latest = AppointmentHistory.objects.create(
+            name='Latest', phone='9805550000', previous_status='PENDING', new_status='REJECTED'
+        )
+        response = self.client.get('/api/appointments/timeline/', {'phone': '980555', 'limit': 1})
+        self.assertEqual(response.data['results'][0]['id'], latest.id)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/appointments/timeline/', {'phone': '980', 'cursor': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.appointment = Appointment.objects.create(name='Sita Sharma', phone='980-123-4567', message='Wisdom tooth pain')
+        AppointmentHistory.objects.create(
+            name='Ram Thapa', phone='9841000000', notes='Follow up on crown fitting',
+            previous_status='PENDING', new_status='APPROVED',
+        )
+        Feedback.objects.create(name='Hari', phone='9800000000', message='Painless crown work, thank you')
+
+    def search(self, q, **params):
+        return self.client.get('/api/search/', {'q': q, **params}).data['results']
+
+    def test_ranks_hits_across_tables(self):
+        hits = self.search('crown')
+        self.assertEqual({hit['kind'] for hit in hits}, {'history', 'feedback'})
+
+    def test_prefix_and_phone_queries(self):
+        self.assertEqual(self.search('wisd')[0]['id'], self.appointment.id)
+        self.assertEqual(self.search('980-123')[0]['name'], 'Sita Sharma')
+
+    def test_index_follows_updates_and_deletes(self):
+        self.appointment.message = 'Braces consultation'
+        self.appointment.save()
+        self.assertEqual(self.search('wisdom'), [])
+        self.assertEqual(len(self.search('braces')), 1)
+        self.appointment.delete()
+        self.assertEqual(self.search('braces'), [])
+
+    def test_admin_search_is_not_capped(self):
+        rows = AppointmentHistory.objects.bulk_create([
+            AppointmentHistory(name=f'Crown {index}', previous_status='PENDING', new_status='APPROVED')
+            for index in range(1001)
+        ])
+        search.index_new(rows)
+        self.client.force_login(User.objects.create_superuser('staff', 'staff@example.com', 'pw'))
+        response = self.client.get('/admin/dental/appointmenthistory/', {'q': 'crown'})
+        # the 1001 imported rows plus Ram Thapa's crown fitting
+        self.assertEqual(response.context['cl'].result_count, 1002)
+
+    def test_kind_filter_and_punctuation_are_safe(self):
+        self.assertEqual(len(self.search('crown', kind='feedback')), 1)
+        self.assertEqual(self.search('"*) OR ('), [])
+
+
+class BulkTransitionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor = make_doctor()
+        self.appointments = [
+            Appointment.objects.create(
+                name=f'Patient {index}', phone='9800000000', doctor=self.doctor, service=self.doctor.service,
+                appointment_date=date(2030, 1, 7), appointment_time=time(10, 0),
+            )
+            for index in range(3)
+        ]
+
+    def test_moves_all_to_history_in_one_request(self):
+        ids = [appointment.id for appointment in self.appointments]
+        response = self.client.post(
+            '/api/appointments/bulk_transition/', {'ids': ids + [999999], 'status': 'APPROVED'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([result['id'] for result in results], ids + [999999])
+        self.assertTrue(all(result['moved_to_history'] for result in results[:3]))
+        self.assertFalse(results[3]['moved_to_history'])
+        self.assertFalse(Appointment.objects.exists())
+        history = AppointmentHistory.objects.get(id=results[0]['history_id'])
+        self.assertEqual((history.doctor_name, history.service_name, history.new_status), (self.doctor.name, self.doctor.service.name, 'APPROVED'))
+        self.assertEqual(history.phone_digits, '9800000000')
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        ids = [appointment.id for appointment in self.appointments]
+        # select, history insert, search documents re-pointed, rollup upsert, version upsert,
+        # tombstones, unlink, delete + savepoint pair
+        with self.assertNumQueries(10):
+            self.client.post('/api/appointments/bulk_transition/', {'ids': ids, 'status': 'REJECTED'}, format='json')
+
+    def test_rejects_non_final_status(self):
+        response = self.client.post(
+            '/api/appointments/bulk_transition/', {'ids': [self.appointments[0].id], 'status': 'PENDING'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class TransitionPathTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor = make_doctor()
+        self.appointment = Appointment.objects.create(
+            name='Patient', phone='9800000000', doctor=self.doctor, service=self.doctor.service,
+            appointment_date=date(2030, 1, 7), appointment_time=time(10, 0),
+        )
+
+    def test_api_approval_statement_count(self):
+        # get_object, savepoint pair, locked select_related fetch, history insert, search document
+        # re-pointed, rollup upsert, version upsert, then tombstone, unlink and delete of the appointment
+        with self.assertNumQueries(11):
+            response = self.client.patch(
+                f'/api/appointments/{self.appointment.id}/', {'status': 'APPROVED', 'admin_notes': 'ok'}, format='json'
+            )
+        self.assertTrue(response.data['moved_to_history'])
+        history = AppointmentHistory.objects.get(id=response.data['history_id'])
+        self.assertEqual((history.previous_status, history.new_status, history.notes), ('PENDING', 'APPROVED', 'ok'))
+        self.assertEqual(history.service_id, self.doctor.service_id)
+        self.assertEqual(
+            list(SearchDocument.objects.values_list('kind', 'object_id', 'body')), [('history', history.id, 'ok\nCapacity Checkup\nDr. Test')]
+        )
+        self.assertEqual(search.object_ids('history', 'Patient'), [history.id])
+
+    def test_api_field_update_statement_count(self):
+        # get_object, savepoint pair, locked fetch, save, overlap scan, reindex, version upsert
+        with self.assertNumQueries(8):
+            response = self.client.patch(
+                f'/api/appointments/{self.appointment.id}/', {'appointment_time': '11:00'}, format='json'
+            )
+        self.assertEqual(response.data['appointment_time'], '11:00:00')
+
+    def test_admin_approval_uses_shared_path(self):
+        admin_user = User.objects.create_superuser('staff', 'staff@example.com', 'pw')
+        self.client.force_login(admin_user)
+        response = self.client.post(f'/admin/dental/appointment/{self.appointment.id}/change/', {
+            'service': self.doctor.service_id, 'doctor': self.doctor.id,
+            'appointment_date': '2030-01-07', 'appointment_time': '10:00', 'message': '',
+            'admin_notes': 'seen at desk', '_approve': 'Approve',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Appointment.objects.exists())
+        history = AppointmentHistory.objects.get()
+        self.assertEqual((history.changed_by, history.notes, history.service_id), ('staff', 'seen at desk', self.doctor.service_id))
+
+
+class HistoryArchiveTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        override = override_settings(HISTORY_ARCHIVE_DIR=Path(self.tmp.name))
+        override.enable()
+        self.addCleanup(override.disable)
+        for index, when in enumerate([datetime(2023, 1, 5), datetime(2023, 1, 20), datetime(2023, 2, 3)]):
+            entry = AppointmentHistory.objects.create(
+                name=f'Old {index}', phone=f'98000000{index}', previous_status='PENDING', new_status='APPROVED'
+            )
+            AppointmentHistory.objects.filter(pk=entry.pk).update(timestamp=timezone.make_aware(when))
+        self.recent = AppointmentHistory.objects.create(name='Recent', phone='9811111111', previous_status='PENDING', new_status='APPROVED')
+
+    def test_archive_query_and_restore_round_trip(self):
+        out = StringIO()
+        call_command('archive_history', '--older-than-days', '365', '--chunk-size', '2', stdout=out)
+        self.assertEqual(list(AppointmentHistory.objects.values_list('name', flat=True)), ['Recent'])
+        self.assertEqual(
+            sorted((entry.month, entry.row_count) for entry in HistoryArchive.objects.all()),
+            [(date(2023, 1, 1), 2), (date(2023, 2, 1), 1)],
+        )
+
+        out = StringIO()
+        call_command('query_history_archive', '--phone', '980000001', '--since', '2023-01', stdout=out)
+        self.assertEqual([json.loads(line)['name'] for line in out.getvalue().splitlines()], ['Old 1'])
+
+        call_command('restore_history_archive', '--until', '2023-01', stdout=StringIO())
+        restored = AppointmentHistory.objects.get(name='Old 0')
+        self.assertEqual(restored.timestamp, timezone.make_aware(datetime(2023, 1, 5)))
+        self.assertEqual(HistoryArchive.objects.count(), 1)
+        self.assertEqual(AppointmentHistory.objects.count(), 3)
+
+    def test_rerun_after_interrupted_run(self):
+        # A run that died after recording its file but before deleting any rows.
+        with mock.patch('dental.archive._delete_chunk', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('archive_history', '--older-than-days', '365', stdout=StringIO())
+        self.assertEqual(AppointmentHistory.objects.count(), 4)
+        call_command('archive_history', '--older-than-days', '365', stdout=StringIO())
+        self.assertEqual(list(AppointmentHistory.objects.values_list('name', flat=True)), ['Recent'])
+        # January is recorded twice, under two names; February once.
+        self.assertEqual(HistoryArchive.objects.filter(month=date(2023, 1, 1)).count(), 2)
+        self.assertEqual(len({entry.path for entry in HistoryArchive.objects.all()}), 3)
+        self.assertTrue(all((Path(self.tmp.name) / entry.path).exists() for entry in HistoryArchive.objects.all()))
+        self.assertEqual(Tombstone.objects.filter(kind='history').count(), 3)
+
+    def test_interrupted_run_keeps_counters_in_step(self):
+        AppointmentHistory.objects.exclude(pk=self.recent.pk).delete()
+        doctor = make_doctor()
+        for day in (3, 4, 5):
+            entry = AppointmentHistory.objects.create(
+                name=f'Dated {day}', doctor_id=doctor.id, service_id=doctor.service_id, appointment_date=date(2023, 3, day),
+                previous_status='PENDING', new_status='APPROVED',
+            )
+            AppointmentHistory.objects.filter(pk=entry.pk).update(timestamp=timezone.make_aware(datetime(2023, 3, day)))
+        before = dict(CalendarVersion.objects.values_list('date', 'version'))
+        delete_chunk = archive._delete_chunk
+        calls = []
+
+        def die_after_first_chunk(*args):
+            if calls:
+                raise KeyboardInterrupt
+            calls.append(args)
+            delete_chunk(*args)
+
+        with mock.patch('dental.archive._delete_chunk', side_effect=die_after_first_chunk):
+            with self.assertRaises(KeyboardInterrupt):
+                archive.archive_before(timezone.make_aware(datetime(2023, 4, 1)), chunk_size=1)
+        self.assertEqual(AppointmentHistory.objects.filter(name__startswith='Dated').count(), 2)
+        rollup = DailyRollup.objects.filter(source='history', date__month=3).exclude(count=0)
+        self.assertEqual(sorted(rollup.values_list('date', 'count')), [(date(2023, 3, 4), 1), (date(2023, 3, 5), 1)])
+        bumped = dict(CalendarVersion.objects.values_list('date', 'version'))
+        self.assertEqual([day for day in before if bumped[day] != before[day]], [date(2023, 3, 3)])
+
+    def test_dry_run_changes_nothing(self):
+        call_command('archive_history', '--dry-run', stdout=StringIO())
+        self.assertEqual(AppointmentHistory.objects.count(), 4)
+        self.assertFalse(HistoryArchive.objects.exists())
+
+
+class CalendarTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.doctors = [make_doctor('Dr. A'), make_doctor('Dr. B', 'Orthodontics')]
+        for index in range(6):
+            doctor = self.doctors[index % 2]
+            Appointment.objects.create(
+                name=f'Patient {index}', doctor=doctor, service=doctor.service,
+                appointment_date=date(2030, 1, 7 + index % 3), appointment_time=time(9 + index, 30),
+            )
+        self.params = {'start_date': '2030-01-07', 'end_date': '2030-01-13'}
+
+    def test_end_time_uses_service_duration(self):
+        Service.objects.filter(pk=self.doctors[0].service_id).update(duration_minutes=45)
+        event = self.client.get('/api/appointments/calendar/', {**self.params, 'doctor_id': self.doctors[0].id}).data[0]
+        self.assertEqual(event['service_duration'], 45)
+        start = datetime.fromisoformat(event['start_time'])
+        self.assertEqual(datetime.fromisoformat(event['end_time']) - start, timedelta(minutes=45))
+
+    def test_full_events_in_one_query(self):
+        # One read of the calendar version counters for the ETag, one for the events.
+        with assert_app_queries(self, 2):
+            response = self.client.get('/api/appointments/calendar/', self.params)
+        self.assertEqual(len(response.data), 6)
+        event = next(item for item in response.data if item['patient_name'] == 'Patient 0')
+        self.assertEqual(event['doctor']['service_name'], self.doctors[0].service.name)
+        self.assertEqual((event['start_time'], event['end_time']), ('2030-01-07T09:30:00', '2030-01-07T10:30:00'))
+
+    def test_compact_events_reference_lookup_tables(self):
+        with assert_app_queries(self, 2):
+            response = self.client.get('/api/appointments/calendar/', {**self.params, 'compact': '1'})
+        self.assertEqual(len(response.data['events']), 6)
+        self.assertEqual(set(response.data['doctors']), {doctor.id for doctor in self.doctors})
+        event = response.data['events'][0]
+        self.assertIn(event['doctor'], response.data['doctors'])
+        self.assertIn(event['service'], response.data['services'])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor = make_doctor()
+        self.appointment = Appointment.objects.create(
+            name='Patient', doctor=self.doctor, appointment_date=date(2030, 1, 7), appointment_time=time(9, 0)
+        )
+        self.params = {'start_date': '2030-01-07', 'end_date': '2030-01-13', 'doctor_id': self.doctor.id}
+
+    def test_calendar_304_without_touching_appointments(self):
+        etag = self.client.get('/api/appointments/calendar/', self.params)['ETag']
+        with assert_app_queries(self, 1):
+            response = self.client.get('/api/appointments/calendar/', self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_in_range_changes_etag(self):
+        etag = self.client.get('/api/appointments/calendar/', self.params)['ETag']
+        self.client.patch(f'/api/appointments/{self.appointment.id}/', {'status': 'APPROVED'}, format='json')
+        response = self.client.get('/api/appointments/calendar/', self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_moving_out_of_range_invalidates_old_day(self):
+        etag = self.client.get('/api/appointments/calendar/', self.params)['ETag']
+        self.client.patch(f'/api/appointments/{self.appointment.id}/', {'appointment_date': '2030-02-01'}, format='json')
+        response = self.client.get('/api/appointments/calendar/', self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+
+    def test_catalog_edit_changes_calendar_etag(self):
+        etag = self.client.get('/api/appointments/calendar/', self.params)['ETag']
+        self.doctor.name = 'Dr. Renamed'
+        self.doctor.save()
+        response = self.client.get('/api/appointments/calendar/', self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data[0]['doctor']['name'], 'Dr. Renamed')
+
+    def test_history_range_supports_conditional_get(self):
+        entry = AppointmentHistory.objects.create(
+            name='Past', doctor_id=self.doctor.id, appointment_date=date(2030, 1, 8),
+            previous_status='PENDING', new_status='APPROVED',
+        )
+        etag = self.client.get('/api/history/', self.params)['ETag']
+        self.assertEqual(self.client.get('/api/history/', self.params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.post(f'/api/history/{entry.id}/mark_visited/')
+        self.assertEqual(self.client.get('/api/history/', self.params, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class StatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.doctor = make_doctor()
+        for status_value in ('PENDING', 'PENDING', 'APPROVED'):
+            Appointment.objects.create(
+                name='Patient', doctor=self.doctor, service=self.doctor.service,
+                appointment_date=date(2030, 1, 7), appointment_time=time(9, 0), status=status_value,
+            )
+        AppointmentHistory.objects.create(
+            name='Seen', appointment_date=date(2029, 12, 1), previous_status='PENDING', new_status='APPROVED', visited='visited',
+        )
+        AppointmentHistory.objects.create(
+            name='Missed', appointment_date=date(2029, 12, 1), previous_status='PENDING', new_status='APPROVED',
+        )
+        AppointmentHistory.objects.create(
+            name='Declined', appointment_date=date(2029, 12, 1), previous_status='PENDING', new_status='REJECTED',
+        )
+        # never had a date, so no rollup counts it
+        AppointmentHistory.objects.create(name='Walk-in', previous_status='PENDING', new_status='APPROVED', visited='visited')
+        Feedback.objects.create(name='Kind words')
+        self.params = {'start_date': '2030-01-01', 'end_date': '2030-01-31'}
+
+    def test_counts(self):
+        data = self.client.get('/api/stats/', self.params).data
+        self.assertEqual(data['appointments']['total'], 3)
+        self.assertEqual(data['appointments']['by_status'], {'PENDING': 2, 'APPROVED': 1})
+        self.assertEqual(data['appointments']['by_doctor'], [{'doctor_id': self.doctor.id, 'name': 'Dr. Test', 'count': 3}])
+        self.assertEqual(data['appointments']['by_day'], [{'date': '2030-01-07', 'count': 3}])
+        self.assertEqual(data['history'], {
+            'total': 4, 'by_status': {'APPROVED': 3, 'REJECTED': 1}, 'visited': 2, 'unvisited': 2,
+        })
+        self.assertEqual(data['doctors'], {'total': 1, 'active': 1})
+        self.assertEqual(data['feedback'], {'total': 1})
+
+    def test_second_load_is_served_from_cache(self):
+        self.client.get('/api/stats/', self.params)
+        with assert_app_queries(self, 0):
+            self.assertEqual(self.client.get('/api/stats/', self.params).status_code, 200)
+
+
+class DailyRollupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor = make_doctor()
+
+    def book(self, when='10:00'):
+        return self.client.post('/api/appointments/', {
+            'name': 'Patient', 'doctor': self.doctor.id, 'service': self.doctor.service_id,
+            'appointment_date': '2030-01-07', 'appointment_time': when,
+        }, format='json').data['id']
+
+    def snapshot(self):
+        return sorted(
+            DailyRollup.objects.exclude(count=0, visited=0)
+            .values_list('source', 'date', 'doctor_id', 'service_id', 'status', 'count', 'visited')
+        )
+
+    def test_write_paths_keep_rollups_in_step(self):
+        first, second, third = self.book('09:00'), self.book('10:00'), self.book('11:00')
+        self.client.patch(f'/api/appointments/{first}/', {'status': 'APPROVED'}, format='json')
+        self.client.post('/api/appointments/bulk_transition/', {'ids': [second], 'status': 'REJECTED'}, format='json')
+        self.client.patch(f'/api/appointments/{third}/', {'appointment_date': '2030-01-09'}, format='json')
+        history = AppointmentHistory.objects.get(new_status='APPROVED')
+        self.client.post(f'/api/history/{history.id}/mark_visited/')
+
+        key = (self.doctor.id, self.doctor.service_id)
+        self.assertEqual(self.snapshot(), [
+            ('appointment', date(2030, 1, 9), *key, 'PENDING', 1, 0),
+            ('history', date(2030, 1, 7), *key, 'APPROVED', 1, 1),
+            ('history', date(2030, 1, 7), *key, 'REJECTED', 1, 0),
+        ])
+
+        incremental = self.snapshot()
+        DailyRollup.objects.update(count=99)
+        call_command('rebuild_daily_rollups', '--chunk-days', '1', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_delete_uncounts(self):
+        appointment_id = self.book()
+        self.client.delete(f'/api/appointments/{appointment_id}/')
+        self.assertEqual(self.snapshot(), [])
+
+    def test_backends_without_upserts_count_the_same(self):
+        self.book('09:00')
+        upserted = self.snapshot()
+        calendar = list(CalendarVersion.objects.values_list('doctor_id', 'date', 'version'))
+        Appointment.objects.all().delete()
+        DailyRollup.objects.all().delete()
+        CalendarVersion.objects.all().delete()
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            self.book('09:00')
+        self.assertEqual(self.snapshot(), upserted)
+        self.assertEqual(list(CalendarVersion.objects.values_list('doctor_id', 'date', 'version')), calendar)
+
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.doctor = make_doctor()
+        booked = timezone.make_aware(datetime(2025, 12, 1, 9, 0))
+        for hours, visited in ((2, 'visited'), (4, 'visited'), (10, 'unvisited'), (30, 'unvisited')):
+            entry = AppointmentHistory.objects.create(
+                name='Patient', doctor_id=self.doctor.id, service_id=self.doctor.service_id,
+                appointment_date=date(2025, 12, 10), previous_status='PENDING', new_status='APPROVED',
+                visited=visited, booked_at=booked,
+            )
+            AppointmentHistory.objects.filter(pk=entry.pk).update(timestamp=booked + timedelta(hours=hours))
+        self.params = {'start_date': '2025-12-01', 'end_date': '2025-12-31'}
+
+    def test_no_show_rate_per_doctor(self):
+        response = self.client.get('/api/analytics/no_show/', self.params)
+        self.assertEqual(response.data['results'], [{
+            'id': self.doctor.id, 'name': 'Dr. Test', 'approved': 4, 'visited': 2, 'no_shows': 2, 'no_show_rate': 0.5,
+        }])
+        by_service = self.client.get('/api/analytics/no_show/', {**self.params, 'group': 'service'}).data
+        self.assertEqual(by_service['results'][0]['id'], self.doctor.service_id)
+
+    def test_lead_time_histogram(self):
+        data = self.client.get('/api/analytics/lead_time/', self.params).data
+        self.assertEqual(data['total'], 4)
+        nine_days = next(item for item in data['bins'] if item['min_days'] == 8)
+        self.assertEqual(nine_days['count'], 4)
+
+    def test_decision_latency_percentiles(self):
+        data = self.client.get('/api/analytics/decision_latency/', self.params).data
+        self.assertEqual(data['count'], 4)
+        self.assertEqual(data['mean_hours'], 11.5)
+        self.assertEqual(data['percentiles_hours']['p50'], 4.0)
+        self.assertEqual(data['percentiles_hours']['p99'], 30.0)
+
+    def test_decision_latency_reads_one_row_per_percentile(self):
+        with CaptureQueriesContext(connection) as queries:
+            analytics.decision_latency(date(2025, 12, 1), date(2025, 12, 31))
+        self.assertEqual(len(queries), 1 + len(analytics.PERCENTILES))
+        self.assertTrue(all('LIMIT 1' in query['sql'] for query in queries[1:]))
+
+    def test_results_are_cached_per_range(self):
+        self.client.get('/api/analytics/decision_latency/', self.params)
+        with assert_app_queries(self, 0):
+            self.client.get('/api/analytics/decision_latency/', self.params)
+
+    def test_snapshots_record_booking_time(self):
+        appointment = Appointment.objects.create(name='New', doctor=self.doctor, appointment_date=date(2030, 1, 7))
+        response = self.client.patch(f'/api/appointments/{appointment.id}/', {'status': 'APPROVED'}, format='json')
+        entry = AppointmentHistory.objects.get(pk=response.data['history_id'])
+        self.assertEqual(entry.booked_at, appointment.created_at)
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        created = timezone.make_aware(datetime(2030, 1, 1, 9, 0))
+        for index in range(7):
+            appointment = Appointment.objects.create(name=f'Patient {index}')
+            # pairs share a created_at so pages must break ties on id
+            Appointment.objects.filter(pk=appointment.pk).update(created_at=created + timedelta(minutes=index // 2))
+
+    def test_cursor_pages_cover_every_row_once(self):
+        names, url, params = [], '/api/appointments/', {'page_size': 3}
+        while url:
+            data = self.client.get(url, params).data
+            self.assertNotIn('count', data)
+            names.extend(item['name'] for item in data['results'])
+            url, params = data['next'], None
+        self.assertEqual(names, [f'Patient {index}' for index in range(6, -1, -1)])
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(KeysetPagination, 'max_page_size', 2):
+            self.assertEqual(len(self.client.get('/api/appointments/', {'page_size': 5000}).data['results']), 2)
+
+    def test_offset_mode_for_admin_tables(self):
+        data = self.client.get('/api/appointments/', {'page': 2, 'page_size': 3}).data
+        self.assertEqual(data['count'], 7)
+        self.assertEqual([item['name'] for item in data['results']], ['Patient 3', 'Patient 2', 'Patient 1'])
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.client.get('/api/appointments/', {'cursor': 'nope'}).status_code, 404)
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor = make_doctor()
+        Appointment.objects.create(
+            name='Patient', phone='9800000000', doctor=self.doctor, service=self.doctor.service,
+            message='A long message the table never shows', appointment_date=date(2030, 1, 7),
+        )
+
+    def test_only_requested_fields_are_selected_and_serialized(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/api/appointments/', {'fields': 'id,name,service_name'}).data
+        self.assertEqual(data['results'], [{'id': data['results'][0]['id'], 'name': 'Patient', 'service_name': 'Capacity Checkup'}])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('message', queries[0]['sql'])
+
+    def test_calendar_honours_fields(self):
+        data = self.client.get('/api/appointments/calendar/', {
+            'start_date': '2030-01-07', 'end_date': '2030-01-07', 'fields': 'id,patient',
+        }).data
+        self.assertEqual(set(data[0]), {'id', 'patient'})
+        data = self.client.get('/api/appointments/calendar/', {
+            'start_date': '2030-01-07', 'end_date': '2030-01-07', 'fields': 'id,start_time', 'compact': '1',
+        }).data
+        self.assertEqual(set(data['events'][0]), {'id', 'start_time'})
+
+    def test_columnar_format(self):
+        data = json.loads(self.client.get('/api/appointments/', {'fields': 'name,status', 'format': 'columnar'}).content)
+        self.assertEqual(data['results'], {'columns': ['name', 'status'], 'rows': [['Patient', 'PENDING']]})
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('staff', 'staff@example.com', 'pw'))
+        self.doctor = make_doctor()
+        for day, phone in ((7, '9800000001'), (8, '9800000002')):
+            AppointmentHistory.objects.create(
+                name=f'Patient {day}', phone=phone, doctor_id=self.doctor.id,
+                appointment_date=date(2030, 1, day), previous_status='PENDING', new_status='APPROVED',
+            )
+
+    def content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_history_csv_streams_filtered_rows(self):
+        response = self.client.get('/api/history/export.csv', {'start_date': '2030-01-08', 'fields': 'name,phone,appointment_date'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(self.content(response).splitlines(), ['name,phone,appointment_date', 'Patient 8,9800000002,2030-01-08'])
+
+    def test_history_ndjson(self):
+        response = self.client.get('/api/history/export.ndjson', {'phone': '9800000001', 'fields': 'name,doctor_id'})
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual(rows, [{'name': 'Patient 7', 'doctor_id': self.doctor.id}])
+
+    def test_export_reads_rows_in_chunks(self):
+        with mock.patch('django.db.models.query.QuerySet.iterator', autospec=True, side_effect=lambda qs, chunk_size=None: iter(())) as iterator:
+            self.content(self.client.get('/api/appointments/export.csv'))
+        self.assertEqual(iterator.call_args.kwargs['chunk_size'], exports.CHUNK_SIZE)
+
+    def test_unknown_fields_rejected(self):
+        response = self.client.get('/api/history/export.csv', {'fields': 'bogus'}, HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, 400)
+
+    def test_exports_are_for_admins_only(self):
+        anonymous = APIClient()
+        for url in ('/api/history/export.csv', '/api/appointments/export.ndjson'):
+            self.assertIn(anonymous.get(url).status_code, (401, 403))
+        anonymous.force_authenticate(User.objects.create_user('patient', 'patient@example.com', 'pw'))
+        self.assertEqual(anonymous.get('/api/history/export.csv').status_code, 403)
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor = make_doctor()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, text):
+        path = Path(self.tmp.name) / name
+        path.write_text(text, encoding='utf-8')
+        return str(path)
+
+    def rollups(self):
+        return sorted(DailyRollup.objects.exclude(count=0, visited=0).values_list(
+            'source', 'date', 'doctor_id', 'service_id', 'status', 'count', 'visited'
+        ))
+
+    def test_history_csv_import_reports_bad_rows(self):
+        path = self.write('visits.csv', (
+            'name,phone,doctor,appointment_date,appointment_time,new_status,visited,timestamp\n'
+            'Ana,980-000-0001,dr. test,2024-03-04,09:30,APPROVED,visited,2024-03-01T10:00:00\n'
+            'Bo,9800000002,Dr. Test,2024-03-04,10:00,APPROVED,unvisited,yesterday\n'
+            'Cy,9800000003,Dr. Test,04/03/2024,10:00,APPROVED,unvisited,\n'
+        ))
+        out, err = StringIO(), StringIO()
+        call_command('bulk_import', path, stdout=out, stderr=err)
+        self.assertIn('Imported 1 of 3 rows; 2 failed.', out.getvalue())
+        self.assertEqual(err.getvalue().splitlines(), [
+            'line 3: timestamp: “yesterday” value has an invalid format. It must be in YYYY-MM-DD HH:MM[:ss[.uuuuuu]][TZ] format.',
+            'line 4: appointment_date: “04/03/2024” value has an invalid date format. It must be in YYYY-MM-DD format.',
+        ])
+        row = AppointmentHistory.objects.get()
+        self.assertEqual((row.doctor_id, row.service_name, row.phone_digits), (self.doctor.id, 'Capacity Checkup', '9800000001'))
+        self.assertEqual(row.timestamp, timezone.make_aware(datetime(2024, 3, 1, 10, 0)))
+        self.assertEqual([hit['id'] for hit in search.search('Ana')], [row.id])
+        self.assertEqual(self.rollups(), [
+            ('history', date(2024, 3, 4), self.doctor.id, self.doctor.service_id, 'APPROVED', 1, 1),
+        ])
+
+    def test_history_keeps_departed_doctors_by_name(self):
+        path = self.write('visits.ndjson', '\n'.join(json.dumps(values) for values in [
+            {'name': 'Ana', 'doctor': 'Dr. Retired', 'service_name': 'Old Service', 'new_status': 'APPROVED'},
+            {'name': 'Bo', 'doctor_id': 999, 'doctor_name': 'Dr. Gone', 'new_status': 'APPROVED'},
+            {'name': 'Cy', 'doctor_id': 999, 'new_status': 'APPROVED'},
+        ]))
+        err = StringIO()
+        call_command('bulk_import', path, stdout=StringIO(), stderr=err)
+        self.assertEqual(err.getvalue().splitlines(), ['line 3: Unknown doctor id 999'])
+        rows = AppointmentHistory.objects.order_by('name').values_list('doctor_id', 'doctor_name', 'service_id', 'service_name')
+        self.assertEqual(list(rows), [(None, 'Dr. Retired', None, 'Old Service'), (None, 'Dr. Gone', None, None)])
+
+    def test_malformed_ndjson_values_fail_their_row(self):
+        path = self.write('visits.ndjson', '\n'.join(json.dumps(values) for values in [
+            {'name': 'Ana', 'appointment_date': 20240101, 'new_status': 'APPROVED'},
+            {'name': 'Bo', 'timestamp': 5, 'new_status': 'APPROVED'},
+            {'name': 'Cy', 'appointment_time': [1], 'new_status': 'APPROVED'},
+            {'name': 'Di', 'doctor_id': self.doctor.id + 0.5, 'new_status': 'APPROVED'},
+            {'name': 'Ed', 'doctor_id': float(self.doctor.id), 'appointment_date': '2024-01-01', 'new_status': 'APPROVED'},
+        ]))
+        out, err = StringIO(), StringIO()
+        call_command('bulk_import', path, stdout=out, stderr=err)
+        self.assertIn('Imported 1 of 5 rows; 4 failed.', out.getvalue())
+        self.assertEqual(err.getvalue().splitlines(), [
+            'line 1: appointment_date: 20240101 is not a valid value.',
+            'line 2: timestamp: 5 is not a valid value.',
+            'line 3: appointment_time: [1] is not a valid value.',
+            f'line 4: doctor_id: {self.doctor.id + 0.5} is not a whole number.',
+        ])
+        self.assertEqual(AppointmentHistory.objects.get().doctor_id, self.doctor.id)
+
+    def test_appointments_need_a_current_doctor(self):
+        path = self.write('bookings.csv', 'name,doctor,appointment_date\nAna,Dr. Retired,2030-01-07\n')
+        err = StringIO()
+        call_command('bulk_import', path, '--model', 'appointment', stdout=StringIO(), stderr=err)
+        self.assertEqual(err.getvalue().splitlines(), ['line 2: Unknown doctor "Dr. Retired"'])
+
+    def test_large_import_matches_rebuilt_rollups(self):
+        lines = [json.dumps({
+            'name': f'P{index}', 'doctor_id': self.doctor.id, 'appointment_date': f'2024-01-{index % 28 + 1:02d}',
+            'new_status': 'APPROVED' if index % 3 else 'REJECTED', 'visited': 'visited' if index % 2 else 'unvisited',
+        }) for index in range(120)]
+        path = self.write('visits.ndjson', '\n'.join(lines + ['not json']))
+        call_command('bulk_import', path, '--batch-size', '50', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(AppointmentHistory.objects.count(), 120)
+        imported = self.rollups()
+        call_command('rebuild_daily_rollups', stdout=StringIO())
+        self.assertEqual(self.rollups(), imported)
+
+    def test_dry_run_writes_nothing(self):
+        path = self.write('visits.csv', 'name,doctor,new_status\nAna,Dr. Test,APPROVED\n')
+        out = StringIO()
+        call_command('bulk_import', path, '--dry-run', stdout=out)
+        self.assertIn('Would import 1 of 1 rows; 0 failed.', out.getvalue())
+        self.assertFalse(AppointmentHistory.objects.exists())
+
+    def test_appointment_import_api(self):
+        upload = SimpleUploadedFile('bookings.ndjson', json.dumps({
+            'name': 'Ana', 'doctor': 'Dr. Test', 'appointment_date': '2030-01-07', 'appointment_time': '09:30',
+        }).encode())
+        self.assertEqual(self.client.post('/api/appointments/import/', {'file': upload}).status_code, 401)
+
+        self.client.force_authenticate(User.objects.create_superuser('staff', 'staff@example.com', 'pw'))
+        upload.seek(0)
+        response = self.client.post('/api/appointments/import/', {'file': upload})
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 0))
+        appointment = Appointment.objects.get()
+        self.assertEqual((appointment.service_id, appointment.start_minute, appointment.end_minute), (self.doctor.service_id, 570, 630))
+
+
+class CatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.doctor = make_doctor()
+        self.other = make_doctor('Dr. Other', 'Whitening')
+
+    def test_lists_are_served_from_memory_with_etags(self):
+        first = self.client.get('/api/doctors/')
+        self.assertEqual([row['service_name'] for row in first.data], ['Whitening', 'Capacity Checkup'])
+        # Only the catalog version is looked up in the shared cache.
+        with self.assertNumQueries(2):
+            again = self.client.get('/api/doctors/')
+            unchanged = self.client.get('/api/doctors/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.data, first.data)
+        self.assertEqual(unchanged.status_code, 304)
+
+    def test_filters_and_fields(self):
+        response = self.client.get('/api/doctors/', {'service': self.other.service_id, 'fields': 'id,name'})
+        self.assertEqual(response.data, [{'id': self.other.id, 'name': 'Dr. Other'}])
+        self.assertEqual(self.client.get(f'/api/services/{self.other.service_id}/').data['name'], 'Whitening')
+        self.assertEqual(self.client.get('/api/doctors/0/').status_code, 404)
+
+    def test_writes_invalidate(self):
+        etag = self.client.get('/api/services/')['ETag']
+        self.client.patch(f'/api/doctors/{self.doctor.id}/', {'name': 'Dr. Renamed'}, format='json')
+        self.assertEqual(self.client.get(f'/api/doctors/{self.doctor.id}/').data['name'], 'Dr. Renamed')
+        response = self.client.get('/api/services/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.doctor = make_doctor()
+        self.appointment = Appointment.objects.create(
+            name='Patient', doctor=self.doctor, appointment_date=date(2030, 1, 7), appointment_time=time(9, 0)
+        )
+        self.params = {'start_date': '2030-01-07', 'end_date': '2030-01-13', 'doctor_id': self.doctor.id}
+
+    def test_calendar_served_from_cache_until_range_changes(self):
+        first = self.client.get('/api/appointments/calendar/', self.params).data
+        # Only the version counters are read, besides the cache itself.
+        with assert_app_queries(self, 1):
+            self.assertEqual(self.client.get('/api/appointments/calendar/', self.params).data, first)
+
+        Appointment.objects.create(name='Elsewhere', doctor=self.doctor, appointment_date=date(2030, 3, 1), appointment_time=time(9, 0))
+        with assert_app_queries(self, 1):
+            self.client.get('/api/appointments/calendar/', self.params)
+
+        self.client.patch(f'/api/appointments/{self.appointment.id}/', {'appointment_time': '11:00'}, format='json')
+        self.assertEqual(self.client.get('/api/appointments/calendar/', self.params).data[0]['start_time'], '2030-01-07T11:00:00')
+
+    def test_history_range_cached(self):
+        self.client.get('/api/history/', self.params)
+        with assert_app_queries(self, 1):
+            self.assertEqual(self.client.get('/api/history/', self.params).data['results'], [])
+
+    def test_concurrent_miss_waits_for_the_first(self):
+        compute = mock.Mock(return_value='late')
+        cache.add('dental:responses:key:lock', 1)
+        with mock.patch('dental.response_cache.time.sleep', side_effect=lambda _: cache.set('dental:responses:key', 'first')):
+            self.assertEqual(response_cache.get_or_compute('dental:responses:key', compute), 'first')
+        compute.assert_not_called()
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser('boss', 'boss@example.com', 'pw')
+        # Tokens issued within the second of a user change reload the user; start from an old account.
+        UserTokenCutoff.objects.all().delete()
+        revocation._state.reset()
+        revocation.sync(force=True)
+        self.access = self.client.post('/api/admin/login/', {'username': 'boss', 'password': 'pw'}, format='json').data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+    def test_verify_needs_no_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/admin/verify/')
+        self.assertEqual(response.data['user'], {
+            'id': self.admin.id, 'username': 'boss', 'email': 'boss@example.com', 'is_superuser': True, 'is_staff': True,
+        })
+
+    def test_deactivation_takes_effect_immediately(self):
+        staff = User.objects.create_user('desk', password='pw', is_staff=True)
+        self.assertEqual(self.client.patch(f'/api/users/{self.admin.id}/', {'is_active': False}, format='json').status_code, 200)
+        self.assertEqual(self.client.get('/api/admin/verify/').status_code, 401)
+        self.assertTrue(User.objects.filter(pk=staff.pk, is_active=True).exists())
+
+    def test_changes_in_other_workers_are_synced(self):
+        # Another worker deactivates the user: only the database row is written here.
+        User.objects.filter(pk=self.admin.pk).update(is_active=False)
+        UserTokenCutoff.objects.create(user_id=self.admin.id, changed_at=timezone.now(), expires_at=timezone.now() + timedelta(days=1))
+        revocation.sync(force=True)
+        self.assertEqual(self.client.get('/api/admin/verify/').status_code, 401)
+
+    def test_tokens_without_claims_use_the_user_cache(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+        self.assertEqual(self.client.get('/api/admin/verify/').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/admin/verify/').data['user']['username'], 'boss')
+
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        User.objects.create_superuser('boss', 'boss@example.com', 'pw')
+        self.tokens = self.client.post('/api/admin/login/', {'username': 'boss', 'password': 'pw'}, format='json').data
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.tokens["access"]}')
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        response = self.client.post('/api/admin/logout/', {'refresh': self.tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/admin/verify/').status_code, 401)
+        self.assertEqual(RevokedToken.objects.count(), 2)
+
+    def test_revocations_from_other_workers_are_synced(self):
+        jti = AccessToken(self.tokens['access'])['jti']
+        RevokedToken.objects.create(jti=jti, expires_at=timezone.now() + timedelta(hours=1))
+        revocation.sync(force=True)
+        with self.assertNumQueries(0):
+            self.assertTrue(revocation.is_revoked(jti))
+            self.assertFalse(revocation.is_revoked('never-issued'))
+
+    def test_purge_drops_expired_rows(self):
+        RevokedToken.objects.create(jti='old', expires_at=timezone.now() - timedelta(minutes=1))
+        out = StringIO()
+        call_command('purge_revoked_tokens', stdout=out)
+        self.assertIn('Purged 1 expired revocations.', out.getvalue())
+
+
+class RecordingBackend:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, event):
+        self.published.append((topic, event))
+
+
+class StatusEventTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('desk', 'desk@example.com', 'pw'))
+        self.doctor = make_doctor()
+        self.appointment = Appointment.objects.create(
+            name='Patient', phone='+977 980-0000000', doctor=self.doctor, service=self.doctor.service,
+            appointment_date=date(2030, 1, 7), appointment_time=time(10, 0),
+        )
+        self.backend = RecordingBackend()
+        patcher = mock.patch.object(events, '_backend', self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_update_publishes_to_phone_and_doctor_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.patch(f'/api/appointments/{self.appointment.id}/', {'status': 'APPROVED'}, format='json')
+            self.assertEqual(self.backend.published, [])
+        for callback in callbacks:
+            callback()
+        topics = [topic for topic, _ in self.backend.published]
+        self.assertEqual(topics, ['phone:9779800000000', f'doctor:{self.doctor.id}'])
+        event = self.backend.published[0][1]
+        self.assertEqual((event['kind'], event['id'], event['status']), ('history', response.data['history_id'], 'APPROVED'))
+        self.assertNotIn('name', event)
+
+    def test_mark_visited_publishes(self):
+        history = AppointmentHistory.objects.create(phone='9800000000', previous_status='PENDING', new_status='APPROVED')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/history/{history.id}/mark_visited/')
+        self.assertEqual(self.backend.published, [('phone:9800000000', mock.ANY)])
+        self.assertEqual(self.backend.published[0][1]['visited'], 'visited')
+
+
+class ServerSentEventsTests(TestCase):
+    def request(self, query, deliver=(), expect=0):
+        """Run the SSE app, ``deliver`` events once it streams, and disconnect after ``expect`` of them."""
+        sent = []
+
+        async def scenario():
+            disconnect = asyncio.Event()
+            requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+            async def receive():
+                if requests:
+                    return requests.pop()
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+                bodies = [m for m in sent if m['type'] == 'http.response.body']
+                if len(bodies) == 1 and message.get('more_body'):
+                    for topic, event in deliver:
+                        events.broker.deliver(topic, event)
+                if len(bodies) == 1 + expect:
+                    disconnect.set()
+
+            scope = {'type': 'http', 'method': 'GET', 'path': '/api/events/', 'query_string': query.encode(),
+                     'headers': [(b'origin', b'http://localhost:3000')]}
+            await asyncio.wait_for(sse.application(scope, receive, send), 5)
+
+        asyncio.run(scenario())
+        return sent
+
+    def test_streams_events_for_the_phone_only(self):
+        sent = self.request('phone=980-0000000', deliver=[
+            ('phone:1110000000', {'id': 1}), ('phone:9800000000', {'id': 2, 'status': 'APPROVED'}),
+        ], expect=1)
+        headers = dict(sent[0]['headers'])
+        self.assertEqual((sent[0]['status'], headers[b'content-type']), (200, b'text/event-stream'))
+        self.assertEqual(headers[b'access-control-allow-origin'], b'http://localhost:3000')
+        bodies = [message['body'] for message in sent[1:]]
+        self.assertEqual(bodies, [b'retry: 5000\n\n', b'data: {"id":2,"status":"APPROVED"}\n\n'])
+        self.assertEqual(events.broker.subscribers, {})
+
+    def test_rejects_missing_topic_and_anonymous_doctor_feed(self):
+        self.assertEqual(self.request('')[0]['status'], 400)
+        doctor = make_doctor()
+        self.assertEqual(self.request(f'doctor={doctor.id}&token=bogus')[0]['status'], 401)
+
+
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('desk', 'desk@example.com', 'pw'))
+        self.doctor = make_doctor()
+        self.kept, self.approved = [
+            Appointment.objects.create(name=name, phone='9800000000', doctor=self.doctor, service=self.doctor.service,
+                                       appointment_date=date(2030, 1, 7), appointment_time=time(hour, 0))
+            for name, hour in (('Kept', 9), ('Approved', 10))
+        ]
+        Appointment.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+    def test_since_returns_changes_and_tombstones(self):
+        cursor = self.client.get('/api/appointments/')['X-Sync-Cursor']
+        self.client.patch(f'/api/appointments/{self.approved.id}/', {'status': 'APPROVED'}, format='json')
+        added = self.client.post('/api/appointments/', {
+            'name': 'New', 'phone': '9811111111', 'doctor': self.doctor.id, 'service': self.doctor.service_id,
+            'appointment_date': '2030-01-08', 'appointment_time': '11:00',
+        }, format='json').data
+
+        response = self.client.get('/api/appointments/', {'since': cursor})
+        self.assertEqual([row['id'] for row in response.data['changed']], [added['id']])
+        self.assertEqual(response.data['deleted'], [self.approved.id])
+        history = self.client.get('/api/history/', {'since': cursor}).data
+        self.assertEqual([row['new_status'] for row in history['changed']], ['APPROVED'])
+
+        again = self.client.get('/api/appointments/', {'since': response.data['cursor']}).data
+        self.assertEqual(again['deleted'], [self.approved.id])  # inside the lag window, sent again
+
+    def test_cursor_header_readable_cross_origin(self):
+        response = self.client.get('/api/appointments/', HTTP_ORIGIN='http://localhost:3000')
+        self.assertIn('X-Sync-Cursor', response['Access-Control-Expose-Headers'])
+
+    def test_feedback_deletes_leave_tombstones(self):
+        feedback = Feedback.objects.create(name='Guest', message='Thanks')
+        cursor = sync.encode(timezone.now() - timedelta(minutes=1))
+        self.client.delete(f'/api/feedback/{feedback.id}/')
+        self.assertEqual(self.client.get('/api/feedback/', {'since': cursor}).data['deleted'], [feedback.id])
+
+    def test_unreadable_and_expired_cursors(self):
+        self.assertEqual(self.client.get('/api/appointments/', {'since': 'nope'}).status_code, 400)
+        expired = sync.encode(timezone.now() - timedelta(days=sync.TOMBSTONE_DAYS + 1))
+        self.assertEqual(self.client.get('/api/appointments/', {'since': expired}).status_code, 410)
+
+    def test_purge_drops_old_tombstones(self):
+        Tombstone.objects.create(kind='appointment', object_id=1)
+        Tombstone.objects.update(deleted_at=timezone.now() - timedelta(days=sync.TOMBSTONE_DAYS + 1))
+        out = StringIO()
+        call_command('purge_tombstones', stdout=out)
+        self.assertIn('Purged 1 tombstones.', out.getvalue())
+
+
+class HourlyCapacityConcurrencyTests(TransactionTestCase):
+    """Hammer one period from many threads; it must never exceed capacity."""
+
+    workers = 12
+    attempts_per_worker = 50
+
+    def test_parallel_reservations_never_overbook(self):
+        doctor = make_doctor()
+        start = threading.Barrier(self.workers)
+        granted = []
+        lock = threading.Lock()
+
+        def worker():
+            start.wait()
+            try:
+                for _ in range(self.attempts_per_worker):
+                    try:
+                        with transaction.atomic():
+                            capacity.lock_doctor(doctor.id)
+                            appointment = Appointment.objects.create(
+                                name='Load', doctor_id=doctor.id,
+                                appointment_date=date(2030, 1, 7), appointment_time=time(9, 0),
+                            )
+                            capacity.check_overlap(appointment)
+                    except capacity.SlotFull:
+                        # the period is full: this worker is done
+                        return
+                    except OperationalError:
+                        # SQLite may report the table as locked under contention; back off and retry.
+                        time_module.sleep(0.005)
+                        continue
+                    with lock:
+                        granted.append(1)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(granted), capacity.HOURLY_CAPACITY)
+        self.assertEqual(Appointment.objects.filter(doctor=doctor).count(), capacity.HOURLY_CAPACITY)
@@ -0,0 +1,88 @@
+"""Merged patient timeline of active appointments and history entries.
+
+The two tables are combined in SQL with UNION ALL and paged with an opaque
+keyset cursor over (timestamp, source, id), newest first, so a page costs
+the same no matter how many visits a patient has accumulated.
+"""
+import base64
+import json
+
+from django.db.models import CharField, F, Q, Value
+from django.utils.dateparse import parse_datetime
+
+from .models import Appointment, AppointmentHistory, phone_prefix_q
+from .serializers import AppointmentHistorySerializer, AppointmentSerializer
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+SOURCES = {
+    'active': (Appointment, 'created_at'),
+    'history': (AppointmentHistory, 'timestamp'),
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(row):
+    payload = json.dumps([row['sort_ts'].isoformat(), row['source'], row['id']])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, source, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        timestamp = parse_datetime(timestamp)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if timestamp is None or source not in SOURCES or not isinstance(pk, int):
+        raise InvalidCursor(cursor)
+    return timestamp, source, pk
+
+
+def _after_cursor(source, cursor):
+    """Rows of ``source`` that sort strictly after ``cursor`` in descending order."""
+    timestamp, cursor_source, cursor_id = cursor
+    if source == cursor_source:
+        return Q(sort_ts__lt=timestamp) | Q(sort_ts=timestamp, id__lt=cursor_id)
+    if source < cursor_source:
+        return Q(sort_ts__lte=timestamp)
+    return Q(sort_ts__lt=timestamp)
+
+
+def page(phone_digits, limit=DEFAULT_LIMIT, cursor=None):
+    """Return ``(items, next_cursor)`` for a patient's timeline."""
+    keyed = []
+    for source, (model, timestamp_field) in SOURCES.items():
+        qs = (
+            model.objects.filter(phone_prefix_q(phone_digits))
+            .annotate(source=Value(source, output_field=CharField()), sort_ts=F(timestamp_field))
+        )
+        if cursor:
+            qs = qs.filter(_after_cursor(source, cursor))
+        keyed.append(qs.values('sort_ts', 'source', 'id'))
+
+    combined = keyed[0].union(*keyed[1:], all=True).order_by('-sort_ts', '-source', '-id')
+    rows = list(combined[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    rows = rows[:limit]
+
+    ids = {source: [row['id'] for row in rows if row['source'] == source] for source in SOURCES}
+    appointments = Appointment.objects.select_related('service').in_bulk(ids['active'])
+    history = AppointmentHistory.objects.in_bulk(ids['history'])
+
+    items = []
+    for row in rows:
+        if row['source'] == 'active':
+            obj, serializer_class = appointments.get(row['id']), AppointmentSerializer
+        else:
+            obj, serializer_class = history.get(row['id']), AppointmentHistorySerializer
+        if obj is None:
+            # deleted (e.g. moved to history) between the two reads
+            continue
+        data = serializer_class(obj).data
+        data['_source'] = row['source']
+        items.append(data)
+    return items, next_cursor
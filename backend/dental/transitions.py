@@ -0,0 +1,166 @@
+"""Appointment status transitions and the history snapshots they produce.
+
+Approving or rejecting an appointment records an AppointmentHistory
+snapshot and removes the appointment from the active table.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import capacity, events, rollups, search, sync, versions
+from .models import Appointment, AppointmentHistory, normalize_phone
+
+FINAL_STATUSES = ('APPROVED', 'REJECTED')
+# Changing any of these can move an appointment's [start, end) interval.
+SCHEDULE_FIELDS = ('doctor', 'appointment_date', 'appointment_time', 'service')
+
+
+def history_snapshot(appointment, previous_status, new_status, changed_by, link=True):
+    """Unsaved AppointmentHistory copying ``appointment``'s current fields.
+
+    Expects ``service`` and ``doctor`` to be loaded already (select_related).
+    """
+    service, doctor = appointment.service, appointment.doctor
+    return AppointmentHistory(
+        appointment=appointment if link else None,
+        name=appointment.name,
+        email=appointment.email,
+        phone=appointment.phone,
+        phone_digits=normalize_phone(appointment.phone),
+        service_name=service.name if service else None,
+        service_id=service.id if service else None,
+        appointment_date=appointment.appointment_date,
+        appointment_time=appointment.appointment_time,
+        message=appointment.message,
+        doctor_id=doctor.id if doctor else None,
+        doctor_name=doctor.name if doctor else None,
+        previous_status=previous_status,
+        new_status=new_status,
+        changed_by=changed_by,
+        notes=appointment.admin_notes or '',
+        booked_at=appointment.created_at,
+    )
+
+
+def moved_to_history_response(appointment, history_entry):
+    """Response body for an appointment that was approved/rejected and archived."""
+    return {
+        'id': appointment.id,
+        'name': appointment.name,
+        'email': appointment.email,
+        'phone': appointment.phone,
+        'status': history_entry.new_status,
+        'deleted': True,
+        'moved_to_history': True,
+        'history_id': history_entry.id,
+        'message': f'Appointment {history_entry.new_status.lower()} and moved to history'
+    }
+
+
+def delete_moved(appointments):
+    """Delete appointments already snapshotted to history, in bulk.
+
+    The per-row post_delete bookkeeping (calendar versions, tombstones) is
+    done here in aggregate, then a single DELETE removes the rows. Search
+    documents and daily rollups are moved over by the caller.
+    """
+    ids = [appointment.id for appointment in appointments]
+    versions.touch(*appointments)
+    # Mirror on_delete=SET_NULL for older history rows before the direct delete.
+    AppointmentHistory.objects.filter(appointment_id__in=ids).update(appointment=None, updated_at=timezone.now())
+    sync.delete(Appointment, ids)
+
+
+def move_to_history(appointments, new_status, changed_by, previous_status=None):
+    """Snapshot appointments to history and delete them, with bulk bookkeeping.
+
+    ``previous_status`` defaults to each appointment's current status.
+    Returns the saved history entries in the same order.
+    """
+    # The appointments are deleted below, which would null this link anyway.
+    snapshots = AppointmentHistory.objects.bulk_create([
+        history_snapshot(appointment, previous_status or appointment.status, new_status, changed_by, link=False)
+        for appointment in appointments
+    ])
+    # The appointments' search documents become the snapshots' documents.
+    search.replace('appointment', [(appointment.id, snapshot) for appointment, snapshot in zip(appointments, snapshots)])
+    rollups.replaced(appointments, snapshots)
+    delete_moved(appointments)
+    return snapshots
+
+
+def apply(appointment_id, changes, changed_by, enforce_capacity=True):
+    """Apply field and status changes to one appointment in a single transaction.
+
+    Shared by ``AppointmentViewSet.update`` and ``AppointmentAdmin.save_model``.
+    The row is fetched once, locked and with its service/doctor joined; a
+    schedule change is checked for overlaps; a status change writes a
+    history snapshot of the updated row, and approval/rejection removes it
+    from the active table.
+    Subscribers to the appointment's phone and doctor get an event on commit.
+
+    Returns ``(appointment, history_entry)``; ``history_entry`` is None when
+    the status did not change. Raises ``capacity.SlotFull`` when
+    ``enforce_capacity`` is set and the new time overlaps a full period.
+    """
+    with transaction.atomic():
+        appointment = (
+            Appointment.objects.select_for_update()
+            .select_related('service', 'doctor')
+            .get(pk=appointment_id)
+        )
+        old_status = appointment.status
+        old_interval = capacity.interval_of(appointment)
+        for field, value in changes.items():
+            setattr(appointment, field, value)
+        new_status = appointment.status
+
+        if new_status in FINAL_STATUSES and new_status != old_status:
+            history_entry, = move_to_history([appointment], new_status, changed_by, previous_status=old_status)
+            events.publish(history_entry)
+            return appointment, history_entry
+
+        check = enforce_capacity and any(field in changes for field in SCHEDULE_FIELDS)
+        if check:
+            capacity.lock_doctor(appointment.doctor_id)
+        appointment.save()
+        if check and capacity.interval_of(appointment) != old_interval:
+            capacity.check_overlap(appointment)
+        events.publish(appointment)
+
+        if new_status == old_status:
+            return appointment, None
+        history_entry = history_snapshot(appointment, old_status, new_status, changed_by)
+        history_entry.save()
+        return appointment, history_entry
+
+
+def bulk_transition(ids, new_status, changed_by):
+    """Approve or reject many appointments in one transaction.
+
+    Returns one result per requested id, in request order: the
+    ``moved_to_history`` shape for moved rows, otherwise an error entry.
+    """
+    if new_status not in FINAL_STATUSES:
+        raise ValueError(f'status must be one of {", ".join(FINAL_STATUSES)}')
+
+    with transaction.atomic():
+        appointments = (
+            Appointment.objects.select_for_update()
+            .select_related('service', 'doctor')
+            .filter(id__in=ids)
+            .in_bulk()
+        )
+        moving = [appointment for appointment in appointments.values() if appointment.status != new_status]
+        snapshots = move_to_history(moving, new_status, changed_by)
+        events.publish(*snapshots)
+
+    moved = {appointment.id: moved_to_history_response(appointment, entry) for appointment, entry in zip(moving, snapshots)}
+    results = []
+    for pk in ids:
+        if pk in moved:
+            results.append(moved[pk])
+        elif pk in appointments:
+            results.append({'id': pk, 'status': new_status, 'moved_to_history': False, 'detail': f'Appointment is already {new_status.lower()}'})
+        else:
+            results.append({'id': pk, 'moved_to_history': False, 'detail': 'Not found.'})
+    return results
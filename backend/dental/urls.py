@@ -1,6 +1,8 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework import routers
-from .api_views import AppointmentViewSet, AppointmentHistoryViewSet, DoctorViewSet, ServiceViewSet, FeedbackListCreateView, UserViewSet, FeedbackDetailView
+from rest_framework.renderers import JSONRenderer
+from .api_views import AppointmentViewSet, AppointmentHistoryViewSet, DoctorViewSet, ServiceViewSet, FeedbackListCreateView, UserViewSet, FeedbackDetailView, SearchView, AnalyticsViewSet, OccupancyView, StatsView
+from .exports import PassthroughRenderer
 
 router = routers.DefaultRouter()
 router.register(r'services', ServiceViewSet, basename='services')
@@ -8,9 +10,22 @@ router.register(r'appointments', AppointmentViewSet, basename='appointments')
 router.register(r'history', AppointmentHistoryViewSet, basename='history')
 router.register(r'doctors', DoctorViewSet, basename='doctors')
 router.register(r'users', UserViewSet, basename='users')
+router.register(r'analytics', AnalyticsViewSet, basename='analytics')
+
+
+def export_route(prefix, viewset):
+    """``api/<prefix>/export.csv`` and ``.ndjson``; listed before the router so ``export`` is not read as a pk."""
+    view = viewset.as_view({'get': 'export'}, renderer_classes=[JSONRenderer, PassthroughRenderer])
+    return re_path(rf'^api/{prefix}/export\.(?P<export_format>csv|ndjson)/?$', view, name=f'{prefix}-export')
+
 
 urlpatterns = [
+    export_route('appointments', AppointmentViewSet),
+    export_route('history', AppointmentHistoryViewSet),
     path('api/', include(router.urls)),
     path("api/feedback/", FeedbackListCreateView.as_view(), name="feedback-list-create"),
     path("api/feedback/<int:pk>/", FeedbackDetailView.as_view(), name="feedback-detail"),
+    path("api/search/", SearchView.as_view(), name="search"),
+    path("api/occupancy/", OccupancyView.as_view(), name="occupancy"),
+    path("api/stats/", StatsView.as_view(), name="stats"),
 ]
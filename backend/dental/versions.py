@@ -0,0 +1,87 @@
+"""Per-(doctor, day) change counters and the ETags derived from them.
+
+Every write to an appointment or history row bumps the counter of the
+calendar day(s) it touches. Range endpoints hash the counters covering the
+requested range into a strong ETag, so a conditional GET can be answered
+with 304 from this small table without reading appointments at all.
+"""
+import hashlib
+from functools import reduce
+from operator import or_
+
+from django.db.models import F, Q
+from django.utils.dateparse import parse_date
+
+from . import counters
+from .models import CalendarVersion
+
+# Above this many keys, bump the whole doctors x days grid instead of an OR of pairs.
+EXACT_KEYS_LIMIT = 32
+
+
+def day_key(doctor_id, day):
+    if isinstance(day, str):
+        day = parse_date(day)
+    return (doctor_id or 0, day) if day else None
+
+
+def keys_of(instances):
+    """Calendar days touched by model instances, including where they were loaded from."""
+    keys = set()
+    for instance in instances:
+        keys.add(day_key(instance.doctor_id, instance.appointment_date))
+        loaded = getattr(instance, '_loaded_calendar_day', None)
+        if loaded:
+            keys.add(day_key(*loaded))
+    keys.discard(None)
+    return keys
+
+
+def bump(keys):
+    """Increment the counters of ``keys`` ((doctor_id, date) pairs), creating missing rows.
+
+    One upsert where the backend supports it (see ``dental.counters``).
+    Otherwise rows are created at 0 and then incremented, so two writers
+    creating the same day concurrently both still count.
+    """
+    keys = {key for key in keys if key}
+    if not keys:
+        return
+    if counters.increment(CalendarVersion, ('doctor_id', 'date'), ('version',), dict.fromkeys(keys, (1,))):
+        return
+    CalendarVersion.objects.bulk_create(
+        [CalendarVersion(doctor_id=doctor_id, date=day) for doctor_id, day in keys], ignore_conflicts=True
+    )
+    if len(keys) > EXACT_KEYS_LIMIT:
+        # Bulk writes: bumping a few extra counters only costs those days a 304.
+        touched = CalendarVersion.objects.filter(
+            doctor_id__in={doctor_id for doctor_id, _ in keys}, date__in={day for _, day in keys}
+        )
+    else:
+        touched = CalendarVersion.objects.filter(reduce(or_, (Q(doctor_id=doctor_id, date=day) for doctor_id, day in keys)))
+    touched.update(version=F('version') + 1)
+
+
+def touch(*instances):
+    bump(keys_of(instances))
+
+
+def range_etag(request, start_date, end_date, doctor_id=None, catalog_version=None):
+    """Strong ETag for a range response, from the counters it covers and the full query string.
+
+    Responses that embed service or doctor details pass ``catalog_version``,
+    so renaming a doctor or service changes their ETag too.
+    """
+    days = CalendarVersion.objects.filter(date__range=(start_date, end_date))
+    if doctor_id is not None:
+        days = days.filter(doctor_id=doctor_id)
+    digest = hashlib.sha1(f'{catalog_version or ""}:{request.get_full_path()}'.encode())
+    for doctor, day, version in days.order_by('date', 'doctor_id').values_list('doctor_id', 'date', 'version'):
+        digest.update(f'{doctor}:{day}:{version};'.encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def not_modified(request, etag):
+    """True when the client's If-None-Match already names ``etag``."""
+    header = request.headers.get('If-None-Match', '')
+    return etag in [tag.strip() for tag in header.split(',')] or header.strip() == '*'
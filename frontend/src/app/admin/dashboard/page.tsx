@@ -64,31 +64,18 @@ function handleNav(id: string, type: string) {
   const fetchStats = async () => {
     setLoading(true);
     try {
-      // Fetch appointments
-      const appointmentsRes = await apiClient.get<any>("/api/appointments/");
-      const appointments = await appointmentsRes.results || appointmentsRes || [];
-
-
-      // Fetch doctors
-      const doctorsRes = await apiClient.get<any>("/api/doctors/");
-      const doctors = doctorsRes.results || doctorsRes || [];
-
-      // Fetch feedback (may not exist yet)
-      let feedback: any[] = [];
-      try {
-        const feedbackRes = await apiClient.get<any>("/api/feedback/");
-        feedback = feedbackRes.results || feedbackRes || [];
-      } catch (err) {
-        console.log("Feedback endpoint not available");
-      }
+      // Counts are aggregated server-side; no need to download every row
+      const res = await apiClient.get<any>("/api/stats/");
+      const byStatus = res.appointments?.by_status || {};
+      const historyByStatus = res.history?.by_status || {};
 
       setStats({
-        totalAppointments: appointments.length,
-        pendingAppointments: appointments.filter((a: any) => a.status === "PENDING").length,
-        approvedAppointments: appointments.filter((a: any) => a.status === "APPROVED").length,
-        rejectedAppointments: appointments.filter((a: any) => a.status === "REJECTED").length,
-        totalDoctors: doctors.length,
-        totalFeedback: feedback.length,
+        totalAppointments: res.appointments?.total || 0,
+        pendingAppointments: byStatus.PENDING || 0,
+        approvedAppointments: (byStatus.APPROVED || 0) + (historyByStatus.APPROVED || 0),
+        rejectedAppointments: (byStatus.REJECTED || 0) + (historyByStatus.REJECTED || 0),
+        totalDoctors: res.doctors?.total || 0,
+        totalFeedback: res.feedback?.total || 0,
       });
     } catch (err) {
       console.error("Failed to fetch stats:", err);
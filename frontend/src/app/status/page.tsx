@@ -90,34 +90,19 @@ export default function StatusPage() {
     setError("");
     setAppointments([]);
     try {
-      // Fetch from both appointments and history endpoints
-      const [appointmentsRes, historyRes] = await Promise.all([
-        fetch(`http://localhost:8000/api/appointments/`),
-        fetch(`http://localhost:8000/api/history/`)
-      ]);
+      // Prefix lookup across appointments and history on the server; exact match below
+      const response = await fetch(
+        `http://localhost:8000/api/appointments/by_phone/?phone=${encodeURIComponent(phoneNumber)}`
+      );
 
-      if (!appointmentsRes.ok || !historyRes.ok) {
+      if (!response.ok) {
         throw new Error("Server error");
       }
 
-      const appointmentsData = await appointmentsRes.json();
-      const historyData = await historyRes.json();
-
-      // Extract results from paginated responses
-      let activeAppointments: any[] = [];
-      let historyRecords: any[] = [];
-
-      if (Array.isArray(appointmentsData)) {
-        activeAppointments = appointmentsData;
-      } else if (appointmentsData.results && Array.isArray(appointmentsData.results)) {
-        activeAppointments = appointmentsData.results;
-      }
-
-      if (Array.isArray(historyData)) {
-        historyRecords = historyData;
-      } else if (historyData.results && Array.isArray(historyData.results)) {
-        historyRecords = historyData.results;
-      }
+      const data = await response.json();
+      const rows: any[] = Array.isArray(data) ? data : data.results || [];
+      const activeAppointments = rows.filter((row: any) => row._source === 'active');
+      const historyRecords = rows.filter((row: any) => row._source === 'history');
 
       // ✅ EXACT MATCH ONLY - filter by exact phone number
       const normalizePhone = (phone: string) => {
@@ -347,11 +332,23 @@ export default function StatusPage() {
     return currentMonth.toLocaleDateString(undefined, { month: "long", year: "numeric" });
   }, [currentMonth]);
 
-  // Polling every 60s when phone present
+  // Refetch when the server pushes a status change for this phone. The stream
+  // only exists under an ASGI server, so poll every 60s while it isn't open
+  // (no EventSource, still connecting, or failed for good under runserver).
   useEffect(() => {
     if (!phone) return;
-    const id = setInterval(() => fetchAppointments(phone), 60000);
-    return () => clearInterval(id);
+    const source =
+      typeof EventSource === "undefined"
+        ? null
+        : new EventSource(`http://localhost:8000/api/events/?phone=${encodeURIComponent(phone)}`);
+    if (source) source.onmessage = () => fetchAppointments(phone);
+    const id = setInterval(() => {
+      if (!source || source.readyState !== source.OPEN) fetchAppointments(phone);
+    }, 60000);
+    return () => {
+      clearInterval(id);
+      source?.close();
+    };
   }, [phone]);
 
   const handleRefresh = () => {
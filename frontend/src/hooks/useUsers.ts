@@ -3,8 +3,8 @@ import { User } from '@/lib/api/users';
 
 const API_BASE = 'http://localhost:8000/api';
 
-// Fetcher function for SWR
-const fetcher = async (url: string) => {
+// Fetch one page of users
+const fetchPage = async (url: string) => {
   console.log('[useUsers] Fetching:', url);
   const res = await fetch(url);
 
@@ -29,12 +29,28 @@ const fetcher = async (url: string) => {
   return data;
 };
 
+// Fetcher function for SWR: the list is cursor-paginated, so follow `next` to load every user
+const fetcher = async (url: string) => {
+  const first = await fetchPage(url);
+  if (Array.isArray(first) || !Array.isArray(first?.results)) {
+    return first;
+  }
+  const users = [...first.results];
+  let next: string | null = first.next;
+  while (next) {
+    const page = await fetchPage(next);
+    users.push(...(page.results || []));
+    next = page.next;
+  }
+  return users;
+};
+
 /**
  * Hook for client-side users fetching with SWR
  * Useful for client components that need to refresh user list
  */
 export function useUsers(enabled: boolean = true) {
-  const url = `${API_BASE}/users`; // ✅ FIX HERE (removed "/")
+  const url = `${API_BASE}/users?page_size=100`;
 
   const results = useSWR(enabled ? url : null, fetcher, {
     refreshInterval: 5000, // Auto-refresh every 5 seconds
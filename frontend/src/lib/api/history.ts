@@ -19,21 +19,25 @@ export const historyApi = {
         params.doctor_id = filters.doctor_id.toString();
       }
 
-      const response = await apiClient.get<any>(
-        '/api/history/',
-        params
-      );
-      
-      // Handle different response formats from the backend
-      if (response && typeof response === 'object') {
-        if ('results' in response && Array.isArray(response.results)) {
-          return response.results;
-        }
+      // The list is cursor-paginated; follow `next` until the range is complete
+      const rows: AppointmentHistory[] = [];
+      params.page_size = '100';
+      for (;;) {
+        const response = await apiClient.get<any>('/api/history/', params);
         if (Array.isArray(response)) {
           return response;
         }
+        if (!response || !Array.isArray(response.results)) {
+          break;
+        }
+        rows.push(...response.results);
+        const cursor = response.next ? new URL(response.next).searchParams.get('cursor') : null;
+        if (!cursor) {
+          break;
+        }
+        params.cursor = cursor;
       }
-      return [];
+      return rows;
     } catch (error) {
       console.error('Failed to fetch history:', error);
       return [];
@@ -33,7 +33,9 @@ export const authService = {
 
   async logout(): Promise<void> {
     try {
-      await apiClient.post('/api/admin/logout/', {});
+      // Revokes the access token server-side, and the refresh token when we have one
+      const refresh = typeof window !== 'undefined' ? localStorage.getItem(ADMIN_REFRESH_KEY) : null;
+      await apiClient.post('/api/admin/logout/', refresh ? { refresh } : {});
     } catch (error: any) {
       console.warn('Logout request failed, continuing locally.', error?.message || error);
     } finally {